@@ -1,9 +1,24 @@
+import os
+import runpy
+
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
+
+class BuildWithProtos(build_py):
+    """Regenerate the gRPC stubs before building, if sum.proto changed."""
+
+    def run(self):
+        generator = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'sum_service', 'grpc', 'proto', 'generate_proto.py')
+        runpy.run_path(generator)['generate_proto']()
+        super().run()
 
 setup(
     name="sum_service",
     version="0.1",
     packages=find_packages(),
+    package_data={"sum_service.grpc.proto": ["sum.proto", "sum.proto.sha256"]},
+    cmdclass={"build_py": BuildWithProtos},
     install_requires=[
         "grpcio==1.60.0",
         "grpcio-tools==1.60.0",
@@ -0,0 +1,3 @@
+"""
+Load generation for the sum service: python -m sum_service.bench --help
+"""
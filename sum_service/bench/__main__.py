@@ -0,0 +1,116 @@
+"""
+Command-line entry point: python -m sum_service.bench
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+from sum_service.bench.local import LocalStack
+from sum_service.bench.runner import run_closed_loop, run_open_loop
+from sum_service.bench.transports import GrpcTransport, GrpcWebTransport, WebSocketTransport
+
+TRANSPORTS = ('grpc', 'websocket', 'grpc-web')
+
+def build_transport(name, args):
+    if name == 'grpc':
+        return GrpcTransport(args.grpc_target, connections=args.connections, key=args.key)
+    if name == 'websocket':
+        return WebSocketTransport(args.websocket_url, key=args.key)
+    return GrpcWebTransport(args.grpc_web_target, key=args.key)
+
+async def run_one(name, args):
+    transport = build_transport(name, args)
+    await transport.open()
+    try:
+        clients = [await transport.client(i) for i in range(args.concurrency)]
+        if args.rate:
+            summary = await run_open_loop(clients, args.rate, args.duration, args.warmup)
+        else:
+            summary = await run_closed_loop(clients, args.duration, args.warmup)
+    finally:
+        await transport.close()
+    return {
+        'transport': name,
+        'mode': 'open' if args.rate else 'closed',
+        'concurrency': args.concurrency,
+        'connections': args.connections if name == 'grpc' else args.concurrency,
+        'target_rate_rps': args.rate,
+        'duration_s': args.duration,
+        'warmup_s': args.warmup,
+        **summary,
+    }
+
+def format_result(result):
+    latency = result['latency_ms']
+    return (f"{result['transport']:>9} {result['mode']:>6}  {result['throughput_rps']:10.0f} req/s  "
+            f"p50 {latency['p50']:7.3f}  p90 {latency['p90']:7.3f}  p99 {latency['p99']:7.3f}  "
+            f"p999 {latency['p999']:7.3f} ms  errors {result['errors']}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m sum_service.bench',
+        description="Load-test the sum service over gRPC, the WebSocket proxy and gRPC-Web")
+    parser.add_argument(
+        '--transport', default='grpc',
+        help=f"comma-separated transports to run, from {', '.join(TRANSPORTS)}")
+    parser.add_argument('--spawn', action='store_true',
+                        help="start local server, proxy and Envoy processes on free ports")
+    parser.add_argument('--server-arg', action='append', default=[],
+                        help="extra argument for the spawned gRPC server (repeatable)")
+    parser.add_argument('--grpc-target', default='localhost:50051')
+    parser.add_argument('--websocket-url', default='ws://localhost:8765')
+    parser.add_argument('--grpc-web-target', default='localhost:9900')
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent clients")
+    parser.add_argument('--connections', type=int, default=1,
+                        help="gRPC channels shared by the clients (WebSocket and gRPC-Web use one per client)")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="open loop at this many requests per second (default: closed loop)")
+    parser.add_argument('--duration', type=float, default=10.0, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=2.0, help="unmeasured seconds before that")
+    parser.add_argument('--key', default='bench', help="accumulator key to add to")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    args.transports = [name.strip() for name in args.transport.split(',') if name.strip()]
+    for name in args.transports:
+        if name not in TRANSPORTS:
+            parser.error(f"unknown transport {name!r}")
+    if args.concurrency < 1 or args.connections < 1:
+        parser.error("--concurrency and --connections must be at least 1")
+    return args
+
+async def run_all(args):
+    return [await run_one(name, args) for name in args.transports]
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    if args.spawn:
+        with LocalStack(args.transports, server_args=args.server_arg) as stack:
+            args.grpc_target = stack.grpc_target
+            args.websocket_url = stack.websocket_url or args.websocket_url
+            args.grpc_web_target = stack.grpc_web_target or args.grpc_web_target
+            results = asyncio.run(run_all(args))
+    else:
+        results = asyncio.run(run_all(args))
+
+    for result in results:
+        print(format_result(result))
+    if args.output:
+        document = {
+            'started_at': started,
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'argv': sys.argv[1:] if argv is None else list(argv),
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+
+if __name__ == '__main__':
+    main()
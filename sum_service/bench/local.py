@@ -0,0 +1,109 @@
+"""
+Local processes to benchmark against: the gRPC server, the WebSocket proxy
+and, when an envoy binary is installed, Envoy for the gRPC-Web path.
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import grpc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+def render_envoy_config(listener_port, admin_port, upstream_port, template=None):
+    """envoy.yaml with its ports and upstream pointed at local processes."""
+    with open(template or os.path.join(ROOT, 'envoy.yaml')) as f:
+        config = f.read()
+    return (config
+            .replace('address: grpc-server', 'address: 127.0.0.1')
+            .replace('port_value: 50051', f'port_value: {upstream_port}')
+            .replace('port_value: 9900', f'port_value: {listener_port}')
+            .replace('port_value: 9901', f'port_value: {admin_port}'))
+
+class LocalStack:
+    """Start the processes that the given transports need; use as a context manager.
+
+    After entering, grpc_target, websocket_url and grpc_web_target address
+    the local processes.
+    """
+
+    def __init__(self, transports, server_args=(), startup_timeout=20):
+        self.transports = set(transports)
+        self.server_args = list(server_args)
+        self.startup_timeout = startup_timeout
+        self.grpc_target = self.websocket_url = self.grpc_web_target = None
+        self._processes = []
+        self._tmpdir = None
+
+    def _spawn(self, command, env=None):
+        process = subprocess.Popen(
+            command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._processes.append(process)
+        return process
+
+    def __enter__(self):
+        try:
+            self._start()
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _start(self):
+        grpc_port = free_port()
+        self._spawn([sys.executable, '-m', 'sum_service.grpc.server', '--port', str(grpc_port)]
+                    + self.server_args)
+        self.grpc_target = f'127.0.0.1:{grpc_port}'
+        with grpc.insecure_channel(self.grpc_target) as channel:
+            grpc.channel_ready_future(channel).result(timeout=self.startup_timeout)
+
+        if 'websocket' in self.transports:
+            ws_port = free_port()
+            env = dict(os.environ, GRPC_HOST='127.0.0.1', GRPC_PORT=str(grpc_port), WS_PORT=str(ws_port),
+                       PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv('PYTHONPATH')])))
+            self._spawn([sys.executable, '-m', 'sum_service.websocket.server'], env=env)
+            _wait_for_port(ws_port, self.startup_timeout)
+            self.websocket_url = f'ws://127.0.0.1:{ws_port}'
+
+        if 'grpc-web' in self.transports:
+            envoy = shutil.which('envoy')
+            if envoy is None:
+                raise RuntimeError(
+                    "Spawning the grpc-web path needs an envoy binary on PATH; "
+                    "otherwise run without --spawn against a running Envoy")
+            listener_port, admin_port = free_port(), free_port()
+            self._tmpdir = tempfile.mkdtemp(prefix='sum-bench-')
+            config_path = os.path.join(self._tmpdir, 'envoy.yaml')
+            with open(config_path, 'w') as f:
+                f.write(render_envoy_config(listener_port, admin_port, grpc_port))
+            self._spawn([envoy, '-c', config_path, '--log-level', 'warn'])
+            _wait_for_port(listener_port, self.startup_timeout)
+            self.grpc_web_target = f'127.0.0.1:{listener_port}'
+
+    def __exit__(self, *exc_info):
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.wait()
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
@@ -0,0 +1,250 @@
+"""
+Micro-benchmarks of the hot paths: python -m sum_service.bench.micro --help
+
+Each benchmark reports operations per second (best of several timed
+repeats), the peak bytes allocated by one operation and the memory blocks
+it leaves behind. Results can be saved as a baseline and later runs
+compared against it.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent import futures
+
+import grpc
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+
+from sum_service.grpc.accumulator import AccumulatorStore
+from sum_service.grpc.server import SumServicer
+from sum_service.grpc.watch import add_sum_service
+
+DEFAULT_THRESHOLD = 0.10
+
+class _Context:
+    """The parts of a ServicerContext that SumServicer uses."""
+
+    def invocation_metadata(self):
+        return ()
+
+class _StubPool:
+    """Upstream pool whose CalculateSum answers immediately, to isolate the proxy's JSON path."""
+
+    sharded = False
+
+    def __init__(self):
+        self._response = sum_pb2.SumResponse(result=1)
+
+    def stub(self, key=None):
+        return self
+
+    async def CalculateSum(self, request):
+        return self._response
+
+class Benchmark:
+    """A named operation; setup() returns (operation, cleanup or None).
+
+    threads > 1 runs the operation from that many threads at once and
+    reports their combined rate.
+    """
+
+    def __init__(self, name, setup, threads=1):
+        self.name = name
+        self.setup = setup
+        self.threads = threads
+
+def _servicer_call():
+    servicer, context = SumServicer(), _Context()
+    request = sum_pb2.SumRequest(number=1, key='bench')
+    return lambda: servicer.CalculateSum(request, context), None
+
+def _in_process_rpc():
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_sum_service(SumServicer(), server)
+    port = server.add_insecure_port('localhost:0')
+    server.start()
+    channel = grpc.insecure_channel(f'localhost:{port}')
+    stub = sum_pb2_grpc.SumServiceStub(channel)
+    request = sum_pb2.SumRequest(number=1, key='bench')
+    stub.CalculateSum(request)
+
+    def cleanup():
+        channel.close()
+        server.stop(0)
+    return lambda: stub.CalculateSum(request), cleanup
+
+def _serialize():
+    request = sum_pb2.SumRequest(number=12345, key='bench')
+    return request.SerializeToString, None
+
+def _parse():
+    data = sum_pb2.SumResponse(result=123456789).SerializeToString()
+    return lambda: sum_pb2.SumResponse.FromString(data), None
+
+def _json_round_trip():
+    message = json.dumps({'number': 12345, 'key': 'bench', 'id': 7})
+    return lambda: json.dumps({'id': json.loads(message)['id'], 'sum': 123456789}), None
+
+def _proxy_process():
+    from sum_service.websocket.server import WebSocketProxy
+
+    loop = asyncio.new_event_loop()
+    proxy = WebSocketProxy(grpc_host='localhost', grpc_port=1, pool_size=1, coalesce=False)
+    loop.run_until_complete(proxy.pool.close())
+    proxy.pool = _StubPool()
+    message = json.dumps({'number': 12345, 'key': 'bench', 'id': 7})
+    return lambda: loop.run_until_complete(proxy.process(json.loads(message), 0)), loop.close
+
+def _accumulator(distinct_keys):
+    def setup():
+        store = AccumulatorStore()
+        local = threading.local()
+
+        def operation():
+            # Each thread adds to its own key, or all share one
+            key = getattr(local, 'key', None)
+            if key is None:
+                key = local.key = f'key-{threading.get_ident()}' if distinct_keys else 'shared'
+            store.add(key, 1)
+        return operation, None
+    return setup
+
+BENCHMARKS = (
+    Benchmark('servicer.calculate_sum', _servicer_call),
+    Benchmark('grpc.calculate_sum_rpc', _in_process_rpc),
+    Benchmark('proto.serialize_request', _serialize),
+    Benchmark('proto.parse_response', _parse),
+    Benchmark('json.round_trip', _json_round_trip),
+    Benchmark('proxy.process_json', _proxy_process),
+    Benchmark('accumulator.add_1_thread', _accumulator(True)),
+    Benchmark('accumulator.add_8_threads_shared_key', _accumulator(False), threads=8),
+    Benchmark('accumulator.add_8_threads_own_keys', _accumulator(True), threads=8),
+)
+
+def _time(operation, n, threads):
+    if threads == 1:
+        start = time.perf_counter()
+        for _ in range(n):
+            operation()
+        return time.perf_counter() - start
+    barrier = threading.Barrier(threads + 1)
+
+    def work():
+        barrier.wait()
+        for _ in range(n):
+            operation()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+def _allocations(operation, samples=200):
+    """Peak bytes allocated during one operation, and blocks still allocated after it."""
+    for _ in range(10):
+        operation()
+    tracemalloc.start()
+    try:
+        peak = 0
+        for _ in range(samples):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            operation()
+            peak += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(samples):
+        operation()
+    retained = (sys.getallocatedblocks() - blocks_before) / samples
+    return peak / samples, retained
+
+def run_benchmark(benchmark, min_time=0.2, repeats=5):
+    operation, cleanup = benchmark.setup()
+    try:
+        # Double n until one repeat takes at least min_time
+        n = 1
+        while _time(operation, n, benchmark.threads) < min_time:
+            n *= 2
+        best = min(_time(operation, n, benchmark.threads) for _ in range(repeats))
+        peak_bytes, retained_blocks = _allocations(operation)
+    finally:
+        if cleanup is not None:
+            cleanup()
+    return {
+        'ops_per_sec': n * benchmark.threads / best,
+        'alloc_peak_bytes_per_op': peak_bytes,
+        'retained_blocks_per_op': retained_blocks,
+    }
+
+def run_all(names=None, min_time=0.2, repeats=5):
+    results = {}
+    for benchmark in BENCHMARKS:
+        if names and not any(name in benchmark.name for name in names):
+            continue
+        results[benchmark.name] = run_benchmark(benchmark, min_time, repeats)
+    return results
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return a list of regression messages against baseline results.
+
+    A benchmark regresses when its rate drops, or its allocations grow,
+    by more than threshold (a fraction).
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['ops_per_sec'] < previous['ops_per_sec'] * (1 - threshold):
+            regressions.append(
+                f"{name}: {result['ops_per_sec']:.0f} ops/s, baseline {previous['ops_per_sec']:.0f}")
+        # Small absolute changes in allocation are noise, not regressions
+        allowed = max(previous['alloc_peak_bytes_per_op'] * (1 + threshold),
+                      previous['alloc_peak_bytes_per_op'] + 64)
+        if result['alloc_peak_bytes_per_op'] > allowed:
+            regressions.append(
+                f"{name}: {result['alloc_peak_bytes_per_op']:.0f} bytes/op allocated, "
+                f"baseline {previous['alloc_peak_bytes_per_op']:.0f}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m sum_service.bench.micro', description="Micro-benchmarks of the sum service hot paths")
+    parser.add_argument('names', nargs='*', help="only run benchmarks whose name contains one of these")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per timed repeat")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--baseline', help="compare against results saved in this file")
+    parser.add_argument('--save-baseline', help="save the results to this file")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="fractional slowdown or allocation growth that counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_all(args.names, args.min_time, args.repeats)
+    print(f"{'benchmark':<40} {'ops/s':>12} {'peak B/op':>10} {'kept blk/op':>11}")
+    for name, result in results.items():
+        print(f"{name:<40} {result['ops_per_sec']:12.0f} {result['alloc_peak_bytes_per_op']:10.0f} "
+              f"{result['retained_blocks_per_op']:11.2f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Latency recording and percentile summaries.
+"""
+
+import array
+import math
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+class LatencyRecorder:
+    """Keeps every latency sample (in seconds) so percentiles are exact."""
+
+    def __init__(self):
+        self.samples = array.array('d')
+        self.errors = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def error(self):
+        self.errors += 1
+
+    def percentile(self, sorted_samples, p):
+        if not sorted_samples:
+            return 0.0
+        # Nearest-rank: the smallest sample with at least p% of samples at or below it
+        rank = max(1, math.ceil(round(p / 100 * len(sorted_samples), 9)))
+        return sorted_samples[rank - 1]
+
+    def summary(self, elapsed):
+        """Throughput and latency percentiles in milliseconds."""
+        samples = sorted(self.samples)
+        latency = {f'p{p:g}'.replace('.', ''): self.percentile(samples, p) * 1000 for p in PERCENTILES}
+        latency['mean'] = sum(samples) / len(samples) * 1000 if samples else 0.0
+        latency['max'] = samples[-1] * 1000 if samples else 0.0
+        return {
+            'requests': len(samples),
+            'errors': self.errors,
+            'elapsed_s': elapsed,
+            'throughput_rps': len(samples) / elapsed if elapsed else 0.0,
+            'latency_ms': latency,
+        }
@@ -0,0 +1,85 @@
+"""
+Closed-loop and open-loop load generation.
+
+Closed loop: each of the clients sends its next request as soon as the
+previous one completes, which measures peak throughput but hides queueing
+(a slow response also delays the requests that would have followed it).
+
+Open loop: requests are issued on a fixed schedule of rate per second no
+matter how the service keeps up. Latency is measured from each request's
+scheduled start, so time spent waiting behind slow requests is counted and
+the percentiles are free of coordinated omission.
+"""
+
+import asyncio
+import time
+
+from sum_service.bench.recorder import LatencyRecorder
+
+async def run_closed_loop(clients, duration, warmup=0.0):
+    """Drive every client back-to-back; returns the recorder summary."""
+    recorder = LatencyRecorder()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    end = measure_from + duration
+
+    async def drive(client):
+        while True:
+            sent = time.perf_counter()
+            if sent >= end:
+                return
+            try:
+                await client.call(1)
+            except Exception:
+                if sent >= measure_from:
+                    recorder.error()
+                continue
+            if sent >= measure_from:
+                recorder.record(time.perf_counter() - sent)
+
+    await asyncio.gather(*(drive(client) for client in clients))
+    return recorder.summary(time.perf_counter() - measure_from)
+
+async def run_open_loop(clients, rate, duration, warmup=0.0):
+    """Issue rate requests per second over the clients; returns the recorder summary."""
+    if rate <= 0:
+        raise ValueError("rate must be positive")
+    recorder = LatencyRecorder()
+    idle = asyncio.Queue()
+    for client in clients:
+        idle.put_nowait(client)
+
+    async def issue(scheduled, measured):
+        # Waiting for a free client counts towards latency: it is queueing
+        client = await idle.get()
+        try:
+            await client.call(1)
+        except Exception:
+            if measured:
+                recorder.error()
+            return
+        finally:
+            idle.put_nowait(client)
+        if measured:
+            recorder.record(time.perf_counter() - scheduled)
+
+    start = time.perf_counter()
+    measure_from = start + warmup
+    end = measure_from + duration
+    tasks = set()
+    sent = 0
+    while True:
+        scheduled = start + sent / rate
+        if scheduled >= end:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Issue everything that is due, so a late wake-up does not lower the rate
+        task = asyncio.ensure_future(issue(scheduled, scheduled >= measure_from))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        sent += 1
+    if tasks:
+        await asyncio.wait(tasks)
+    return recorder.summary(max(end, time.perf_counter()) - measure_from)
@@ -0,0 +1,188 @@
+"""
+Clients for the three paths into the sum service.
+
+Each transport opens its connections in open() and hands out clients whose
+call(number) sends one CalculateSum and returns the running sum.
+"""
+
+import asyncio
+import json
+import grpc
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+import websockets
+
+CALCULATE_SUM_PATH = '/sum.SumService/CalculateSum'
+
+class BenchError(Exception):
+    """A request that completed without a usable running sum."""
+
+class _GrpcClient:
+    def __init__(self, stub, key):
+        self.stub = stub
+        self.key = key
+
+    async def call(self, number):
+        response = await self.stub.CalculateSum(sum_pb2.SumRequest(number=number, key=self.key))
+        return response.result
+
+class GrpcTransport:
+    """Direct gRPC with connections channels shared round-robin by the clients."""
+
+    name = 'grpc'
+
+    def __init__(self, target, connections=1, key='bench'):
+        self.target = target
+        self.connections = connections
+        self.key = key
+        self._channels = []
+        self._stubs = []
+
+    async def open(self):
+        for _ in range(self.connections):
+            # A local subchannel pool gives each channel its own TCP connection
+            channel = grpc.aio.insecure_channel(self.target, options=[('grpc.use_local_subchannel_pool', 1)])
+            await channel.channel_ready()
+            self._channels.append(channel)
+            self._stubs.append(sum_pb2_grpc.SumServiceStub(channel))
+
+    async def client(self, index):
+        return _GrpcClient(self._stubs[index % len(self._stubs)], self.key)
+
+    async def close(self):
+        for channel in self._channels:
+            await channel.close()
+
+class _WebSocketClient:
+    def __init__(self, websocket, key):
+        self.websocket = websocket
+        self.key = key
+
+    async def call(self, number):
+        await self.websocket.send(json.dumps({'number': number, 'key': self.key}))
+        reply = json.loads(await self.websocket.recv())
+        if 'sum' not in reply:
+            raise BenchError(reply.get('error', 'no sum in reply'))
+        return reply['sum']
+
+class WebSocketTransport:
+    """The WebSocket proxy, one connection per client, JSON messages."""
+
+    name = 'websocket'
+
+    def __init__(self, url, key='bench'):
+        self.url = url
+        self.key = key
+        self._connections = []
+
+    async def open(self):
+        pass
+
+    async def client(self, index):
+        websocket = await websockets.connect(self.url)
+        self._connections.append(websocket)
+        return _WebSocketClient(websocket, self.key)
+
+    async def close(self):
+        for websocket in self._connections:
+            await websocket.close()
+
+def encode_grpc_web_request(message):
+    body = message.SerializeToString()
+    return b'\x00' + len(body).to_bytes(4, 'big') + body
+
+def decode_grpc_web_response(payload, headers):
+    """Return the message bytes of a unary gRPC-Web response, checking grpc-status."""
+    status = headers.get('grpc-status')
+    message = None
+    offset = 0
+    while offset + 5 <= len(payload):
+        flags = payload[offset]
+        length = int.from_bytes(payload[offset + 1:offset + 5], 'big')
+        data = payload[offset + 5:offset + 5 + length]
+        offset += 5 + length
+        if flags & 0x80:
+            for line in data.decode('ascii', 'replace').split('\r\n'):
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'grpc-status':
+                    status = value.strip()
+        else:
+            message = data
+    if status not in (None, '0'):
+        raise BenchError(f"grpc-status {status}")
+    if message is None:
+        raise BenchError("gRPC-Web response had no message")
+    return message
+
+class _GrpcWebClient:
+    def __init__(self, reader, writer, host, key):
+        self.reader = reader
+        self.writer = writer
+        self.key = key
+        self.head = (
+            f'POST {CALCULATE_SUM_PATH} HTTP/1.1\r\n'
+            f'Host: {host}\r\n'
+            'Content-Type: application/grpc-web+proto\r\n'
+            'Accept: application/grpc-web+proto\r\n'
+            'X-Grpc-Web: 1\r\n'
+        )
+
+    async def call(self, number):
+        frame = encode_grpc_web_request(sum_pb2.SumRequest(number=number, key=self.key))
+        self.writer.write(f'{self.head}Content-Length: {len(frame)}\r\n\r\n'.encode('ascii') + frame)
+        status, headers, payload = await _read_http_response(self.reader)
+        if status != 200:
+            raise BenchError(f"HTTP {status}")
+        return sum_pb2.SumResponse.FromString(decode_grpc_web_response(payload, headers)).result
+
+class GrpcWebTransport:
+    """gRPC-Web through Envoy over HTTP/1.1 keep-alive, one connection per client."""
+
+    name = 'grpc-web'
+
+    def __init__(self, target, key='bench'):
+        self.host, _, port = target.rpartition(':')
+        self.port = int(port)
+        self.key = key
+        self._writers = []
+
+    async def open(self):
+        pass
+
+    async def client(self, index):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self._writers.append(writer)
+        return _GrpcWebClient(reader, writer, f'{self.host}:{self.port}', self.key)
+
+    async def close(self):
+        for writer in self._writers:
+            writer.close()
+
+async def _read_http_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise BenchError("Connection closed by server")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        payload = await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # Skip HTTP trailers up to the blank line
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        payload = b''.join(chunks)
+    else:
+        payload = b''
+    return status, headers, payload
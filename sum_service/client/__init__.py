@@ -0,0 +1,7 @@
+"""
+Client SDK for the sum service.
+
+sum_service.client.sync.SumClient: blocking gRPC client, shareable by threads
+sum_service.client.aio.AsyncSumClient: the same calls for asyncio
+sum_service.client.websocket.WebSocketClient: pipelined client for the WebSocket proxy
+"""
@@ -0,0 +1,74 @@
+"""
+asyncio (grpc.aio) client for the sum service.
+"""
+
+from sum_service.grpc.proto import sum_pb2
+
+from sum_service.client.retry import RetryPolicy, call_with_retry_async
+from sum_service.client.sync import default_target, new_request_id
+from sum_service.websocket.channel_pool import ChannelPool, ShardedChannelPool
+from sum_service.websocket.coalescer import Coalescer
+
+class _Batcher(Coalescer):
+    """The proxy's Coalescer, sending its batches with the client's deadline and retries."""
+
+    def __init__(self, client, window, max_batch):
+        super().__init__(client.pool, window, max_batch)
+        self.client = client
+
+    async def _call(self, key, request):
+        request.request_id = new_request_id()
+        return await self.client._call('CalculateSumBatch', request, key, None)
+
+class AsyncSumClient:
+    """SumClient for asyncio: the same calls, as coroutines on one event loop.
+
+    submit() batches numbers from every task of the loop onto
+    CalculateSumBatch and returns the running sum just after the number.
+    """
+
+    def __init__(self, target=None, pool_size=4, timeout=5.0, retry=None, batch_window=0.002, max_batch=256):
+        target = target or default_target()
+        if isinstance(target, str):
+            self.pool = ChannelPool(target, size=pool_size)
+        else:
+            self.pool = ShardedChannelPool(target, size=pool_size)
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.batcher = _Batcher(self, batch_window, max_batch)
+
+    async def _call(self, method, request, key, timeout):
+        return await call_with_retry_async(self.retry, lambda: getattr(self.pool.stub(key), method), request,
+                                           self.timeout if timeout is None else timeout)
+
+    async def add(self, number, key='', timeout=None):
+        request = sum_pb2.SumRequest(number=number, key=key, request_id=new_request_id())
+        return (await self._call('CalculateSum', request, key, timeout)).result
+
+    async def add_many(self, numbers, key='', running_sums=False, timeout=None):
+        request = sum_pb2.SumBatchRequest(numbers=numbers, key=key, include_running_sums=running_sums,
+                                          request_id=new_request_id())
+        response = await self._call('CalculateSumBatch', request, key, timeout)
+        return response.result, list(response.running_sums)
+
+    async def submit(self, number, key=''):
+        return await self.batcher.calculate_sum(number, key)
+
+    async def get(self, key='', merged=False, timeout=None):
+        return (await self._call('GetSum', sum_pb2.GetSumRequest(key=key, merged=merged), key, timeout)).result
+
+    def watch(self, key='', min_interval=0.0):
+        """Async iterator over SumUpdates of key, starting with its current sum."""
+        request = sum_pb2.WatchSumRequest(key=key, min_interval_ms=int(min_interval * 1000))
+        return self.pool.stub(key).WatchSum(request)
+
+    async def close(self):
+        """Send any queued numbers, wait for their batches, then close every channel."""
+        await self.batcher.drain()
+        await self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
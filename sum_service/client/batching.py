@@ -0,0 +1,101 @@
+"""
+Client-side batching for SumClient.submit().
+"""
+
+import threading
+import time
+from concurrent import futures
+
+from sum_service.websocket.coalescer import INT32_MAX, INT32_MIN
+
+class Batcher:
+    """Gathers numbers submitted from any thread into one CalculateSumBatch per key.
+
+    The thread counterpart of the proxy's Coalescer: a flusher thread sends
+    what is pending once window seconds have passed since the first pending
+    number or max_batch numbers are waiting. send_batch(key, numbers) makes
+    the call and returns the running sum after each number; up to
+    concurrency batches are sent at once.
+    """
+
+    def __init__(self, send_batch, window=0.002, max_batch=256, concurrency=4):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.window = window
+        self.max_batch = max_batch
+        self._send_batch = send_batch
+        self._pending = {}
+        self._count = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flusher = None
+        self._senders = futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='sum-batch')
+        self.batches = 0
+        self.requests = 0
+
+    def submit(self, number, key=''):
+        """Queue one number for key; the returned Future resolves to its running sum."""
+        if isinstance(number, bool) or not isinstance(number, int):
+            raise TypeError(f"number must be an integer, got {number!r}")
+        if not INT32_MIN <= number <= INT32_MAX:
+            raise ValueError(f"number out of int32 range: {number}")
+        future = futures.Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Batcher is closed")
+            self._pending.setdefault(key, []).append((number, future))
+            self._count += 1
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name='sum-batch-flusher', daemon=True)
+                self._flusher.start()
+            # Wake the flusher to start a window, or to end it early
+            if self._count == 1 or self._count >= self.max_batch:
+                self._wakeup.notify()
+        return future
+
+    def _take(self):
+        """Wait for the next batch window to close and return what is pending, or None once closed."""
+        with self._lock:
+            while not self._count:
+                if self._closed:
+                    return None
+                self._wakeup.wait()
+            deadline = time.monotonic() + self.window
+            while self._count < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wakeup.wait(remaining)
+            pending, self._pending, self._count = self._pending, {}, 0
+            return pending
+
+    def _run(self):
+        while True:
+            pending = self._take()
+            if pending is None:
+                return
+            for key, entries in pending.items():
+                self.batches += 1
+                self.requests += len(entries)
+                self._senders.submit(self._send, key, entries)
+
+    def _send(self, key, entries):
+        try:
+            running_sums = self._send_batch(key, [number for number, _ in entries])
+        except Exception as e:
+            for _, future in entries:
+                future.set_exception(e)
+            return
+        for (_, future), running_sum in zip(entries, running_sums):
+            future.set_result(running_sum)
+
+    def close(self):
+        """Send what is still pending, wait for every batch to finish and stop."""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            flusher = self._flusher
+        if flusher is not None:
+            flusher.join()
+        self._senders.shutdown(wait=True)
@@ -0,0 +1,70 @@
+"""
+Pools of blocking gRPC channels for SumClient.
+
+The grpc.aio pools used by AsyncSumClient are the proxy's own, in
+sum_service.websocket.channel_pool.
+"""
+
+import itertools
+import threading
+
+import grpc
+from sum_service.grpc.proto import sum_pb2_grpc
+
+from sum_service.grpc.accumulator import DEFAULT_KEY
+from sum_service.hashring import ShardRouter
+from sum_service.websocket.channel_pool import CHANNEL_OPTIONS
+
+class ChannelPool:
+    """Round-robin pool of blocking channels to one target.
+
+    Each channel is its own HTTP/2 connection, so calls from many threads
+    are not funnelled through one. Channels are opened on first use and
+    reused until close().
+    """
+
+    sharded = False
+
+    def __init__(self, target, size=4, options=None):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.target = target
+        self.size = size
+        self.options = CHANNEL_OPTIONS if options is None else options
+        self._channels = []
+        self._stubs = None
+        self._lock = threading.Lock()
+
+    def stub(self, key=None):
+        """Return the next SumService stub in round-robin order."""
+        stubs = self._stubs
+        if stubs is None:
+            with self._lock:
+                if self._stubs is None:
+                    self._channels = [grpc.insecure_channel(self.target, options=self.options)
+                                      for _ in range(self.size)]
+                    self._stubs = itertools.cycle([sum_pb2_grpc.SumServiceStub(c) for c in self._channels])
+                stubs = self._stubs
+        return next(stubs)
+
+    def close(self):
+        with self._lock:
+            channels, self._channels, self._stubs = self._channels, [], None
+        for channel in channels:
+            channel.close()
+
+class ShardedChannelPool:
+    """One ChannelPool per replica, chosen by consistent hash of the key, as the proxy routes them."""
+
+    sharded = True
+
+    def __init__(self, targets, size=4, options=None):
+        self._router = ShardRouter(targets, lambda target: ChannelPool(target, size=size, options=options))
+
+    def stub(self, key=''):
+        # An empty key is the server's default key; route them together
+        return self._router.get(key or DEFAULT_KEY).stub()
+
+    def close(self):
+        for pool in self._router.objects():
+            pool.close()
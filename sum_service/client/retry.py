@@ -0,0 +1,90 @@
+"""
+Deadlines and retries for client calls.
+
+Every call has one overall deadline; retries happen within it, with
+exponential backoff and full jitter. The clients give every addition a
+request_id that all of its attempts share, so a retry of an attempt that
+did reach the server is not counted twice.
+"""
+
+import asyncio
+import random
+import time
+
+import grpc
+
+# Rejected by admission control, not reached, or too slow: safe to retry
+# because additions carry a request_id
+RETRYABLE_CODES = frozenset((
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+))
+
+class RetryPolicy:
+    """How often and how patiently to retry a failed call.
+
+    attempts counts the first call, so attempts=1 disables retries. The
+    n-th retry waits a random time up to
+    min(max_backoff, initial_backoff * multiplier ** n).
+    """
+
+    def __init__(self, attempts=3, initial_backoff=0.05, max_backoff=1.0, multiplier=2.0,
+                 codes=RETRYABLE_CODES):
+        if attempts < 1:
+            raise ValueError("attempts must be at least 1")
+        self.attempts = attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+        self.codes = frozenset(codes)
+
+    def retryable(self, error):
+        return isinstance(error, grpc.RpcError) and error.code() in self.codes
+
+    def backoff(self, retry):
+        return random.uniform(0, min(self.max_backoff, self.initial_backoff * self.multiplier ** retry))
+
+def _next_delay(policy, attempt, error, deadline):
+    """Seconds to wait before the next attempt, or None to give up and raise error."""
+    if attempt + 1 >= policy.attempts or not policy.retryable(error):
+        return None
+    delay = policy.backoff(attempt)
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+def _remaining(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+def call_with_retry(policy, method, request, timeout=None):
+    """Call method()(request) until it succeeds, retries run out or timeout seconds pass.
+
+    method is called again for each attempt, so a pool can hand out a
+    different channel every time.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    attempt = 0
+    while True:
+        try:
+            return method()(request, timeout=_remaining(deadline))
+        except grpc.RpcError as e:
+            delay = _next_delay(policy, attempt, e, deadline)
+            if delay is None:
+                raise
+        time.sleep(delay)
+        attempt += 1
+
+async def call_with_retry_async(policy, method, request, timeout=None):
+    """call_with_retry for grpc.aio stubs."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    attempt = 0
+    while True:
+        try:
+            return await method()(request, timeout=_remaining(deadline))
+        except grpc.RpcError as e:
+            delay = _next_delay(policy, attempt, e, deadline)
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,81 @@
+"""
+Blocking gRPC client for the sum service.
+"""
+
+import os
+import uuid
+
+from sum_service.grpc.proto import sum_pb2
+
+from sum_service.client.batching import Batcher
+from sum_service.client.pool import ChannelPool, ShardedChannelPool
+from sum_service.client.retry import RetryPolicy, call_with_retry
+
+def default_target():
+    return f"{os.getenv('GRPC_HOST', 'localhost')}:{os.getenv('GRPC_PORT', '50051')}"
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+class SumClient:
+    """SumService client that can be shared by any number of threads.
+
+    target is host:port, or a list of replicas over which keys are sharded
+    the same way the proxy shards them. timeout is the deadline of each
+    call, retries included; every call may override it. add() and
+    add_many() are single calls; submit() queues a number and batches it
+    with those of other threads onto CalculateSumBatch.
+    """
+
+    def __init__(self, target=None, pool_size=4, timeout=5.0, retry=None, batch_window=0.002, max_batch=256):
+        target = target or default_target()
+        if isinstance(target, str):
+            self.pool = ChannelPool(target, size=pool_size)
+        else:
+            self.pool = ShardedChannelPool(target, size=pool_size)
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.batcher = Batcher(self._send_batch, batch_window, max_batch, concurrency=pool_size)
+
+    def _call(self, method, request, key, timeout):
+        return call_with_retry(self.retry, lambda: getattr(self.pool.stub(key), method), request,
+                               self.timeout if timeout is None else timeout)
+
+    def add(self, number, key='', timeout=None):
+        """Add number to key and return the new running sum."""
+        request = sum_pb2.SumRequest(number=number, key=key, request_id=new_request_id())
+        return self._call('CalculateSum', request, key, timeout).result
+
+    def add_many(self, numbers, key='', running_sums=False, timeout=None):
+        """Add numbers to key atomically; returns (sum, running sums if requested, else [])."""
+        request = sum_pb2.SumBatchRequest(numbers=numbers, key=key, include_running_sums=running_sums,
+                                          request_id=new_request_id())
+        response = self._call('CalculateSumBatch', request, key, timeout)
+        return response.result, list(response.running_sums)
+
+    def _send_batch(self, key, numbers):
+        return self.add_many(numbers, key, running_sums=True)[1]
+
+    def submit(self, number, key=''):
+        """Queue number for key; the returned Future resolves to the running sum just after it."""
+        return self.batcher.submit(number, key)
+
+    def get(self, key='', merged=False, timeout=None):
+        """Return the running sum of key without changing it."""
+        return self._call('GetSum', sum_pb2.GetSumRequest(key=key, merged=merged), key, timeout).result
+
+    def watch(self, key='', min_interval=0.0):
+        """Iterate over SumUpdates of key, starting with its current sum; cancel() ends it."""
+        request = sum_pb2.WatchSumRequest(key=key, min_interval_ms=int(min_interval * 1000))
+        return self.pool.stub(key).WatchSum(request)
+
+    def close(self):
+        """Send any queued numbers, then close every channel."""
+        self.batcher.close()
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
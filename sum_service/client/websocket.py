@@ -0,0 +1,110 @@
+"""
+Pipelined client for the WebSocket proxy.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import time
+
+import websockets
+
+from sum_service.client.retry import RetryPolicy
+from sum_service.client.sync import new_request_id
+from sum_service.websocket.codec import JSON_SUBPROTOCOL
+
+def default_url():
+    return f"ws://{os.getenv('WS_HOST', 'localhost')}:{os.getenv('WS_PORT', '8765')}"
+
+class WebSocketClient:
+    """Sends numbers over one WebSocket connection with many requests in flight.
+
+    Up to max_in_flight requests are outstanding at once. Each carries an
+    "id", so the proxy answers it as soon as it completes, and a request_id,
+    so a request resent after a reconnect is added only once. A lost
+    connection is re-opened on the next request. Errors reported by the
+    proxy are raised as RuntimeError and are not retried.
+    """
+
+    def __init__(self, url=None, max_in_flight=64, timeout=5.0, retry=None):
+        self.url = url or default_url()
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._ids = itertools.count()
+        self._connect_lock = asyncio.Lock()
+        self._connection = None
+        self._reader = None
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._reader is None or self._reader.done():
+                websocket = await websockets.connect(self.url, subprotocols=[JSON_SUBPROTOCOL])
+                # Replies are matched to requests of this connection only
+                self._connection = (websocket, {})
+                self._reader = asyncio.ensure_future(self._read(*self._connection))
+            return self._connection
+
+    async def _read(self, websocket, pending):
+        try:
+            async for message in websocket:
+                reply = json.loads(message)
+                future = pending.pop(reply.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("WebSocket connection closed"))
+            pending.clear()
+
+    async def _request(self, payload):
+        async with self._slots:
+            websocket, pending = await self._connect()
+            payload['id'] = message_id = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            pending[message_id] = future
+            try:
+                await websocket.send(json.dumps(payload))
+                return await future
+            finally:
+                pending.pop(message_id, None)
+
+    async def add(self, number, key='', timeout=None):
+        """Add number to key and return the new running sum."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        payload = {'number': number, 'key': key, 'request_id': new_request_id()}
+        attempt = 0
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                reply = await asyncio.wait_for(self._request(dict(payload)), remaining)
+                break
+            except (OSError, websockets.exceptions.WebSocketException):
+                # Not answered on this connection; the retry reuses the request_id
+                attempt += 1
+                if attempt >= self.retry.attempts:
+                    raise
+                delay = self.retry.backoff(attempt - 1)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+            await asyncio.sleep(delay)
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply['sum']
+
+    async def close(self):
+        if self._connection is not None:
+            await self._connection[0].close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
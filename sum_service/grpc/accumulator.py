@@ -0,0 +1,131 @@
+"""
+Keyed accumulator store with lock striping.
+"""
+
+import threading
+from itertools import accumulate
+
+DEFAULT_KEY = 'default'
+DEFAULT_STRIPES = 64
+
+# Sums travel as protobuf int64
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+def check_int64(value):
+    """Return value, or raise OverflowError if it does not fit in an int64."""
+    if not INT64_MIN <= value <= INT64_MAX:
+        raise OverflowError(f"Sum {value} is outside the int64 range")
+    return value
+
+
+class _Stripe:
+    __slots__ = ('lock', 'sums')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sums = {}
+
+
+class AccumulatorStore:
+    """Running sums keyed by session/tenant.
+
+    Keys are spread over a fixed number of stripes, each with its own lock
+    and dict, so updates to different keys rarely contend and updates to the
+    same key are atomic. An update whose sum would not fit in an int64
+    raises OverflowError and leaves the sum unchanged.
+
+    An optional journal (see persistence.Persistence) is told each key's new
+    sum while the stripe lock is held, so its records are in the same order as
+    the updates; journal.wait() is then called after the lock is released.
+    The record is made before the sum changes, so a key the journal refuses
+    leaves the store untouched; max_key_bytes is the journal's key limit.
+    """
+
+    def __init__(self, stripes=DEFAULT_STRIPES, journal=None):
+        if stripes < 1:
+            raise ValueError("stripes must be at least 1")
+        self._stripes = tuple(_Stripe() for _ in range(stripes))
+        self._journal = journal
+
+    @property
+    def max_key_bytes(self):
+        return getattr(self._journal, 'max_key_bytes', None)
+
+    def load(self, sums):
+        """Bulk-set sums, e.g. recovered state, without journaling them."""
+        for key, value in sums.items():
+            stripe = self._stripe(key)
+            with stripe.lock:
+                stripe.sums[key] = value
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def add(self, key, delta):
+        """Add delta to the sum for key and return the new sum."""
+        stripe = self._stripe(key)
+        journal = self._journal
+        with stripe.lock:
+            value = check_int64(stripe.sums.get(key, 0) + delta)
+            if journal is not None:
+                seq = journal.record(key, value)
+            stripe.sums[key] = value
+        if journal is not None:
+            journal.wait(seq)
+        return value
+
+    def add_many(self, key, deltas, running_sums=False):
+        """Add deltas to the sum for key in one atomic step.
+
+        Returns (final_sum, prefix_sums). prefix_sums holds the running sum
+        after each delta when running_sums is true and is None otherwise.
+        """
+        if not running_sums:
+            return self.add(key, sum(deltas)), None
+        it = iter(deltas)
+        first = next(it, None)
+        if first is None:
+            return self.get(key), []
+        stripe = self._stripe(key)
+        journal = self._journal
+        with stripe.lock:
+            # One C-level prefix-sum pass, seeded with the current sum
+            sums = list(accumulate(it, initial=stripe.sums.get(key, 0) + first))
+            check_int64(min(sums))
+            check_int64(max(sums))
+            if journal is not None:
+                seq = journal.record(key, sums[-1])
+            stripe.sums[key] = sums[-1]
+        if journal is not None:
+            journal.wait(seq)
+        return sums[-1], sums
+
+    def get(self, key):
+        """Return the current sum for key (0 if unknown)."""
+        stripe = self._stripe(key)
+        with stripe.lock:
+            return stripe.sums.get(key, 0)
+
+    def reset(self, key):
+        """Reset the sum for key to 0."""
+        stripe = self._stripe(key)
+        journal = self._journal
+        with stripe.lock:
+            if journal is not None:
+                seq = journal.record(key, 0)
+            stripe.sums.pop(key, None)
+        if journal is not None:
+            journal.wait(seq)
+        return 0
+
+    def snapshot(self):
+        """Return a point-in-time copy of all sums, one stripe at a time."""
+        result = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                result.update(stripe.sums)
+        return result
+
+    def __len__(self):
+        return sum(len(stripe.sums) for stripe in self._stripes)
@@ -0,0 +1,147 @@
+"""
+Admission control: an adaptive concurrency limit that sheds excess RPCs.
+"""
+
+import threading
+import time
+
+import grpc
+
+from sum_service.grpc.instrumentation import handler_behavior, wrap_handler
+
+# Health checks and reflection are always admitted
+EXEMPT_PREFIXES = ('/grpc.health.v1.Health/', '/grpc.reflection.')
+
+OVERLOADED_DETAILS = "Server is overloaded; retry with backoff"
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit driven by observed latency.
+
+    A request is admitted while fewer than limit requests are in flight and
+    rejected otherwise. Each completion under latency_target, while the
+    limit is actually in use, raises the limit by 1/limit (about +1 per
+    limit completions). A completion over the target multiplies the limit
+    by backoff, at most once per latency_target, so one slow burst does not
+    collapse it.
+    """
+
+    def __init__(self, initial_limit=20, min_limit=2, max_limit=200, latency_target=0.05,
+                 backoff=0.9, overload_hold=1.0):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.overload_hold = overload_hold
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._last_decrease = 0.0
+        self._last_rejection = float('-inf')
+
+    def try_acquire(self):
+        """Admit one request, or return False if the limit is reached."""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                self.rejected += 1
+                self._last_rejection = time.monotonic()
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency=None):
+        """Finish an admitted request; latency (seconds) adjusts the limit."""
+        with self._lock:
+            in_use = self.in_flight
+            self.in_flight -= 1
+            if latency is None:
+                return
+            if latency > self.latency_target:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.latency_target:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif in_use * 2 >= self.limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def overloaded(self):
+        """True if a request was rejected within the last overload_hold seconds."""
+        return time.monotonic() - self._last_rejection < self.overload_hold
+
+    def register_metrics(self, registry):
+        registry.gauge('grpc_server_concurrency_limit', "Current adaptive concurrency limit",
+                       function=lambda: int(self.limit))
+        registry.gauge('grpc_server_admitted_in_flight', "Admitted RPCs in flight",
+                       function=lambda: self.in_flight)
+        registry.counter('grpc_server_rejected_total', "RPCs rejected with RESOURCE_EXHAUSTED",
+                         function=lambda: self.rejected)
+
+def _exempt(handler, method):
+    # Streams (StreamSum producers, WatchSum watchers) are long-lived: holding a
+    # slot for their lifetime would let idle streams lock out every unary RPC,
+    # and their duration says nothing about the server's load
+    return handler.request_streaming or handler.response_streaming or method.startswith(EXEMPT_PREFIXES)
+
+def _reject(request, context):
+    context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, OVERLOADED_DETAILS)
+
+async def _reject_async(request, context):
+    await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, OVERLOADED_DETAILS)
+
+class AdmissionInterceptor(grpc.ServerInterceptor):
+    """Rejects RPCs over the limiter's limit as soon as a worker thread picks them up.
+
+    The slot is taken inside the handler rather than in intercept_service:
+    grpc applies maximum_concurrent_rpcs after the interceptors run, and an
+    RPC it rejects, or one cancelled while queued, never reaches the handler
+    to give its slot back. The clock still starts on the polling thread, so
+    the latency fed back to the limiter includes the time an RPC waits in
+    the thread pool. Streaming RPCs are not subject to the limit.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or _exempt(handler, handler_call_details.method):
+            return handler
+        accepted = time.perf_counter()
+        limiter = self.limiter
+        behavior = handler_behavior(handler)
+
+        def admitted(request, context):
+            if not limiter.try_acquire():
+                _reject(request, context)
+            try:
+                return behavior(request, context)
+            finally:
+                limiter.release(time.perf_counter() - accepted)
+
+        return wrap_handler(handler, admitted)
+
+class AsyncAdmissionInterceptor(grpc.aio.ServerInterceptor):
+    """AdmissionInterceptor for grpc.aio servers."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or _exempt(handler, handler_call_details.method):
+            return handler
+        accepted = time.perf_counter()
+        limiter = self.limiter
+        behavior = handler_behavior(handler)
+
+        async def admitted(request, context):
+            if not limiter.try_acquire():
+                await _reject_async(request, context)
+            try:
+                return await behavior(request, context)
+            finally:
+                limiter.release(time.perf_counter() - accepted)
+
+        return wrap_handler(handler, admitted)
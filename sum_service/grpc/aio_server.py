@@ -0,0 +1,169 @@
+"""
+asyncio (grpc.aio) server mode for the sum service.
+"""
+
+import asyncio
+import contextlib
+import grpc
+from grpc_health.v1 import health_pb2
+from grpc_health.v1 import health_pb2_grpc
+from grpc_reflection.v1alpha import reflection
+import logging
+import os
+
+from sum_service.grpc.proto.sum_pb2 import SumResponse, SumBatchResponse
+from sum_service.grpc.proto.sum_pb2_grpc import SumServiceServicer
+
+from sum_service.grpc.accumulator import AccumulatorStore
+from sum_service.grpc.admission import AsyncAdmissionInterceptor
+from sum_service.grpc.dedup import add_batch, add_number
+from sum_service.grpc.instrumentation import AsyncMetricsInterceptor, ServerMetrics
+from sum_service.grpc.server import SERVICE_NAMES, HealthServicer, key_error, metadata_key, resolve_key
+from sum_service.grpc.watch import DEFAULT_INTERVAL, AsyncWatchHub, add_sum_service, watch_interval
+from sum_service.log import EventLogger, setup_logging
+
+logger = logging.getLogger(__name__)
+request_log = EventLogger(logger, 'request')
+stream_log = EventLogger(logger, 'stream')
+
+@contextlib.asynccontextmanager
+async def sum_in_range(context):
+    """server.sum_in_range for grpc.aio, whose abort is a coroutine."""
+    try:
+        yield
+    except OverflowError as error:
+        await context.abort(grpc.StatusCode.OUT_OF_RANGE, str(error))
+
+class AsyncSumServicer(SumServiceServicer):
+    """SumServicer for grpc.aio; handlers run on the event loop, not a thread pool."""
+
+    def __init__(self, store=None, watch_interval=DEFAULT_INTERVAL, dedup=None):
+        self.store = store if store is not None else AccumulatorStore()
+        self.dedup = dedup
+        self.watch_hub = AsyncWatchHub(self.store, watch_interval)
+
+    async def _check_key(self, key, context):
+        error = key_error(self.store, key)
+        if error:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, error)
+        return key
+
+    async def CalculateSum(self, request, context):
+        key = await self._check_key(resolve_key(request, context), context)
+        async with sum_in_range(context):
+            running_sum = add_number(self.store, self.dedup, key, request)
+        request_log("Received number %d for key %s, new sum: %d", request.number, key, running_sum)
+        return SumResponse(result=running_sum)
+
+    async def StreamSum(self, request_iterator, context):
+        stream_key = metadata_key(context)
+        count = 0
+        async for request in request_iterator:
+            count += 1
+            key = await self._check_key(request.key or stream_key, context)
+            async with sum_in_range(context):
+                running_sum = add_number(self.store, self.dedup, key, request)
+            yield SumResponse(result=running_sum)
+        stream_log("StreamSum closed after %d numbers", count)
+
+    async def CalculateSumBatch(self, request, context):
+        key = await self._check_key(resolve_key(request, context), context)
+        async with sum_in_range(context):
+            result, running_sums = add_batch(self.store, self.dedup, key, request)
+        request_log("Received batch of %d numbers for key %s, new sum: %d", len(request.numbers), key, result)
+        return SumBatchResponse(result=result, running_sums=running_sums)
+
+    async def GetSum(self, request, context):
+        key = await self._check_key(resolve_key(request, context), context)
+        return SumResponse(result=self.store.get(key))
+
+    async def WatchSum(self, request, context):
+        hub = self.watch_hub
+        topic = hub.subscribe(await self._check_key(resolve_key(request, context), context))
+        interval = watch_interval(request, hub)
+        stream_log("WatchSum opened for key %s", topic.key)
+        try:
+            version = 0
+            while True:
+                changed = topic.changed
+                latest_version, encoded = topic.latest
+                if latest_version == version:
+                    await changed.wait()
+                    continue
+                version = latest_version
+                yield encoded
+                await asyncio.sleep(interval)
+        finally:
+            hub.unsubscribe(topic)
+            stream_log("WatchSum closed for key %s", topic.key)
+
+    async def ResetSum(self, request, context):
+        key = await self._check_key(resolve_key(request, context), context)
+        self.store.reset(key)
+        logger.info("Reset running sum for key %s to 0", key)
+        return SumResponse(result=0)
+
+class AsyncHealthServicer(HealthServicer):
+    """HealthServicer for grpc.aio; Watch re-checks the status every watch_interval."""
+
+    async def Check(self, request, context):
+        return health_pb2.HealthCheckResponse(status=self.status())
+
+    async def Watch(self, request, context):
+        last = None
+        while True:
+            status = self.status()
+            if status != last:
+                last = status
+                yield health_pb2.HealthCheckResponse(status=status)
+            await asyncio.sleep(self.watch_interval)
+
+def create_server(store=None, options=None, registry=None, limiter=None, max_concurrent_rpcs=None,
+                  watch_interval=DEFAULT_INTERVAL, dedup=None):
+    """Build a grpc.aio server with the sum, health and reflection services.
+
+    With a metrics registry, every RPC is instrumented; with an
+    AdaptiveLimiter, RPCs over its limit are rejected with RESOURCE_EXHAUSTED;
+    with a DedupCache, numbers carrying a request_id are added only once.
+    """
+    interceptors = []
+    if registry is not None:
+        interceptors.append(AsyncMetricsInterceptor(ServerMetrics(registry)))
+    if limiter is not None:
+        interceptors.append(AsyncAdmissionInterceptor(limiter))
+        if registry is not None:
+            limiter.register_metrics(registry)
+    if dedup is not None and registry is not None:
+        dedup.register_metrics(registry)
+    server = grpc.aio.server(options=options, interceptors=interceptors,
+                             maximum_concurrent_rpcs=max_concurrent_rpcs)
+    servicer = AsyncSumServicer(store, watch_interval, dedup)
+    add_sum_service(servicer, server)
+    health_pb2_grpc.add_HealthServicer_to_server(AsyncHealthServicer(limiter), server)
+    reflection.enable_server_reflection(SERVICE_NAMES, server)
+    return server
+
+async def serve_async(port=50051, store=None, registry=None, limiter=None, max_concurrent_rpcs=None,
+                      watch_interval=DEFAULT_INTERVAL, dedup=None):
+    server = create_server(store, registry=registry, limiter=limiter, max_concurrent_rpcs=max_concurrent_rpcs,
+                           watch_interval=watch_interval, dedup=dedup)
+    address = f'0.0.0.0:{port}'
+    if not server.add_insecure_port(address):
+        raise RuntimeError(f"Failed to bind to {address}")
+    await server.start()
+    logger.info("gRPC aio server started on port %d", port)
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(5)
+
+def run(port=50051, store=None, registry=None, limiter=None, max_concurrent_rpcs=None,
+        watch_interval=DEFAULT_INTERVAL, dedup=None):
+    try:
+        asyncio.run(serve_async(port, store, registry, limiter, max_concurrent_rpcs, watch_interval, dedup))
+    except KeyboardInterrupt:
+        logger.info("Server stopped by user")
+
+if __name__ == '__main__':
+    setup_logging()
+    run(port=int(os.getenv('GRPC_PORT', '50051')))
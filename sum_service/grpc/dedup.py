@@ -0,0 +1,122 @@
+"""
+Idempotent additions: requests carrying a request_id are applied at most once.
+
+A client that retries or hedges a CalculateSum or CalculateSumBatch sends
+every attempt with the same request_id. The first attempt is applied; later
+ones get the original result back without adding again, as long as the
+first is still remembered: entries expire after ttl seconds, and the oldest
+finished ones are evicted beyond max_entries.
+"""
+
+import collections
+import functools
+import threading
+import time
+
+class _Entry:
+    __slots__ = ('expires', 'result', 'finished', 'done')
+
+    def __init__(self, expires):
+        self.expires = expires
+        self.result = None
+        self.finished = False
+        # Created only when a duplicate arrives while the first attempt runs
+        self.done = None
+
+class DedupCache:
+    """Results of recent requests by (key, request_id), bounded by age and count."""
+
+    def __init__(self, ttl=60.0, max_entries=100000, clock=time.monotonic):
+        if ttl <= 0 or max_entries < 1:
+            raise ValueError("ttl and max_entries must be positive")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self._clock = clock
+        # Insertion order is expiry order, since every entry lives for ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries and next(iter(entries.values())).expires <= now:
+            entries.popitem(last=False)
+
+    def _evict_finished(self):
+        # A running entry is never evicted: a duplicate arriving after that
+        # would find nothing to wait for and add again
+        for entry_id, entry in self._entries.items():
+            if entry.finished:
+                del self._entries[entry_id]
+                return True
+        return False
+
+    def run(self, key, request_id, compute):
+        """Return compute() for the first request with this ID, and the same result for duplicates.
+
+        A duplicate that arrives while the first attempt is still running
+        waits for it. If the first attempt raises, it is forgotten, and the
+        next attempt computes afresh. While all max_entries entries are
+        still running, new IDs are computed without being remembered.
+        """
+        entry_id = (key, request_id)
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._evict(now)
+                entry = self._entries.get(entry_id)
+                if entry is None:
+                    if len(self._entries) < self.max_entries or self._evict_finished():
+                        entry = self._entries[entry_id] = _Entry(now + self.ttl)
+                    break
+                if entry.finished:
+                    self.hits += 1
+                    return entry.result
+                # Only thread-pool servers get here: on grpc.aio, compute()
+                # runs without yielding, so no duplicate sees it unfinished
+                if entry.done is None:
+                    entry.done = threading.Event()
+                done = entry.done
+            done.wait()
+        if entry is None:
+            return compute()
+        try:
+            result = compute()
+        except BaseException:
+            with self._lock:
+                if self._entries.get(entry_id) is entry:
+                    del self._entries[entry_id]
+                done = entry.done
+            if done is not None:
+                done.set()
+            raise
+        with self._lock:
+            entry.result = result
+            entry.finished = True
+            done = entry.done
+        if done is not None:
+            done.set()
+        return result
+
+    def register_metrics(self, registry):
+        registry.counter('grpc_server_dedup_hits_total', "Duplicate request IDs answered from the cache",
+                         function=lambda: self.hits)
+        registry.gauge('grpc_server_dedup_entries', "Request IDs remembered for deduplication",
+                       function=lambda: len(self._entries))
+
+def add_number(store, dedup, key, request):
+    """Add the request's number to key, once per request_id while dedup remembers it."""
+    if request.request_id and dedup is not None:
+        return dedup.run(key, request.request_id, functools.partial(store.add, key, request.number))
+    return store.add(key, request.number)
+
+def add_batch(store, dedup, key, request):
+    """Apply a SumBatchRequest to key, once per request_id while dedup remembers it."""
+    add = functools.partial(store.add_many, key, request.numbers, running_sums=request.include_running_sums)
+    if request.request_id and dedup is not None:
+        # Batch IDs are kept apart from single-number IDs, whose result differs in shape
+        return dedup.run(key, ('batch', request.request_id), add)
+    return add()
@@ -0,0 +1,154 @@
+"""
+Per-RPC metrics for the gRPC servers, recorded by a server interceptor.
+"""
+
+import asyncio
+import time
+
+import grpc
+
+class ServerMetrics:
+    """RPC counters, latency histograms and in-flight gauge in a Registry."""
+
+    def __init__(self, registry):
+        self.started = registry.counter(
+            'grpc_server_started_total', "RPCs started", ('grpc_service', 'grpc_method'))
+        self.handled = registry.counter(
+            'grpc_server_handled_total', "RPCs completed, by status code",
+            ('grpc_service', 'grpc_method', 'grpc_code'))
+        self.latency = registry.histogram(
+            'grpc_server_handling_seconds', "Time from the start to the end of an RPC",
+            ('grpc_service', 'grpc_method'))
+        self.in_flight = registry.gauge('grpc_server_in_flight', "RPCs being handled")
+        self._methods = {}
+
+    def method(self, full_method):
+        """Return the (started, latency, labels) recorders for '/service/method'."""
+        recorders = self._methods.get(full_method)
+        if recorders is None:
+            service, _, method = full_method.lstrip('/').partition('/')
+            recorders = self._methods[full_method] = (
+                self.started.labels(service, method), self.latency.labels(service, method), (service, method))
+        return recorders
+
+    def finish(self, labels, latency, start, code):
+        latency.observe(time.perf_counter() - start)
+        self.handled.labels(*labels, code.name).inc()
+        self.in_flight.dec()
+
+def _status(context, error):
+    # context.code() is None unless the handler set a code or aborted
+    code = context.code()
+    if code is not None:
+        return code
+    if error is None:
+        return grpc.StatusCode.OK
+    if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+        return grpc.StatusCode.CANCELLED
+    if isinstance(error, grpc.RpcError) and hasattr(error, 'code'):
+        return error.code()
+    return grpc.StatusCode.UNKNOWN
+
+HANDLER_FACTORIES = {
+    (False, False): grpc.unary_unary_rpc_method_handler,
+    (False, True): grpc.unary_stream_rpc_method_handler,
+    (True, False): grpc.stream_unary_rpc_method_handler,
+    (True, True): grpc.stream_stream_rpc_method_handler,
+}
+
+def wrap_handler(handler, behavior):
+    factory = HANDLER_FACTORIES[(handler.request_streaming, handler.response_streaming)]
+    return factory(behavior, request_deserializer=handler.request_deserializer,
+                   response_serializer=handler.response_serializer)
+
+def handler_behavior(handler):
+    if handler.request_streaming:
+        return handler.stream_stream if handler.response_streaming else handler.stream_unary
+    return handler.unary_stream if handler.response_streaming else handler.unary_unary
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records every RPC of a thread-pool server into ServerMetrics."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        started, latency, labels = self.metrics.method(handler_call_details.method)
+        behavior = handler_behavior(handler)
+        metrics = self.metrics
+
+        if handler.response_streaming:
+            def observed(request, context):
+                started.inc()
+                metrics.in_flight.inc()
+                start = time.perf_counter()
+                error = None
+                try:
+                    yield from behavior(request, context)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    metrics.finish(labels, latency, start, _status(context, error))
+        else:
+            def observed(request, context):
+                started.inc()
+                metrics.in_flight.inc()
+                start = time.perf_counter()
+                error = None
+                try:
+                    return behavior(request, context)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    metrics.finish(labels, latency, start, _status(context, error))
+
+        return wrap_handler(handler, observed)
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Records every RPC of a grpc.aio server into ServerMetrics."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        started, latency, labels = self.metrics.method(handler_call_details.method)
+        behavior = handler_behavior(handler)
+        metrics = self.metrics
+
+        if handler.response_streaming:
+            async def observed(request, context):
+                started.inc()
+                metrics.in_flight.inc()
+                start = time.perf_counter()
+                error = None
+                try:
+                    async for response in behavior(request, context):
+                        yield response
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    metrics.finish(labels, latency, start, _status(context, error))
+        else:
+            async def observed(request, context):
+                started.inc()
+                metrics.in_flight.inc()
+                start = time.perf_counter()
+                error = None
+                try:
+                    return await behavior(request, context)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    metrics.finish(labels, latency, start, _status(context, error))
+
+        return wrap_handler(handler, observed)
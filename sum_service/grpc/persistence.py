@@ -0,0 +1,278 @@
+"""
+Durable accumulator state: a group-commit write-ahead log plus snapshots.
+
+Every change is logged as the key's new absolute sum, so replaying a record
+twice is harmless and a snapshot taken while writes continue only needs the
+log segments from the rotation point onwards.
+
+Files in the data directory:
+    wal-<segment>.log        log records, appended in segment order
+    snapshot-<segment>.bin   all sums as of the start of <segment>
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from sum_service.grpc.accumulator import AccumulatorStore
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ('always', 'interval', 'none')
+
+# crc32 of the body, key length, value length; body = key bytes + decimal value
+_HEADER = struct.Struct('<IHH')
+MAX_KEY_BYTES = 2 ** 16 - 1
+
+def encode_record(key, value):
+    key_bytes = key.encode('utf-8')
+    if len(key_bytes) > MAX_KEY_BYTES:
+        raise ValueError(f"Key longer than {MAX_KEY_BYTES} bytes")
+    value_bytes = str(value).encode('ascii')
+    body = key_bytes + value_bytes
+    return _HEADER.pack(zlib.crc32(body), len(key_bytes), len(value_bytes)) + body
+
+def decode_records(data):
+    """Yield (key, value) pairs, stopping at the first torn or corrupt record."""
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        crc, key_len, value_len = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        end = start + key_len + value_len
+        body = data[start:end]
+        if end > len(data) or zlib.crc32(body) != crc:
+            logger.warning("Ignoring torn log tail at offset %d", offset)
+            return
+        yield body[:key_len].decode('utf-8'), int(body[key_len:])
+        offset = end
+
+def _segment_files(directory, prefix, suffix):
+    result = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(suffix):
+            try:
+                result.append((int(name[len(prefix):-len(suffix)]), name))
+            except ValueError:
+                continue
+    return sorted(result)
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class Persistence:
+    """Write-ahead log with group commit and periodic snapshots.
+
+    record() only appends to an in-memory buffer, so it is cheap enough to call
+    while holding an accumulator lock. A background flusher writes everything
+    buffered with one write() and, depending on fsync_policy, one fsync():
+
+    always   -- wait() blocks until the record is fsynced; concurrent writers
+                share each fsync (group commit)
+    interval -- fsync at most every fsync_interval seconds; wait() returns
+                immediately, so a crash can lose that much
+    none     -- never fsync; the OS decides when data reaches disk
+
+    The buffer is guarded by one lock shared by every key, so journaled
+    writers serialize on it for the length of a list append; the store's
+    lock striping still keeps the rest of an update parallel. wait() blocks
+    the calling thread, so the 'always' policy is for the thread-pool server.
+    Keys are limited to MAX_KEY_BYTES of UTF-8; record() raises ValueError
+    for a longer one.
+    """
+
+    max_key_bytes = MAX_KEY_BYTES
+
+    def __init__(self, directory, fsync_policy='interval', fsync_interval=0.01,
+                 snapshot_interval=60.0):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        os.makedirs(directory, exist_ok=True)
+
+        # _lock guards the buffer and counters; _io_lock orders file writes
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._buffer = []
+        self._appended = 0
+        self._durable = 0
+        self._unsynced = False
+        self._closed = False
+        self._segment = 0
+        self._file = None
+        self._store = None
+        self._threads = []
+
+    def recover(self):
+        """Load the latest snapshot, replay the log tail and return the sums."""
+        sums = {}
+        snapshots = _segment_files(self.directory, 'snapshot-', '.bin')
+        start = 0
+        if snapshots:
+            start, name = snapshots[-1]
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                sums.update(decode_records(f.read()))
+        last = start
+        for segment, name in _segment_files(self.directory, 'wal-', '.log'):
+            if segment < start:
+                continue
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                sums.update(decode_records(f.read()))
+            last = segment
+        # Always start a fresh segment so a torn tail is never appended to
+        self._open_segment(last + 1)
+        logger.info("Recovered %d sums from %s", len(sums), self.directory)
+        return {key: value for key, value in sums.items() if value}
+
+    def _open_segment(self, segment):
+        path = os.path.join(self.directory, f'wal-{segment:012d}.log')
+        self._file = open(path, 'ab', buffering=0)
+        self._segment = segment
+        _fsync_directory(self.directory)
+
+    def start(self, store):
+        """Start the flusher and snapshot threads for store."""
+        if self._file is None:
+            self._open_segment(1)
+        self._store = store
+        self._threads = [
+            threading.Thread(target=self._flush_loop, name='wal-flusher', daemon=True),
+            threading.Thread(target=self._snapshot_loop, name='wal-snapshots', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def record(self, key, value):
+        """Buffer a record of key's new sum and return its sequence number."""
+        data = encode_record(key, value)
+        with self._lock:
+            self._buffer.append(data)
+            self._appended += 1
+            seq = self._appended
+        if self.fsync_policy == 'always':
+            self._wakeup.set()
+        return seq
+
+    def wait(self, seq):
+        """Block until seq is durable under the 'always' policy."""
+        if self.fsync_policy != 'always':
+            return
+        with self._lock:
+            while self._durable < seq and not self._closed:
+                self._flushed.wait()
+
+    def _flush_loop(self):
+        last_sync = time.monotonic()
+        while not self._closed:
+            if self.fsync_policy == 'always':
+                self._wakeup.wait()
+            else:
+                self._wakeup.wait(self.fsync_interval)
+            self._wakeup.clear()
+            last_sync = self._flush(last_sync)
+
+    def _flush(self, last_sync=0.0):
+        with self._io_lock:
+            with self._lock:
+                buffer, self._buffer = self._buffer, []
+                seq = self._appended
+            if buffer:
+                self._file.write(b''.join(buffer))
+                self._unsynced = self.fsync_policy != 'none'
+            now = time.monotonic()
+            if self._unsynced and (self.fsync_policy == 'always' or now - last_sync >= self.fsync_interval):
+                os.fsync(self._file.fileno())
+                self._unsynced = False
+                last_sync = now
+        with self._lock:
+            self._durable = max(self._durable, seq)
+            self._flushed.notify_all()
+        return last_sync
+
+    def snapshot(self):
+        """Write a snapshot of the store and drop the log segments it covers."""
+        with self._io_lock:
+            # Only the flusher and close() touch the file, and both need
+            # _io_lock; record() is not held up by the rotation's fsyncs
+            old_file = self._file
+            self._open_segment(self._segment + 1)
+            segment = self._segment
+            with self._lock:
+                # Records buffered so far belong to the old segment
+                buffer, self._buffer = self._buffer, []
+                seq = self._appended
+            if buffer:
+                old_file.write(b''.join(buffer))
+            if self.fsync_policy != 'none':
+                os.fsync(old_file.fileno())
+                self._unsynced = False
+            old_file.close()
+        with self._lock:
+            self._durable = max(self._durable, seq)
+            self._flushed.notify_all()
+
+        # Anything written after the rotation is in the new segment
+        sums = self._store.snapshot()
+        path = os.path.join(self.directory, f'snapshot-{segment:012d}.bin')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(encode_record(key, value) for key, value in sums.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_directory(self.directory)
+
+        for old, name in _segment_files(self.directory, 'wal-', '.log'):
+            if old < segment:
+                os.remove(os.path.join(self.directory, name))
+        for old, name in _segment_files(self.directory, 'snapshot-', '.bin'):
+            if old < segment:
+                os.remove(os.path.join(self.directory, name))
+        logger.info("Wrote snapshot of %d sums at segment %d", len(sums), segment)
+
+    def _snapshot_loop(self):
+        while not self._stopped.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error("Snapshot failed: %s", e)
+
+    def close(self):
+        """Flush and fsync everything buffered, then stop the threads."""
+        if self._closed:
+            return
+        self._stopped.set()
+        self._flush()
+        with self._io_lock:
+            if self.fsync_policy != 'none':
+                os.fsync(self._file.fileno())
+            with self._lock:
+                self._closed = True
+                self._flushed.notify_all()
+            self._wakeup.set()
+            self._file.close()
+        for thread in self._threads:
+            thread.join()
+
+def open_store(directory, fsync_policy='interval', fsync_interval=0.01, snapshot_interval=60.0):
+    """Recover an AccumulatorStore from directory and journal it from now on.
+
+    Returns (store, persistence); call persistence.close() on shutdown.
+    """
+    persistence = Persistence(directory, fsync_policy, fsync_interval, snapshot_interval)
+    store = AccumulatorStore(journal=persistence)
+    store.load(persistence.recover())
+    persistence.start(store)
+    return store, persistence
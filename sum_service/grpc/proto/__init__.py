@@ -0,0 +1,3 @@
+"""
+Protocol buffer messages and gRPC stubs generated from sum.proto.
+"""
@@ -1,18 +1,54 @@
+"""
+Generate sum_pb2.py and sum_pb2_grpc.py from sum.proto.
+
+The stubs are generated as modules of this package, and only when the
+SHA-256 of sum.proto differs from the one recorded at the last generation,
+so repeated builds do not run protoc. setup.py runs this before building;
+by hand: python -m sum_service.grpc.proto.generate_proto [--force]
+"""
+
+import hashlib
 import os
 import subprocess
+import sys
+
+PROTO_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(PROTO_DIR)))
+PROTO_FILE = os.path.join(PROTO_DIR, 'sum.proto')
+HASH_FILE = os.path.join(PROTO_DIR, 'sum.proto.sha256')
+OUTPUTS = ('sum_pb2.py', 'sum_pb2_grpc.py')
+
+def proto_hash():
+    with open(PROTO_FILE, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def is_current():
+    """True if the stubs exist and were generated from the current sum.proto."""
+    if not all(os.path.exists(os.path.join(PROTO_DIR, name)) for name in OUTPUTS):
+        return False
+    try:
+        with open(HASH_FILE) as f:
+            return f.read().strip() == proto_hash()
+    except FileNotFoundError:
+        return False
 
-def generate_proto():
-    proto_dir = os.path.dirname(os.path.abspath(__file__))
-    proto_file = os.path.join(proto_dir, 'sum.proto')
-    
-    # Generate Python gRPC files
+def generate_proto(force=False):
+    """Regenerate the stubs if sum.proto changed; returns True if protoc ran."""
+    if not force and is_current():
+        return False
+    # Compiling from the repository root makes the generated modules import
+    # each other as sum_service.grpc.proto.*, so no sys.path changes are needed
     subprocess.run([
-        'python', '-m', 'grpc_tools.protoc',
-        f'--proto_path={proto_dir}',
-        f'--python_out={proto_dir}',
-        f'--grpc_python_out={proto_dir}',
-        proto_file
-    ])
+        sys.executable, '-m', 'grpc_tools.protoc',
+        f'--proto_path={ROOT}',
+        f'--python_out={ROOT}',
+        f'--grpc_python_out={ROOT}',
+        os.path.relpath(PROTO_FILE, ROOT),
+    ], check=True)
+    with open(HASH_FILE, 'w') as f:
+        f.write(proto_hash() + '\n')
+    return True
 
 if __name__ == '__main__':
-    generate_proto() 
\ No newline at end of file
+    generated = generate_proto(force='--force' in sys.argv[1:])
+    print("Generated stubs from sum.proto" if generated else "Stubs are up to date")
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
-# source: sum.proto
-# Protobuf Python Version: 4.25.1
+# source: sum_service/grpc/proto/sum.proto
+# Protobuf Python Version: 4.25.0
 """Generated protocol buffer code."""
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import descriptor_pool as _descriptor_pool
@@ -14,17 +14,39 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\tsum.proto\x12\x03sum\"\x1c\n\nSumRequest\x12\x0e\n\x06number\x18\x01 \x01(\x05\"\x1d\n\x0bSumResponse\x12\x0e\n\x06result\x18\x01 \x01(\x05\x32\x41\n\nSumService\x12\x33\n\x0c\x43\x61lculateSum\x12\x0f.sum.SumRequest\x1a\x10.sum.SumResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n sum_service/grpc/proto/sum.proto\x12\x03sum\"=\n\nSumRequest\x12\x0e\n\x06number\x18\x01 \x01(\x05\x12\x0b\n\x03key\x18\x02 \x01(\t\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"\x1d\n\x0bSumResponse\x12\x0e\n\x06result\x18\x01 \x01(\x03\"a\n\x0fSumBatchRequest\x12\x0f\n\x07numbers\x18\x01 \x03(\x12\x12\x0b\n\x03key\x18\x02 \x01(\t\x12\x1c\n\x14include_running_sums\x18\x03 \x01(\x08\x12\x12\n\nrequest_id\x18\x04 \x01(\t\"8\n\x10SumBatchResponse\x12\x0e\n\x06result\x18\x01 \x01(\x03\x12\x14\n\x0crunning_sums\x18\x02 \x03(\x12\",\n\rGetSumRequest\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x0e\n\x06merged\x18\x02 \x01(\x08\"7\n\x0fWatchSumRequest\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x17\n\x0fmin_interval_ms\x18\x02 \x01(\r\"9\n\tSumUpdate\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x0e\n\x06result\x18\x02 \x01(\x03\x12\x0f\n\x07version\x18\x03 \x01(\x04\"T\n\x0c\x43ounterState\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x0f\n\x07replica\x18\x02 \x01(\t\x12\x12\n\nincrements\x18\x03 \x01(\x04\x12\x12\n\ndecrements\x18\x04 \x01(\x04\"F\n\x11\x43ounterStateBatch\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12!\n\x06states\x18\x02 \x03(\x0b\x32\x11.sum.CounterState\"\x0e\n\x0cPushStateAck\" \n\x11\x46\x65tchStateRequest\x12\x0b\n\x03key\x18\x01 \x01(\t\"\x16\n\x14\x46\x65tchAllStateRequest2\xa3\x02\n\nSumService\x12\x33\n\x0c\x43\x61lculateSum\x12\x0f.sum.SumRequest\x1a\x10.sum.SumResponse\"\x00\x12\x34\n\tStreamSum\x12\x0f.sum.SumRequest\x1a\x10.sum.SumResponse\"\x00(\x01\x30\x01\x12\x42\n\x11\x43\x61lculateSumBatch\x12\x14.sum.SumBatchRequest\x1a\x15.sum.SumBatchResponse\"\x00\x12\x30\n\x06GetSum\x12\x12.sum.GetSumRequest\x1a\x10.sum.SumResponse\"\x00\x12\x34\n\x08WatchSum\x12\x14.sum.WatchSumRequest\x1a\x0e.sum.SumUpdate\"\x00\x30\x01\x32\xd4\x01\n\x12ReplicationService\x12\x38\n\tPushState\x12\x16.sum.CounterStateBatch\x1a\x11.sum.PushStateAck\"\x00\x12>\n\nFetchState\x12\x16.sum.FetchStateRequest\x1a\x16.sum.CounterStateBatch\"\x00\x12\x44\n\rFetchAllState\x12\x19.sum.FetchAllStateRequest\x1a\x16.sum.CounterStateBatch\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
-_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'sum_pb2', _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'sum_service.grpc.proto.sum_pb2', _globals)
 if _descriptor._USE_C_DESCRIPTORS == False:
   DESCRIPTOR._options = None
-  _globals['_SUMREQUEST']._serialized_start=18
-  _globals['_SUMREQUEST']._serialized_end=46
-  _globals['_SUMRESPONSE']._serialized_start=48
-  _globals['_SUMRESPONSE']._serialized_end=77
-  _globals['_SUMSERVICE']._serialized_start=79
-  _globals['_SUMSERVICE']._serialized_end=144
+  _globals['_SUMREQUEST']._serialized_start=41
+  _globals['_SUMREQUEST']._serialized_end=102
+  _globals['_SUMRESPONSE']._serialized_start=104
+  _globals['_SUMRESPONSE']._serialized_end=133
+  _globals['_SUMBATCHREQUEST']._serialized_start=135
+  _globals['_SUMBATCHREQUEST']._serialized_end=232
+  _globals['_SUMBATCHRESPONSE']._serialized_start=234
+  _globals['_SUMBATCHRESPONSE']._serialized_end=290
+  _globals['_GETSUMREQUEST']._serialized_start=292
+  _globals['_GETSUMREQUEST']._serialized_end=336
+  _globals['_WATCHSUMREQUEST']._serialized_start=338
+  _globals['_WATCHSUMREQUEST']._serialized_end=393
+  _globals['_SUMUPDATE']._serialized_start=395
+  _globals['_SUMUPDATE']._serialized_end=452
+  _globals['_COUNTERSTATE']._serialized_start=454
+  _globals['_COUNTERSTATE']._serialized_end=538
+  _globals['_COUNTERSTATEBATCH']._serialized_start=540
+  _globals['_COUNTERSTATEBATCH']._serialized_end=610
+  _globals['_PUSHSTATEACK']._serialized_start=612
+  _globals['_PUSHSTATEACK']._serialized_end=626
+  _globals['_FETCHSTATEREQUEST']._serialized_start=628
+  _globals['_FETCHSTATEREQUEST']._serialized_end=660
+  _globals['_FETCHALLSTATEREQUEST']._serialized_start=662
+  _globals['_FETCHALLSTATEREQUEST']._serialized_end=684
+  _globals['_SUMSERVICE']._serialized_start=687
+  _globals['_SUMSERVICE']._serialized_end=978
+  _globals['_REPLICATIONSERVICE']._serialized_start=981
+  _globals['_REPLICATIONSERVICE']._serialized_end=1193
 # @@protoc_insertion_point(module_scope)
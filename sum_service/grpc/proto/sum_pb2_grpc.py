@@ -2,7 +2,7 @@
 """Client and server classes corresponding to protobuf-defined services."""
 import grpc
 
-import sum_pb2 as sum__pb2
+from sum_service.grpc.proto import sum_pb2 as sum__service_dot_grpc_dot_proto_dot_sum__pb2
 
 
 class SumServiceStub(object):
@@ -17,8 +17,28 @@ class SumServiceStub(object):
         """
         self.CalculateSum = channel.unary_unary(
                 '/sum.SumService/CalculateSum',
-                request_serializer=sum__pb2.SumRequest.SerializeToString,
-                response_deserializer=sum__pb2.SumResponse.FromString,
+                request_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumRequest.SerializeToString,
+                response_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumResponse.FromString,
+                )
+        self.StreamSum = channel.stream_stream(
+                '/sum.SumService/StreamSum',
+                request_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumRequest.SerializeToString,
+                response_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumResponse.FromString,
+                )
+        self.CalculateSumBatch = channel.unary_unary(
+                '/sum.SumService/CalculateSumBatch',
+                request_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumBatchRequest.SerializeToString,
+                response_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumBatchResponse.FromString,
+                )
+        self.GetSum = channel.unary_unary(
+                '/sum.SumService/GetSum',
+                request_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.GetSumRequest.SerializeToString,
+                response_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumResponse.FromString,
+                )
+        self.WatchSum = channel.unary_stream(
+                '/sum.SumService/WatchSum',
+                request_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.WatchSumRequest.SerializeToString,
+                response_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumUpdate.FromString,
                 )
 
 
@@ -33,13 +53,61 @@ class SumServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def StreamSum(self, request_iterator, context):
+        """Stream numbers and receive the updated running sum for each one
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CalculateSumBatch(self, request, context):
+        """Add a batch of numbers atomically in a single call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetSum(self, request, context):
+        """Read the running sum of a key without changing it
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchSum(self, request, context):
+        """Receive the running sum of a key now and whenever it changes
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_SumServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
             'CalculateSum': grpc.unary_unary_rpc_method_handler(
                     servicer.CalculateSum,
-                    request_deserializer=sum__pb2.SumRequest.FromString,
-                    response_serializer=sum__pb2.SumResponse.SerializeToString,
+                    request_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumRequest.FromString,
+                    response_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumResponse.SerializeToString,
+            ),
+            'StreamSum': grpc.stream_stream_rpc_method_handler(
+                    servicer.StreamSum,
+                    request_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumRequest.FromString,
+                    response_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumResponse.SerializeToString,
+            ),
+            'CalculateSumBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.CalculateSumBatch,
+                    request_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumBatchRequest.FromString,
+                    response_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumBatchResponse.SerializeToString,
+            ),
+            'GetSum': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetSum,
+                    request_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.GetSumRequest.FromString,
+                    response_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumResponse.SerializeToString,
+            ),
+            'WatchSum': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchSum,
+                    request_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.WatchSumRequest.FromString,
+                    response_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumUpdate.SerializeToString,
             ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
@@ -64,7 +132,208 @@ class SumService(object):
             timeout=None,
             metadata=None):
         return grpc.experimental.unary_unary(request, target, '/sum.SumService/CalculateSum',
-            sum__pb2.SumRequest.SerializeToString,
-            sum__pb2.SumResponse.FromString,
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumRequest.SerializeToString,
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def StreamSum(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/sum.SumService/StreamSum',
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumRequest.SerializeToString,
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def CalculateSumBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/sum.SumService/CalculateSumBatch',
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumBatchRequest.SerializeToString,
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumBatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def GetSum(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/sum.SumService/GetSum',
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.GetSumRequest.SerializeToString,
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def WatchSum(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/sum.SumService/WatchSum',
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.WatchSumRequest.SerializeToString,
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.SumUpdate.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+
+class ReplicationServiceStub(object):
+    """Internal replica-to-replica state exchange for replicated counters
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.PushState = channel.unary_unary(
+                '/sum.ReplicationService/PushState',
+                request_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.CounterStateBatch.SerializeToString,
+                response_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.PushStateAck.FromString,
+                )
+        self.FetchState = channel.unary_unary(
+                '/sum.ReplicationService/FetchState',
+                request_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.FetchStateRequest.SerializeToString,
+                response_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.CounterStateBatch.FromString,
+                )
+        self.FetchAllState = channel.unary_unary(
+                '/sum.ReplicationService/FetchAllState',
+                request_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.FetchAllStateRequest.SerializeToString,
+                response_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.CounterStateBatch.FromString,
+                )
+
+
+class ReplicationServiceServicer(object):
+    """Internal replica-to-replica state exchange for replicated counters
+    """
+
+    def PushState(self, request, context):
+        """Merge counter state pushed by a peer replica
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def FetchState(self, request, context):
+        """Return this replica's full counter state for one key
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def FetchAllState(self, request, context):
+        """Return this replica's full counter state for every key
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_ReplicationServiceServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'PushState': grpc.unary_unary_rpc_method_handler(
+                    servicer.PushState,
+                    request_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.CounterStateBatch.FromString,
+                    response_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.PushStateAck.SerializeToString,
+            ),
+            'FetchState': grpc.unary_unary_rpc_method_handler(
+                    servicer.FetchState,
+                    request_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.FetchStateRequest.FromString,
+                    response_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.CounterStateBatch.SerializeToString,
+            ),
+            'FetchAllState': grpc.unary_unary_rpc_method_handler(
+                    servicer.FetchAllState,
+                    request_deserializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.FetchAllStateRequest.FromString,
+                    response_serializer=sum__service_dot_grpc_dot_proto_dot_sum__pb2.CounterStateBatch.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'sum.ReplicationService', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+
+
+ # This class is part of an EXPERIMENTAL API.
+class ReplicationService(object):
+    """Internal replica-to-replica state exchange for replicated counters
+    """
+
+    @staticmethod
+    def PushState(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/sum.ReplicationService/PushState',
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.CounterStateBatch.SerializeToString,
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.PushStateAck.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def FetchState(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/sum.ReplicationService/FetchState',
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.FetchStateRequest.SerializeToString,
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.CounterStateBatch.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def FetchAllState(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/sum.ReplicationService/FetchAllState',
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.FetchAllStateRequest.SerializeToString,
+            sum__service_dot_grpc_dot_proto_dot_sum__pb2.CounterStateBatch.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -0,0 +1,270 @@
+"""
+Replicated running sums built on PN-counters (a state-based CRDT).
+
+Every replica accepts writes for any key. A key's counter holds, for each
+replica, the total it has added (increments) and subtracted (decrements);
+the sum is the difference. Merging takes the per-replica maximum, so state
+can be exchanged in any order, repeatedly, and all replicas converge.
+"""
+
+import logging
+import threading
+from concurrent import futures
+from itertools import accumulate
+
+import grpc
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+
+from sum_service.grpc.accumulator import DEFAULT_STRIPES, check_int64
+
+logger = logging.getLogger(__name__)
+
+class _Stripe:
+    __slots__ = ('lock', 'counters', 'dirty')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> {replica: [increments, decrements]}
+        self.counters = {}
+        self.dirty = set()
+
+def _value(counter):
+    return sum(p for p, _ in counter.values()) - sum(n for _, n in counter.values())
+
+class PNCounterStore:
+    """Accumulator store whose sums are PN-counters, one slot per replica.
+
+    Local writes only touch this replica's slot and mark the key dirty for
+    the Replicator; they never wait on other replicas. Has the same add,
+    add_many, get, reset and snapshot API as AccumulatorStore.
+    """
+
+    def __init__(self, replica_id, stripes=DEFAULT_STRIPES):
+        self.replica_id = replica_id
+        self._stripes = tuple(_Stripe() for _ in range(stripes))
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _apply(self, stripe, key, delta):
+        # Caller holds stripe.lock
+        counter = stripe.counters.setdefault(key, {})
+        slot = counter.setdefault(self.replica_id, [0, 0])
+        if delta >= 0:
+            slot[0] += delta
+        else:
+            slot[1] -= delta
+        stripe.dirty.add(key)
+        return _value(counter)
+
+    def add(self, key, delta):
+        """Add delta on this replica and return the locally known sum."""
+        stripe = self._stripe(key)
+        with stripe.lock:
+            check_int64(_value(stripe.counters.get(key, {})) + delta)
+            return self._apply(stripe, key, delta)
+
+    def add_many(self, key, deltas, running_sums=False):
+        """Add deltas in one atomic step; returns (final_sum, prefix_sums)."""
+        deltas = list(deltas)
+        stripe = self._stripe(key)
+        with stripe.lock:
+            base = _value(stripe.counters.get(key, {}))
+            if running_sums:
+                sums = list(accumulate(deltas, initial=base))[1:]
+                check_int64(min(sums, default=base))
+                check_int64(max(sums, default=base))
+            else:
+                sums = None
+                check_int64(base + sum(deltas))
+            self._apply(stripe, key, sum(p for p in deltas if p > 0))
+            result = self._apply(stripe, key, sum(n for n in deltas if n < 0))
+        return result, sums
+
+    def get(self, key):
+        """Return the locally known sum for key."""
+        stripe = self._stripe(key)
+        with stripe.lock:
+            return _value(stripe.counters.get(key, {}))
+
+    def reset(self, key):
+        """Cancel the locally observed sum; concurrent remote adds survive."""
+        stripe = self._stripe(key)
+        with stripe.lock:
+            self._apply(stripe, key, -_value(stripe.counters.get(key, {})))
+        return 0
+
+    def snapshot(self):
+        result = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                for key, counter in stripe.counters.items():
+                    result[key] = _value(counter)
+        return result
+
+    def take_dirty(self):
+        """Return this replica's slots for keys changed since the last call."""
+        states = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                dirty, stripe.dirty = stripe.dirty, set()
+                for key in dirty:
+                    p, n = stripe.counters[key][self.replica_id]
+                    states.append(sum_pb2.CounterState(
+                        key=key, replica=self.replica_id, increments=p, decrements=n))
+        return states
+
+    def state(self, key):
+        """Return every replica's slot for key."""
+        stripe = self._stripe(key)
+        with stripe.lock:
+            return [
+                sum_pb2.CounterState(key=key, replica=replica, increments=p, decrements=n)
+                for replica, (p, n) in stripe.counters.get(key, {}).items()
+            ]
+
+    def all_states(self):
+        """Return every replica's slot for every key."""
+        states = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                for key, counter in stripe.counters.items():
+                    states.extend(
+                        sum_pb2.CounterState(key=key, replica=replica, increments=p, decrements=n)
+                        for replica, (p, n) in counter.items())
+        return states
+
+    def merge(self, states):
+        """Merge remote slots by taking the per-replica maximum."""
+        for state in states:
+            stripe = self._stripe(state.key)
+            with stripe.lock:
+                counter = stripe.counters.setdefault(state.key, {})
+                slot = counter.setdefault(state.replica, [0, 0])
+                slot[0] = max(slot[0], state.increments)
+                slot[1] = max(slot[1], state.decrements)
+
+class ReplicationServicer(sum_pb2_grpc.ReplicationServiceServicer):
+    def __init__(self, store):
+        self.store = store
+
+    def PushState(self, request, context):
+        self.store.merge(request.states)
+        return sum_pb2.PushStateAck()
+
+    def FetchState(self, request, context):
+        return sum_pb2.CounterStateBatch(
+            sender=self.store.replica_id, states=self.store.state(request.key))
+
+    def FetchAllState(self, request, context):
+        return sum_pb2.CounterStateBatch(sender=self.store.replica_id, states=self.store.all_states())
+
+class Replicator:
+    """Pushes local changes to every peer in the background.
+
+    Every interval seconds the dirty slots are sent to each peer with
+    PushState. Slots a peer has not acknowledged are retried on the next
+    round, so replicas converge within about one interval of a change once
+    the peer is reachable.
+    """
+
+    def __init__(self, store, peers, interval=0.1, timeout=1.0):
+        self.store = store
+        self.interval = interval
+        self.timeout = timeout
+        self._channels = {peer: grpc.insecure_channel(peer) for peer in peers}
+        self._stubs = {peer: sum_pb2_grpc.ReplicationServiceStub(c) for peer, c in self._channels.items()}
+        # peer -> {(key, replica): CounterState} not yet acknowledged
+        self._pending = {peer: {} for peer in peers}
+        self._executor = futures.ThreadPoolExecutor(max_workers=max(1, len(peers)))
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='replicator', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.push()
+
+    def push(self):
+        """Send pending state to every peer once."""
+        states = self.store.take_dirty()
+        for pending in self._pending.values():
+            for state in states:
+                pending[(state.key, state.replica)] = state
+        calls = {
+            peer: self._executor.submit(self._push_to, peer, list(pending.values()))
+            for peer, pending in self._pending.items() if pending
+        }
+        for peer, call in calls.items():
+            sent = call.result()
+            pending = self._pending[peer]
+            for state in sent:
+                # Keep entries that were updated again while the push was in flight
+                if pending.get((state.key, state.replica)) is state:
+                    del pending[(state.key, state.replica)]
+
+    def _push_to(self, peer, states):
+        try:
+            self._stubs[peer].PushState(
+                sum_pb2.CounterStateBatch(sender=self.store.replica_id, states=states),
+                timeout=self.timeout)
+            return states
+        except grpc.RpcError as e:
+            logger.warning("Replication to %s failed: %s", peer, e.code())
+            return []
+
+    def bootstrap(self):
+        """Merge every reachable peer's full state; returns the number of peers reached.
+
+        Run before serving: a restarted replica keeps its replica id but starts
+        with an empty slot, while peers still hold its old totals. Adding on top
+        of an empty slot would be hidden by the per-replica maximum until it
+        caught up, so the old slot is fetched back first.
+        """
+        # Peers may still be starting; separate channels keep the replication
+        # channels out of reconnect backoff after a refused attempt
+        channels = [grpc.insecure_channel(peer) for peer in self._channels]
+        calls = [
+            self._executor.submit(sum_pb2_grpc.ReplicationServiceStub(channel).FetchAllState,
+                                  sum_pb2.FetchAllStateRequest(), timeout=self.timeout)
+            for channel in channels
+        ]
+        reached = 0
+        for call in calls:
+            try:
+                self.store.merge(call.result().states)
+                reached += 1
+            except grpc.RpcError as e:
+                logger.warning("Bootstrap could not reach a peer: %s", e.code())
+        for channel in channels:
+            channel.close()
+        return reached
+
+    def merged_value(self, key):
+        """Fetch key's state from every peer, merge it and return the sum.
+
+        Unreachable peers are skipped, so the answer is the best merge
+        available within the timeout.
+        """
+        calls = [
+            self._executor.submit(stub.FetchState, sum_pb2.FetchStateRequest(key=key), timeout=self.timeout)
+            for stub in self._stubs.values()
+        ]
+        for call in calls:
+            try:
+                self.store.merge(call.result().states)
+            except grpc.RpcError as e:
+                logger.warning("Merged read could not reach a peer: %s", e.code())
+        return self.store.get(key)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.push()
+        self._executor.shutdown()
+        for channel in self._channels.values():
+            channel.close()
@@ -3,116 +3,489 @@ from concurrent import futures
 from grpc_health.v1 import health_pb2
 from grpc_health.v1 import health_pb2_grpc
 from grpc_reflection.v1alpha import reflection
+import argparse
+import contextlib
 import logging
 import os
-import sys
+import signal
 import socket
+import sys
+import threading
 import time
 
-# Add proto directory to Python path
-proto_dir = os.path.join(os.path.dirname(__file__), 'proto')
-sys.path.append(proto_dir)
+from sum_service.grpc.proto.sum_pb2 import SumRequest, SumResponse, SumBatchResponse
+from sum_service.grpc.proto.sum_pb2_grpc import SumServiceServicer
+from sum_service.grpc.proto.sum_pb2_grpc import add_ReplicationServiceServicer_to_server
 
-# Import generated proto files
-from sum_pb2 import SumRequest, SumResponse
-from sum_pb2_grpc import SumServiceServicer, add_SumServiceServicer_to_server
+from sum_service.grpc.accumulator import AccumulatorStore, DEFAULT_KEY
+from sum_service.grpc.admission import AdaptiveLimiter, AdmissionInterceptor
+from sum_service.grpc.instrumentation import MetricsInterceptor, ServerMetrics
+from sum_service.grpc.dedup import DedupCache, add_batch, add_number
+from sum_service.grpc.persistence import FSYNC_POLICIES, open_store
+from sum_service.grpc.watch import DEFAULT_INTERVAL, WatchHub, add_sum_service, watch_interval
+from sum_service.log import EventLogger, setup_logging
+from sum_service.metrics import InstrumentedThreadPoolExecutor, Registry, start_http_server
+from sum_service.profiling import Profiling
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# Per-request events are DEBUG and can be sampled with LOG_SAMPLE
+request_log = EventLogger(logger, 'request')
+stream_log = EventLogger(logger, 'stream')
+
+# Services exposed through server reflection
+SERVICE_NAMES = (
+    'sum.SumService',
+    'sum.ReplicationService',
+    health_pb2.DESCRIPTOR.services_by_name['Health'].full_name,
+    reflection.SERVICE_NAME,
+)
+
+# Metadata header carrying the accumulator key when the request has none
+KEY_METADATA = 'x-sum-key'
+
+# Threads serving RPCs in the thread-pool server
+SERVER_THREADS = 10
+# WatchSum streams the thread-pool server allows at once; each holds a
+# thread, so the pool gets one extra thread per allowed watcher
+DEFAULT_MAX_WATCHERS = 16
+
+def metadata_key(context):
+    """Return the accumulator key from call metadata, or the default key."""
+    for name, value in context.invocation_metadata() or ():
+        if name == KEY_METADATA and value:
+            return value
+    return DEFAULT_KEY
+
+def resolve_key(request, context):
+    """Return the accumulator key from the request field or call metadata."""
+    return request.key or metadata_key(context)
+
+def key_error(store, key):
+    """Return why store cannot hold key, or None if it can."""
+    limit = getattr(store, 'max_key_bytes', None)
+    if limit is not None and len(key.encode('utf-8')) > limit:
+        return f"Key longer than {limit} bytes"
+    return None
+
+@contextlib.contextmanager
+def sum_in_range(context):
+    """Abort with OUT_OF_RANGE when the store refuses a sum past int64."""
+    try:
+        yield
+    except OverflowError as error:
+        context.abort(grpc.StatusCode.OUT_OF_RANGE, str(error))
 
 class SumServicer(SumServiceServicer):
-    def __init__(self):
-        self.running_sum = 0
+    def __init__(self, store=None, replicator=None, watch_interval=DEFAULT_INTERVAL, max_watchers=None,
+                 dedup=None):
+        self.store = store if store is not None else AccumulatorStore()
+        self.replicator = replicator
+        self.dedup = dedup
+        self.watch_hub = WatchHub(self.store, watch_interval, max_watchers)
+
+    @property
+    def running_sum(self):
+        """Running sum of the default key."""
+        return self.store.get(DEFAULT_KEY)
+
+    def _check_key(self, key, context):
+        error = key_error(self.store, key)
+        if error:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, error)
+        return key
 
     def CalculateSum(self, request, context):
-        # Add the new number to running sum
-        self.running_sum += request.number
-        logger.info(f"Received number {request.number}, new sum: {self.running_sum}")
-        return SumResponse(result=self.running_sum)
+        # Add the new number to the running sum of the request's key
+        key = self._check_key(resolve_key(request, context), context)
+        with sum_in_range(context):
+            running_sum = add_number(self.store, self.dedup, key, request)
+        request_log("Received number %d for key %s, new sum: %d", request.number, key, running_sum)
+        return SumResponse(result=running_sum)
+
+    def StreamSum(self, request_iterator, context):
+        # Apply each streamed number and reply with the updated running sum.
+        # Metadata is resolved once per stream rather than once per number.
+        stream_key = metadata_key(context)
+        count = 0
+        for request in request_iterator:
+            count += 1
+            key = self._check_key(request.key or stream_key, context)
+            with sum_in_range(context):
+                running_sum = add_number(self.store, self.dedup, key, request)
+            yield SumResponse(result=running_sum)
+        stream_log("StreamSum closed after %d numbers", count)
+
+    def CalculateSumBatch(self, request, context):
+        # Apply the whole batch atomically to the request's key
+        key = self._check_key(resolve_key(request, context), context)
+        with sum_in_range(context):
+            result, running_sums = add_batch(self.store, self.dedup, key, request)
+        request_log("Received batch of %d numbers for key %s, new sum: %d", len(request.numbers), key, result)
+        return SumBatchResponse(result=result, running_sums=running_sums)
+
+    def GetSum(self, request, context):
+        # Read without adding; merged reads consult every replica first
+        key = self._check_key(resolve_key(request, context), context)
+        if request.merged and self.replicator is not None:
+            return SumResponse(result=self.replicator.merged_value(key))
+        return SumResponse(result=self.store.get(key))
+
+    def WatchSum(self, request, context):
+        # Yields encoded SumUpdates shared by every watcher of the key; see
+        # add_sum_service for how they are sent without re-serializing
+        hub = self.watch_hub
+        topic = hub.subscribe(self._check_key(resolve_key(request, context), context))
+        if topic is None:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          "Too many WatchSum streams for the thread-pool server; "
+                          "raise --max-watchers or use --mode aio")
+        interval = watch_interval(request, hub)
+        stream_log("WatchSum opened for key %s", topic.key)
+        try:
+            version = 0
+            while context.is_active():
+                changed = topic.changed
+                latest_version, encoded = topic.latest
+                if latest_version == version:
+                    # Wake up now and then to notice a cancelled stream
+                    changed.wait(1.0)
+                    continue
+                version = latest_version
+                yield encoded
+                time.sleep(interval)
+        finally:
+            hub.unsubscribe(topic)
+            stream_log("WatchSum closed for key %s", topic.key)
 
     def ResetSum(self, request, context):
-        # Reset the running sum to 0
-        self.running_sum = 0
-        logger.info("Reset running sum to 0")
+        # Reset the running sum of the request's key to 0
+        key = self._check_key(resolve_key(request, context), context)
+        self.store.reset(key)
+        logger.info("Reset running sum for key %s to 0", key)
         return SumResponse(result=0)
 
 class HealthServicer(health_pb2_grpc.HealthServicer):
-    def __init__(self):
+    """Health of the whole server, whatever service name is asked about.
+
+    Reports NOT_SERVING after set_serving(False), or while the admission
+    limiter is shedding load, so load balancers move traffic away.
+    """
+
+    def __init__(self, limiter=None, watch_interval=0.25):
         self._server_status = health_pb2.HealthCheckResponse.SERVING
+        self.limiter = limiter
+        self.watch_interval = watch_interval
+        self._changed = threading.Condition()
+
+    def status(self):
+        if (self._server_status == health_pb2.HealthCheckResponse.SERVING
+                and self.limiter is not None and self.limiter.overloaded()):
+            return health_pb2.HealthCheckResponse.NOT_SERVING
+        return self._server_status
+
+    def set_serving(self, serving):
+        with self._changed:
+            self._server_status = (health_pb2.HealthCheckResponse.SERVING if serving
+                                   else health_pb2.HealthCheckResponse.NOT_SERVING)
+            self._changed.notify_all()
 
     def Check(self, request, context):
-        return health_pb2.HealthCheckResponse(status=self._server_status)
+        return health_pb2.HealthCheckResponse(status=self.status())
 
-def find_available_port(start_port, max_attempts=10):
-    """Find an available port starting from start_port."""
-    for port in range(start_port, start_port + max_attempts):
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.bind(('0.0.0.0', port))
-                return port
-        except OSError:
-            continue
-    raise RuntimeError(f"Could not find an available port after {max_attempts} attempts")
-
-def serve():
+    def Watch(self, request, context):
+        # Send the current status, then each change; the stream holds a worker
+        # thread for as long as it is open
+        last = None
+        while context.is_active():
+            status = self.status()
+            if status != last:
+                last = status
+                yield health_pb2.HealthCheckResponse(status=status)
+            with self._changed:
+                self._changed.wait(self.watch_interval)
+
+def bind(server, port, host='0.0.0.0'):
+    """Listen on host:port, or raise RuntimeError; never falls back to another port.
+
+    Returns the bound port, which is only different from port when port is 0.
+    """
+    address = f'{host}:{port}'
+    try:
+        bound = server.add_insecure_port(address)
+    except RuntimeError:
+        bound = 0
+    if not bound:
+        raise RuntimeError(f"Could not listen on {address}; is another process using port {port}?")
+    return bound
+
+def create_server(store=None, options=None, replicator=None, registry=None, limiter=None,
+                  max_concurrent_rpcs=None, watch_interval=DEFAULT_INTERVAL, dedup=None,
+                  max_watchers=DEFAULT_MAX_WATCHERS):
+    """Build a thread-pool server with the sum, health and reflection services.
+
+    With a metrics registry, every RPC and the thread pool are instrumented.
+    With an AdaptiveLimiter, RPCs over its limit are rejected with
+    RESOURCE_EXHAUSTED; max_concurrent_rpcs is a fixed cap on top of that.
+    WatchSum streams each hold a thread, so at most max_watchers are
+    allowed, on threads added to the pool for them.
+    With a DedupCache, numbers carrying a request_id are added only once.
+    """
+    interceptors = []
+    threads = SERVER_THREADS + max_watchers
+    if registry is None:
+        executor = futures.ThreadPoolExecutor(max_workers=threads)
+    else:
+        executor = InstrumentedThreadPoolExecutor(registry, max_workers=threads, prefix='grpc_server_executor')
+        interceptors.append(MetricsInterceptor(ServerMetrics(registry)))
+    if limiter is not None:
+        interceptors.append(AdmissionInterceptor(limiter))
+        if registry is not None:
+            limiter.register_metrics(registry)
+    if dedup is not None and registry is not None:
+        dedup.register_metrics(registry)
+    server = grpc.server(executor, options=options, interceptors=interceptors,
+                         maximum_concurrent_rpcs=max_concurrent_rpcs)
+    
+    # Add SumService
+    servicer = SumServicer(store, replicator, watch_interval, max_watchers=max_watchers, dedup=dedup)
+    add_sum_service(servicer, server)
+    
+    # Add the internal replication service when replicas exchange state
+    if replicator is not None:
+        from sum_service.grpc.replication import ReplicationServicer
+        add_ReplicationServiceServicer_to_server(ReplicationServicer(replicator.store), server)
+    
+    # Add health service
+    health_servicer = HealthServicer(limiter)
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    
+    # Add reflection service
+    reflection.enable_server_reflection(SERVICE_NAMES, server)
+    return server
+
+def serve(port=50051, store=None, replicator=None, registry=None, limiter=None, max_concurrent_rpcs=None,
+          handoff=None, grace=5.0, watch_interval=DEFAULT_INTERVAL, dedup=None, handoff_grace=1.0,
+          max_watchers=DEFAULT_MAX_WATCHERS, listen_fd=None):
+    """Serve until SIGTERM or Ctrl-C, then drain RPCs for up to grace seconds.
+
+    With listen_fd, connections are accepted from that inherited listening
+    socket instead of port. With a supervisor.Handoff, the server serves at
+    once, adds its predecessor's sums as they arrive, and hands its own sums
+    on once its clients have left and its RPCs are drained. Its replacement
+    is already serving by then, so the drain is cut to handoff_grace.
+    """
+    if store is None:
+        store = AccumulatorStore()
+    # A busy port must be an error rather than a silent split of the traffic
+    options = [('grpc.so_reuseport', 0)]
+    if listen_fd is not None:
+        from sum_service.grpc.supervisor import CONNECTION_AGE, ListenerRelay
+        # A GOAWAY at shutdown cancels calls not yet picked up by a thread; an
+        # aged-out connection is left without failing any
+        options.append(('grpc.max_connection_age_ms', int(CONNECTION_AGE * 1000)))
+    server = create_server(store, options=options, replicator=replicator, registry=registry, limiter=limiter,
+                           max_concurrent_rpcs=max_concurrent_rpcs, watch_interval=watch_interval, dedup=dedup,
+                           max_watchers=max_watchers)
+    relay = None
+    if listen_fd is None:
+        bind(server, port)
+    else:
+        relay = ListenerRelay(listen_fd, server)
+
+    stopping = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    server.start()
+    if relay is not None:
+        relay.start()
+    logger.info("gRPC server started on port %d", port)
+    if handoff is not None:
+        handoff.ready()
+        threading.Thread(target=take_over, args=(store, handoff), name='handoff', daemon=True).start()
     try:
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-        
-        # Add SumService
-        add_SumServiceServicer_to_server(SumServicer(), server)
-        
-        # Add health service
-        health_servicer = HealthServicer()
-        health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
-        
-        # Add reflection service
-        SERVICE_NAMES = (
-            'sum.SumService',
-            health_pb2.DESCRIPTOR.services_by_name['Health'].full_name,
-            reflection.SERVICE_NAME,
-        )
-        reflection.enable_server_reflection(SERVICE_NAMES, server)
-        
-        # Find an available port
-        port = find_available_port(50051)
-        logger.info(f"Found available port: {port}")
-        
-        # Try different binding approaches
-        binding_attempts = [
-            f'0.0.0.0:{port}',
-            f'127.0.0.1:{port}',
-            f'localhost:{port}'
-        ]
-        
-        bound = False
-        for binding in binding_attempts:
-            try:
-                server.add_insecure_port(binding)
-                logger.info(f"Successfully bound to {binding}")
-                bound = True
-                break
-            except Exception as e:
-                logger.warning(f"Failed to bind to {binding}: {str(e)}")
-                time.sleep(1)  # Wait a bit before trying the next binding
-        
-        if not bound:
-            raise RuntimeError("Failed to bind to any address")
-        
-        server.start()
-        logger.info(f"gRPC server started on port {port}")
-        
-        # Keep the server running
+        while not stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        logger.info("Server stopped by user")
+    finally:
+        if handoff is not None:
+            grace = min(grace, handoff_grace)
+        if relay is not None:
+            # Clients reconnect through the listener, to the replacement
+            relay.stop_accepting()
+            relay.wait_closed(CONNECTION_AGE + grace)
+        logger.info("Draining RPCs for up to %s seconds", grace)
+        server.stop(grace).wait()
+        if relay is not None:
+            relay.close()
+        if handoff is not None:
+            handoff.send(store.snapshot())
+
+def take_over(store, handoff):
+    """Add the previous server process's sums to store once they arrive."""
+    sums = handoff.receive()
+    for key, value in sums.items():
+        store.add(key, value)
+    logger.info("Took over %d sums", len(sums))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the sum gRPC server")
+    parser.add_argument(
+        '--mode', choices=('sync', 'aio'),
+        default=os.getenv('GRPC_SERVER_MODE', 'sync'),
+        help="thread-pool server (sync) or asyncio server (aio)")
+    parser.add_argument(
+        '--port', type=int, default=int(os.getenv('GRPC_PORT', '50051')),
+        help="port to listen on")
+    parser.add_argument(
+        '--workers', type=int, default=int(os.getenv('GRPC_WORKERS', '1')),
+        help="number of worker processes sharing the port via SO_REUSEPORT")
+    parser.add_argument(
+        '--shared-slots', type=int, default=int(os.getenv('GRPC_SHARED_SLOTS', '65536')),
+        help="accumulator keys that fit in shared memory when --workers > 1")
+    parser.add_argument(
+        '--data-dir', default=os.getenv('GRPC_DATA_DIR'),
+        help="persist sums in a write-ahead log and snapshots under this directory")
+    parser.add_argument(
+        '--fsync', choices=FSYNC_POLICIES, default=os.getenv('GRPC_FSYNC', 'interval'),
+        help="when to fsync the write-ahead log")
+    parser.add_argument(
+        '--snapshot-interval', type=float, default=float(os.getenv('GRPC_SNAPSHOT_INTERVAL', '60')),
+        help="seconds between snapshots of the persisted sums")
+    parser.add_argument(
+        '--peers', default=os.getenv('GRPC_PEERS', ''),
+        help="comma-separated host:port of peer replicas; enables replicated counters")
+    parser.add_argument(
+        '--replica-id', default=os.getenv('GRPC_REPLICA_ID') or socket.gethostname(),
+        help="unique name of this replica (default: hostname)")
+    parser.add_argument(
+        '--replication-interval', type=float, default=float(os.getenv('GRPC_REPLICATION_INTERVAL', '0.1')),
+        help="seconds between state pushes to peers")
+    parser.add_argument(
+        '--metrics-port', type=int, default=int(os.getenv('GRPC_METRICS_PORT', '0')),
+        help="serve Prometheus metrics on this port (0 disables them)")
+    parser.add_argument(
+        '--admission', choices=('adaptive', 'off'), default=os.getenv('GRPC_ADMISSION', 'adaptive'),
+        help="shed RPCs over an adaptive concurrency limit with RESOURCE_EXHAUSTED")
+    parser.add_argument(
+        '--latency-target-ms', type=float, default=float(os.getenv('GRPC_LATENCY_TARGET_MS', '50')),
+        help="latency above which the adaptive limit backs off")
+    parser.add_argument(
+        '--max-concurrent-rpcs', type=int, default=int(os.getenv('GRPC_MAX_CONCURRENT_RPCS', '0')),
+        help="fixed cap on concurrent RPCs (0 for none)")
+    parser.add_argument(
+        '--watch-interval-ms', type=float, default=float(os.getenv('GRPC_WATCH_INTERVAL_MS', '50')),
+        help="shortest time between two WatchSum updates to one watcher")
+    parser.add_argument(
+        '--max-watchers', type=int, default=int(os.getenv('GRPC_MAX_WATCHERS', str(DEFAULT_MAX_WATCHERS))),
+        help="WatchSum streams the sync server allows at once, each on a thread of its own")
+    parser.add_argument(
+        '--dedup-ttl', type=float, default=float(os.getenv('GRPC_DEDUP_TTL', '60')),
+        help="seconds a request_id is remembered, so a retry within it is not added twice")
+    parser.add_argument(
+        '--dedup-max-entries', type=int, default=int(os.getenv('GRPC_DEDUP_MAX_ENTRIES', '100000')),
+        help="most request_ids remembered at once (0 disables deduplication)")
+    parser.add_argument(
+        '--restart-mode', action='store_true', default=os.getenv('GRPC_RESTART_MODE') == '1',
+        help="run under a supervisor that replaces the server on SIGHUP without downtime")
+    parser.add_argument(
+        '--grace', type=float, default=float(os.getenv('GRPC_SHUTDOWN_GRACE', '5')),
+        help="seconds to let in-flight RPCs finish on shutdown")
+    parser.add_argument(
+        '--handoff-grace', type=float, default=float(os.getenv('GRPC_HANDOFF_GRACE', '1')),
+        help="in restart mode, the shorter drain used instead of --grace; "
+             "sums reach the replacement when it ends")
+    # Set by the supervisor on the server processes it starts
+    parser.add_argument('--handoff-fds', help=argparse.SUPPRESS)
+    parser.add_argument('--listen-fd', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    setup_logging()
+    peers = [peer.strip() for peer in args.peers.split(',') if peer.strip()]
+
+    # SIGUSR1/SIGUSR2 profile the process; nothing is sampled until then
+    profiling = Profiling()
+    profiling.install_signal_handlers()
+
+    handoff = None
+    if args.restart_mode or args.handoff_fds:
+        if args.workers > 1 or args.data_dir or peers or args.mode == 'aio' or args.metrics_port:
+            parser.error("--restart-mode is only supported by a single sync process without "
+                         "--data-dir, --peers or --metrics-port")
+        if not args.handoff_fds:
+            from sum_service.grpc.supervisor import Supervisor
+            argv = sys.argv[1:] if argv is None else argv
+            Supervisor(args.port, [arg for arg in argv if arg != '--restart-mode']).run()
+            return
+        from sum_service.grpc.supervisor import Handoff
+        handoff = Handoff.parse(args.handoff_fds)
+
+    registry = None
+    if args.metrics_port:
+        if args.workers > 1:
+            parser.error("--metrics-port is not supported with --workers")
+        registry = Registry()
+        start_http_server(args.metrics_port, registry, routes=profiling.routes())
+        logger.info("Serving metrics on port %d", args.metrics_port)
+
+    limiter = None
+    if args.admission == 'adaptive':
+        limiter = AdaptiveLimiter(latency_target=args.latency_target_ms / 1000)
+    dedup = None
+    if args.dedup_max_entries:
+        dedup = DedupCache(ttl=args.dedup_ttl, max_entries=args.dedup_max_entries)
+    server_options = dict(registry=registry, limiter=limiter,
+                          max_concurrent_rpcs=args.max_concurrent_rpcs or None,
+                          watch_interval=args.watch_interval_ms / 1000, dedup=dedup)
+
+    if peers:
+        if args.workers > 1 or args.data_dir or args.mode == 'aio':
+            parser.error("--peers is only supported by a single sync process without --data-dir")
+        from sum_service.grpc.replication import PNCounterStore, Replicator
+        store = PNCounterStore(args.replica_id)
+        replicator = Replicator(store, peers, interval=args.replication_interval)
+        # Recover this replica's slot, and the current sums, before taking writes
+        if not replicator.bootstrap():
+            logger.warning("No peer reachable; replica %s starts from empty state", args.replica_id)
+        replicator.start()
         try:
-            server.wait_for_termination()
-        except KeyboardInterrupt:
-            logger.info("Server stopped by user")
-        except Exception as e:
-            logger.error(f"Server terminated unexpectedly: {str(e)}")
-            raise
-            
-    except Exception as e:
-        logger.error(f"Failed to start gRPC server: {str(e)}")
-        raise
+            serve(port=args.port, store=store, replicator=replicator, grace=args.grace,
+                  max_watchers=args.max_watchers, **server_options)
+        finally:
+            replicator.stop()
+        return
+
+    if args.workers > 1:
+        if args.data_dir:
+            parser.error("--data-dir is not supported with --workers")
+        if dedup is not None:
+            # Retries and hedged attempts can reach another worker, whose cache
+            # has never seen the request_id, and would be added twice
+            parser.error("--workers needs --dedup-max-entries 0: the dedup cache cannot be "
+                         "shared between workers")
+        if args.mode == 'sync':
+            server_options['max_watchers'] = args.max_watchers
+        from sum_service.grpc.workers import serve_workers
+        serve_workers(args.port, args.workers, mode=args.mode, slots=args.shared_slots, **server_options)
+        return
+
+    store = persistence = None
+    if args.data_dir:
+        if args.mode == 'aio' and args.fsync == 'always':
+            # Waiting for each fsync would block the event loop
+            parser.error("--fsync always is not supported with --mode aio; use interval or none")
+        store, persistence = open_store(
+            args.data_dir, args.fsync, snapshot_interval=args.snapshot_interval)
+    try:
+        if args.mode == 'aio':
+            from sum_service.grpc.aio_server import run
+            run(port=args.port, store=store, **server_options)
+        else:
+            serve(port=args.port, store=store, handoff=handoff, grace=args.grace,
+                  handoff_grace=args.handoff_grace, max_watchers=args.max_watchers,
+                  listen_fd=args.listen_fd, **server_options)
+    finally:
+        if persistence is not None:
+            persistence.close()
 
 if __name__ == '__main__':
-    serve() 
\ No newline at end of file
+    main() 
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+Keyed accumulator store in shared memory, for multi-process servers.
+"""
+
+import multiprocessing
+import struct
+import zlib
+from itertools import accumulate
+from multiprocessing import shared_memory
+
+from sum_service.grpc.accumulator import check_int64
+
+DEFAULT_SLOTS = 65536
+DEFAULT_SEGMENTS = 64
+
+# value, used flag, key length, key bytes
+_SLOT = struct.Struct('<qBB62s')
+_VALUE = struct.Struct('<q')
+MAX_KEY_BYTES = 62
+
+
+class SharedAccumulatorStore:
+    """Running sums in a fixed-size open-addressing table in shared memory.
+
+    The table is split into segments, each guarded by its own process-shared
+    lock; a key hashes to one segment and is probed only inside it, so workers
+    updating keys in different segments never contend. Create the store in the
+    parent before forking workers; children inherit the mapping and locks.
+
+    Sums are 64-bit signed integers (an update past that range raises
+    OverflowError and changes nothing) and keys are limited to MAX_KEY_BYTES of
+    UTF-8. Slots are never freed: reset() sets the sum back to 0.
+    """
+
+    max_key_bytes = MAX_KEY_BYTES
+
+    def __init__(self, slots=DEFAULT_SLOTS, segments=DEFAULT_SEGMENTS, mp_context=None):
+        if segments < 1 or slots < segments:
+            raise ValueError("slots must be at least segments, and segments at least 1")
+        ctx = mp_context or multiprocessing.get_context('fork')
+        self._segments = segments
+        self._segment_slots = slots // segments
+        self._locks = tuple(ctx.Lock() for _ in range(segments))
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=self._segments * self._segment_slots * _SLOT.size)
+        self._buf = self._shm.buf
+
+    @property
+    def capacity(self):
+        return self._segments * self._segment_slots
+
+    def _segment(self, key):
+        key_bytes = key.encode('utf-8')
+        if len(key_bytes) > MAX_KEY_BYTES:
+            raise ValueError(f"Key longer than {MAX_KEY_BYTES} bytes: {key!r}")
+        h = zlib.crc32(key_bytes)
+        return key_bytes, h % self._segments, h // self._segments
+
+    def _find(self, key_bytes, segment, h, create):
+        # Linear probing within the segment; caller holds the segment lock
+        n = self._segment_slots
+        base = segment * n
+        start = h % n
+        buf = self._buf
+        for i in range(n):
+            offset = (base + (start + i) % n) * _SLOT.size
+            _, used, length, raw = _SLOT.unpack_from(buf, offset)
+            if not used:
+                if not create:
+                    return None
+                _SLOT.pack_into(buf, offset, 0, 1, len(key_bytes), key_bytes)
+                return offset
+            if length == len(key_bytes) and raw[:length] == key_bytes:
+                return offset
+        raise MemoryError(f"Shared accumulator segment {segment} is full")
+
+    def add(self, key, delta):
+        """Add delta to the sum for key and return the new sum."""
+        key_bytes, segment, h = self._segment(key)
+        with self._locks[segment]:
+            offset = self._find(key_bytes, segment, h, create=True)
+            value = check_int64(_VALUE.unpack_from(self._buf, offset)[0] + delta)
+            _VALUE.pack_into(self._buf, offset, value)
+        return value
+
+    def add_many(self, key, deltas, running_sums=False):
+        """Add deltas to the sum for key in one atomic step.
+
+        Returns (final_sum, prefix_sums) like AccumulatorStore.add_many.
+        """
+        if not running_sums:
+            return self.add(key, sum(deltas)), None
+        it = iter(deltas)
+        first = next(it, None)
+        if first is None:
+            return self.get(key), []
+        key_bytes, segment, h = self._segment(key)
+        with self._locks[segment]:
+            offset = self._find(key_bytes, segment, h, create=True)
+            sums = list(accumulate(it, initial=_VALUE.unpack_from(self._buf, offset)[0] + first))
+            check_int64(min(sums))
+            check_int64(max(sums))
+            _VALUE.pack_into(self._buf, offset, sums[-1])
+        return sums[-1], sums
+
+    def get(self, key):
+        """Return the current sum for key (0 if unknown)."""
+        key_bytes, segment, h = self._segment(key)
+        with self._locks[segment]:
+            offset = self._find(key_bytes, segment, h, create=False)
+            return 0 if offset is None else _VALUE.unpack_from(self._buf, offset)[0]
+
+    def reset(self, key):
+        """Reset the sum for key to 0."""
+        key_bytes, segment, h = self._segment(key)
+        with self._locks[segment]:
+            offset = self._find(key_bytes, segment, h, create=False)
+            if offset is not None:
+                _VALUE.pack_into(self._buf, offset, 0)
+        return 0
+
+    def snapshot(self):
+        """Return a copy of all non-zero sums, one segment at a time."""
+        result = {}
+        for segment, lock in enumerate(self._locks):
+            base = segment * self._segment_slots
+            with lock:
+                for slot in range(base, base + self._segment_slots):
+                    value, used, length, raw = _SLOT.unpack_from(self._buf, slot * _SLOT.size)
+                    if used and value:
+                        result[raw[:length].decode('utf-8')] = value
+        return result
+
+    def __len__(self):
+        return len(self.snapshot())
+
+    def close(self):
+        """Detach this process from the shared memory block."""
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        """Free the shared memory block; call once, from the creating process."""
+        self._shm.unlink()
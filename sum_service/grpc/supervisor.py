@@ -0,0 +1,288 @@
+"""
+Restart mode: a supervisor process owns the listening socket and hands the
+sums from each server process to its replacement.
+
+The supervisor binds and listens on the port once and passes the socket to
+every server child it starts. The listener therefore stays open across
+restarts, and connections queued on it are never reset. grpcio cannot serve
+an inherited socket, so each child serves gRPC on a private unix socket and
+relays the connections it accepts from the shared listener to it.
+
+On SIGHUP the supervisor starts a replacement, which serves at once with
+empty sums; both children accept from the listener until the replacement
+is ready. The old child then gets SIGTERM and stops accepting. Children
+recycle client connections every CONNECTION_AGE seconds, so its clients
+soon reconnect, to the replacement. It then drains the RPCs left for at
+most --handoff-grace seconds (long-lived streams are cancelled then) and
+writes its sums to the supervisor. The supervisor relays them to the replacement,
+which adds them to the sums it has collected meanwhile. Until they arrive,
+replies from the replacement count only its own additions.
+
+Each child talks to the supervisor over two pipes: it writes READY and,
+on exit, its sums to a control pipe, and reads its predecessor's sums from
+a state pipe.
+"""
+
+import contextlib
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+from sum_service.grpc.persistence import decode_records, encode_record
+
+logger = logging.getLogger(__name__)
+
+READY = b'R'
+# Server children recycle client connections this often (in seconds), so a
+# draining child loses its clients to the replacement without failing RPCs
+CONNECTION_AGE = 2.0
+
+class Handoff:
+    """The child's end of the supervisor pipes, given as --handoff-fds STATE,CONTROL."""
+
+    def __init__(self, state_fd, control_fd):
+        self.state_fd = state_fd
+        self.control_fd = control_fd
+
+    @classmethod
+    def parse(cls, value):
+        state_fd, control_fd = (int(fd) for fd in value.split(','))
+        return cls(state_fd, control_fd)
+
+    def ready(self):
+        """Tell the supervisor this process is serving."""
+        os.write(self.control_fd, READY)
+
+    def receive(self):
+        """Wait for the previous process's sums and return them as a dict."""
+        with os.fdopen(self.state_fd, 'rb') as f:
+            return dict(decode_records(f.read()))
+
+    def send(self, sums):
+        """Hand this process's sums to the supervisor; call once, when drained."""
+        with os.fdopen(self.control_fd, 'wb') as f:
+            f.write(b''.join(encode_record(key, value) for key, value in sums.items()))
+
+def listen(port, host='0.0.0.0', backlog=128):
+    """Bind and listen on host:port, for server children to share."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind((host, port))
+        sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def _pipe(source, sink):
+    try:
+        while True:
+            data = source.recv(65536)
+            if not data:
+                break
+            sink.sendall(data)
+    except OSError:
+        pass
+    with contextlib.suppress(OSError):
+        sink.shutdown(socket.SHUT_WR)
+
+def _relay(client, upstream):
+    forward = threading.Thread(target=_pipe, args=(client, upstream), daemon=True)
+    forward.start()
+    _pipe(upstream, client)
+    forward.join()
+    client.close()
+    upstream.close()
+
+class ListenerRelay:
+    """Accept from an inherited listening socket and relay to server on a unix socket.
+
+    The listener is shared with other processes, so it is never shut down;
+    stop_accepting() only stops this process taking connections from it.
+    wait_closed() then waits for the relayed connections to end.
+    """
+
+    def __init__(self, listen_fd, server):
+        self.listener = socket.socket(fileno=listen_fd)
+        # Another process may take a connection first; accept must not block then
+        self.listener.setblocking(False)
+        self._directory = tempfile.mkdtemp(prefix='sum-service-')
+        self.path = os.path.join(self._directory, 'grpc.sock')
+        if not server.add_insecure_port(f'unix:{self.path}'):
+            raise RuntimeError(f"Could not listen on {self.path}")
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._open = 0
+        self._closed = threading.Condition()
+        self._thread = threading.Thread(target=self._accept_loop, name='listener-relay', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _accept_loop(self):
+        while True:
+            readable, _, _ = select.select([self.listener, self._wakeup_r], [], [])
+            if self._wakeup_r in readable:
+                return
+            try:
+                client, _ = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                continue
+            client.setblocking(True)
+            upstream = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                upstream.connect(self.path)
+            except OSError:
+                logger.exception("Could not reach the server to relay a connection")
+                client.close()
+                upstream.close()
+                continue
+            with self._closed:
+                self._open += 1
+            threading.Thread(target=self._relay, args=(client, upstream), daemon=True).start()
+
+    def _relay(self, client, upstream):
+        try:
+            _relay(client, upstream)
+        finally:
+            with self._closed:
+                self._open -= 1
+                self._closed.notify_all()
+
+    def stop_accepting(self):
+        """Leave new connections to the other processes on the listener."""
+        os.write(self._wakeup_w, b'x')
+        self._thread.join()
+        self.listener.close()
+
+    def wait_closed(self, timeout):
+        """Wait up to timeout seconds for relayed connections to end; return whether they did."""
+        with self._closed:
+            return self._closed.wait_for(lambda: self._open == 0, timeout)
+
+    def close(self):
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+class _Child:
+    def __init__(self, process, control, state_fd):
+        self.process = process
+        self.control = control
+        self.state_fd = state_fd
+
+    def give_state(self, data):
+        try:
+            with os.fdopen(self.state_fd, 'wb') as f:
+                f.write(data)
+        except BrokenPipeError:
+            logger.error("Server process %d exited before receiving its state", self.process.pid)
+
+    def stop(self):
+        """SIGTERM the child and return the sums it writes as it exits."""
+        self.process.send_signal(signal.SIGTERM)
+        with self.control:
+            data = self.control.read()
+        code = self.process.wait()
+        if code != 0:
+            logger.warning("Server process %d exited with status %d", self.process.pid, code)
+        return data
+
+class Supervisor:
+    """Run `python -m sum_service.grpc.server` children on port, each replacing the last.
+
+    server_args are passed to every child and must include --port.
+    """
+
+    def __init__(self, port, server_args=(), ready_timeout=30.0):
+        self.port = port
+        self.server_args = list(server_args)
+        self.ready_timeout = ready_timeout
+        self.child = None
+        self.listener = None
+        self._restart_requested = False
+        self._stop_requested = False
+
+    def _spawn(self):
+        state_r, state_w = os.pipe()
+        control_r, control_w = os.pipe()
+        listen_fd = self.listener.fileno()
+        command = [sys.executable, '-m', 'sum_service.grpc.server', *self.server_args,
+                   '--handoff-fds', f'{state_r},{control_w}', '--listen-fd', str(listen_fd)]
+        try:
+            process = subprocess.Popen(command, pass_fds=(state_r, control_w, listen_fd))
+        finally:
+            os.close(state_r)
+            os.close(control_w)
+        control = os.fdopen(control_r, 'rb')
+        child = _Child(process, control, state_w)
+        readable, _, _ = select.select([control], [], [], self.ready_timeout)
+        if not readable or control.read(1) != READY:
+            process.kill()
+            process.wait()
+            control.close()
+            os.close(state_w)
+            raise RuntimeError(f"Server process did not start serving port {self.port}")
+        logger.info("Server process %d is serving port %d", process.pid, self.port)
+        return child
+
+    def start(self):
+        try:
+            self.listener = listen(self.port)
+        except OSError as e:
+            raise RuntimeError(f"Could not listen on port {self.port}: {e}") from e
+        self.child = self._spawn()
+        self.child.give_state(b'')
+
+    def restart(self):
+        """Replace the running child without closing the listener or losing sums."""
+        replacement = self._spawn()
+        old, self.child = self.child, replacement
+        replacement.give_state(old.stop())
+        logger.info("Server process %d replaced %d", replacement.process.pid, old.process.pid)
+
+    def stop(self):
+        if self.child is not None:
+            self.child.stop()
+            self.child = None
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+    def request_restart(self, signum=None, frame=None):
+        self._restart_requested = True
+
+    def request_stop(self, signum=None, frame=None):
+        self._stop_requested = True
+
+    def run(self):
+        """Supervise until SIGTERM or SIGINT; SIGHUP triggers a restart."""
+        signal.signal(signal.SIGHUP, self.request_restart)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        self.start()
+        try:
+            while not self._stop_requested:
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self.restart()
+                    continue
+                try:
+                    code = self.child.process.wait(timeout=0.2)
+                except subprocess.TimeoutExpired:
+                    continue
+                # The sums of a crashed child are lost; keep the port served
+                logger.error("Server process %d exited with status %d; starting a new one",
+                             self.child.process.pid, code)
+                self.child.control.close()
+                self.child = self._spawn()
+                self.child.give_state(b'')
+        finally:
+            self.stop()
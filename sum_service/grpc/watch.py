@@ -0,0 +1,156 @@
+"""
+WatchSum fan-out: every watcher of a key shares one encoded update.
+
+A flusher reads the sum of each watched key once per interval. When the
+sum has changed, it encodes one SumUpdate and wakes every watcher of that
+key, and each watcher sends that same bytes object. A watcher that is
+still sending, or whose own interval has not passed, picks up whatever is
+latest when it is ready, so updates coalesce instead of queueing. The
+write path is not involved at all: the cost is one store read per watched
+key per interval, however many watchers or writes there are.
+"""
+
+import asyncio
+import threading
+import time
+
+import grpc
+
+from sum_service.grpc.proto import sum_pb2
+
+from sum_service.grpc.instrumentation import HANDLER_FACTORIES
+
+DEFAULT_INTERVAL = 0.05
+
+class Topic:
+    """The latest encoded update of one watched key.
+
+    latest is a (version, encoded SumUpdate) pair, replaced as a whole so
+    readers never see one without the other. changed is set, and replaced by
+    a fresh event, whenever latest changes.
+    """
+
+    __slots__ = ('key', 'value', 'latest', 'changed', 'watchers')
+
+    def __init__(self, key, changed):
+        self.key = key
+        self.value = None
+        self.latest = (0, None)
+        self.changed = changed
+        self.watchers = 0
+
+class WatchHub:
+    """Watched keys of one store, flushed every interval by a background thread.
+
+    max_watchers caps concurrent watchers, since each one holds a thread of
+    a thread-pool server for as long as it watches.
+    """
+
+    event_factory = threading.Event
+
+    def __init__(self, store, interval=DEFAULT_INTERVAL, max_watchers=None):
+        self.store = store
+        self.interval = interval
+        self.max_watchers = max_watchers
+        self.watchers = 0
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def subscribe(self, key):
+        """Return the Topic for key, or None if max_watchers are already watching."""
+        with self._lock:
+            if self.max_watchers is not None and self.watchers >= self.max_watchers:
+                return None
+            self.watchers += 1
+            topic = self._topics.get(key)
+            if topic is None:
+                topic = Topic(key, self.event_factory())
+                self._update(topic)
+                self._topics[key] = topic
+            topic.watchers += 1
+            if self._flusher is None:
+                self._flusher = self._start_flusher()
+            return topic
+
+    def unsubscribe(self, topic):
+        with self._lock:
+            self.watchers -= 1
+            topic.watchers -= 1
+            if topic.watchers == 0 and self._topics.get(topic.key) is topic:
+                del self._topics[topic.key]
+
+    def _update(self, topic):
+        value = self.store.get(topic.key)
+        if value == topic.value:
+            return False
+        topic.value = value
+        version = topic.latest[0] + 1
+        topic.latest = (version, sum_pb2.SumUpdate(key=topic.key, result=value, version=version).SerializeToString())
+        return True
+
+    def flush(self):
+        """Encode and announce the current sum of every watched key that changed."""
+        for topic in list(self._topics.values()):
+            if self._update(topic):
+                changed, topic.changed = topic.changed, self.event_factory()
+                changed.set()
+
+    def _idle(self):
+        # The flusher stops once nobody is watching; subscribe() restarts it
+        with self._lock:
+            if self._topics:
+                return False
+            self._flusher = None
+            return True
+
+    def _start_flusher(self):
+        thread = threading.Thread(target=self._flush_loop, name='watch-flusher', daemon=True)
+        thread.start()
+        return thread
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.interval)
+            if self._idle():
+                return
+            self.flush()
+
+class AsyncWatchHub(WatchHub):
+    """WatchHub for grpc.aio servers; the flusher is a task on the event loop."""
+
+    event_factory = asyncio.Event
+
+    def _start_flusher(self):
+        return asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._idle():
+                return
+            self.flush()
+
+def watch_interval(request, hub):
+    """Seconds between updates for one watcher: its own interval, but not below the hub's."""
+    return max(request.min_interval_ms / 1000, hub.interval)
+
+def add_sum_service(servicer, server):
+    """Register SumService on server, with WatchSum's encoded updates sent as-is.
+
+    Use instead of the generated add_SumServiceServicer_to_server. Every
+    method handler is built here from the service descriptor, so the
+    pass-through serializer does not depend on how the generated code
+    registers its own handlers (stubs from grpcio-tools 1.63 and later add
+    registered method handlers, which take precedence over generic ones).
+    """
+    service = sum_pb2.DESCRIPTOR.services_by_name['SumService']
+    handlers = {}
+    for method in service.methods:
+        factory = HANDLER_FACTORIES[(method.client_streaming, method.server_streaming)]
+        response_class = getattr(sum_pb2, method.output_type.name)
+        handlers[method.name] = factory(
+            getattr(servicer, method.name),
+            request_deserializer=getattr(sum_pb2, method.input_type.name).FromString,
+            response_serializer=None if method.name == 'WatchSum' else response_class.SerializeToString)
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(service.full_name, handlers),))
@@ -0,0 +1,81 @@
+"""
+Multi-process server mode: N forked workers share one port via SO_REUSEPORT.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import signal
+import sys
+
+from sum_service.grpc.shared_accumulator import SharedAccumulatorStore, DEFAULT_SLOTS
+
+logger = logging.getLogger(__name__)
+
+# Let the kernel spread incoming connections over every worker's listener
+REUSEPORT_OPTIONS = [('grpc.so_reuseport', 1)]
+
+def _run_worker(port, store, mode, server_options):
+    # gRPC must be initialised after the fork, so the server is only built here;
+    # each worker gets its own copy of the limiter and sheds its own load
+    if mode == 'aio':
+        from sum_service.grpc.aio_server import create_server
+
+        async def run():
+            server = create_server(store, options=REUSEPORT_OPTIONS, **server_options)
+            if not server.add_insecure_port(f'0.0.0.0:{port}'):
+                raise RuntimeError(f"Worker failed to bind to port {port}")
+            await server.start()
+            await server.wait_for_termination()
+
+        asyncio.run(run())
+    else:
+        from sum_service.grpc.server import create_server
+
+        server = create_server(store, options=REUSEPORT_OPTIONS, **server_options)
+        if not server.add_insecure_port(f'0.0.0.0:{port}'):
+            raise RuntimeError(f"Worker failed to bind to port {port}")
+        server.start()
+        server.wait_for_termination()
+
+def start_workers(port, workers, mode='sync', slots=DEFAULT_SLOTS, **server_options):
+    """Fork the worker processes and return (processes, store).
+
+    server_options (limiter, max_concurrent_rpcs, watch_interval and, for
+    sync workers, max_watchers) are passed to every worker's create_server.
+    A DedupCache is refused: it would belong to one worker, and a retry
+    reaching another one would be added again.
+    """
+    if server_options.get('dedup') is not None or server_options.get('registry') is not None:
+        raise ValueError("Workers cannot share a dedup cache or a metrics registry")
+    ctx = multiprocessing.get_context('fork')
+    store = SharedAccumulatorStore(slots=slots, mp_context=ctx)
+    processes = []
+    for i in range(workers):
+        process = ctx.Process(target=_run_worker, args=(port, store, mode, server_options),
+                              name=f'sum-worker-{i}')
+        process.start()
+        processes.append(process)
+    logger.info("Started %d %s workers on port %d", workers, mode, port)
+    return processes, store
+
+def stop_workers(processes, store):
+    """Terminate the workers and free the shared accumulator."""
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
+    store.close()
+    store.unlink()
+
+def serve_workers(port, workers, mode='sync', slots=DEFAULT_SLOTS, **server_options):
+    processes, store = start_workers(port, workers, mode=mode, slots=slots, **server_options)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("Server stopped by user")
+    finally:
+        stop_workers(processes, store)
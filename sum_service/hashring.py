@@ -0,0 +1,106 @@
+"""
+Consistent hashing of accumulator keys onto upstream replicas.
+"""
+
+import bisect
+import hashlib
+import threading
+
+DEFAULT_VNODES = 160
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes.
+
+    Each node owns vnodes points on the ring and a key belongs to the first
+    point at or after its hash, so adding or removing a node only moves the
+    keys on that node's arcs. Lookups read an immutable (points, owners)
+    pair, so they need no lock while membership changes.
+    """
+
+    def __init__(self, nodes=(), vnodes=DEFAULT_VNODES):
+        if vnodes < 1:
+            raise ValueError("vnodes must be at least 1")
+        self.vnodes = vnodes
+        self._nodes = set()
+        self._lock = threading.Lock()
+        self._ring = ((), ())
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        return sorted(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._nodes
+
+    def _rebuild(self):
+        ring = sorted((_hash(f'{node}#{i}'), node) for node in self._nodes for i in range(self.vnodes))
+        self._ring = (tuple(point for point, _ in ring), tuple(node for _, node in ring))
+
+    def add(self, node):
+        with self._lock:
+            if node not in self._nodes:
+                self._nodes.add(node)
+                self._rebuild()
+
+    def remove(self, node):
+        with self._lock:
+            if node in self._nodes:
+                self._nodes.discard(node)
+                self._rebuild()
+
+    def get(self, key):
+        """Return the node owning key."""
+        points, owners = self._ring
+        if not points:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect.bisect_left(points, _hash(key))
+        return owners[index % len(owners)]
+
+class ShardRouter:
+    """Maps keys to per-node objects (channels, stubs, pools) through a HashRing.
+
+    factory(node) builds the object for a node the first time it is needed;
+    set_nodes() reconciles membership and returns the objects of removed
+    nodes so the caller can close them.
+    """
+
+    def __init__(self, nodes, factory, vnodes=DEFAULT_VNODES):
+        self.ring = HashRing(nodes, vnodes=vnodes)
+        self._factory = factory
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        node = self.ring.get(key)
+        obj = self._objects.get(node)
+        if obj is None:
+            with self._lock:
+                obj = self._objects.get(node)
+                if obj is None:
+                    obj = self._objects[node] = self._factory(node)
+        return obj
+
+    def set_nodes(self, nodes):
+        nodes = set(nodes)
+        for node in nodes - set(self.ring.nodes):
+            self.ring.add(node)
+        removed = []
+        for node in set(self.ring.nodes) - nodes:
+            self.ring.remove(node)
+            with self._lock:
+                obj = self._objects.pop(node, None)
+            if obj is not None:
+                removed.append(obj)
+        return removed
+
+    def objects(self):
+        with self._lock:
+            return list(self._objects.values())
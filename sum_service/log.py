@@ -0,0 +1,153 @@
+"""
+Logging setup for the services: a background writer, structured output and
+sampled per-request events.
+
+Environment variables read by setup_logging():
+    LOG_LEVEL        root level (default INFO); per-request events are DEBUG
+    LOG_FORMAT       text (default) or json
+    LOG_SAMPLE       per-event sample rates, e.g. "request=0.01,stream=1"
+    LOG_RATE_LIMIT   per-event maximum records per second, e.g. "request=100"
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_setup_lock = threading.Lock()
+# event name -> (sample rate, max records per second)
+_event_config = {}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including the event name if any."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        event = getattr(record, 'event', None)
+        if event is not None:
+            entry['event'] = event
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats the message in the calling thread; we
+    # enqueue the record as-is so %-formatting happens on the listener thread.
+    def prepare(self, record):
+        return record
+
+def _parse_pairs(value):
+    pairs = {}
+    for item in value.split(','):
+        name, sep, number = item.partition('=')
+        if sep and name.strip():
+            pairs[name.strip()] = float(number)
+    return pairs
+
+def setup_logging(level=None, fmt=None):
+    """Route all logging through a queue to a background writer thread.
+
+    Safe to call more than once; only the first call configures logging.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+        level = level or os.getenv('LOG_LEVEL', 'INFO')
+        fmt = fmt or os.getenv('LOG_FORMAT', 'text')
+
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=False)
+
+        root = logging.getLogger()
+        for existing in root.handlers[:]:
+            root.removeHandler(existing)
+        root.addHandler(_DeferredQueueHandler(log_queue))
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+
+        rates = _parse_pairs(os.getenv('LOG_SAMPLE', ''))
+        limits = _parse_pairs(os.getenv('LOG_RATE_LIMIT', ''))
+        for event in set(rates) | set(limits):
+            configure_event(event, rates.get(event, 1.0), limits.get(event))
+
+        _listener.start()
+        atexit.register(_stop_listener)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_after_fork)
+        return _listener
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def _restart_after_fork():
+    # The writer thread does not survive fork(); give the child its own queue
+    # and writer so forked workers keep logging.
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, _DeferredQueueHandler):
+            handler.queue = log_queue
+    _listener.queue = log_queue
+    _listener._thread = None
+    _listener.start()
+
+def configure_event(event, sample_rate=1.0, max_per_second=None):
+    """Set the sample rate and rate limit of an event type."""
+    _event_config[event] = (sample_rate, max_per_second)
+    for event_logger in EventLogger._instances:
+        if event_logger.event == event:
+            event_logger._configure(sample_rate, max_per_second)
+
+class EventLogger:
+    """Logs one event type with a level, sample rate and per-second limit.
+
+    Calling it is cheap when the level is disabled: one isEnabledFor() check
+    and no formatting. Enabled events keep every n-th record (n = 1 / sample
+    rate) and at most max_per_second records per second.
+    """
+
+    _instances = []
+
+    def __init__(self, logger, event, level=logging.DEBUG):
+        self.logger = logger
+        self.event = event
+        self.level = level
+        self._extra = {'event': event}
+        self._configure(*_event_config.get(event, (1.0, None)))
+        EventLogger._instances.append(self)
+
+    def _configure(self, sample_rate, max_per_second):
+        self._every = max(1, round(1 / sample_rate)) if sample_rate > 0 else 0
+        self._counter = itertools.count()
+        self._max_per_second = max_per_second
+        self._window = 0
+        self._window_count = 0
+
+    def __call__(self, msg, *args):
+        if not self.logger.isEnabledFor(self.level) or not self._every:
+            return
+        if self._every > 1 and next(self._counter) % self._every:
+            return
+        if self._max_per_second is not None:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._window_count = window, 0
+            self._window_count += 1
+            if self._window_count > self._max_per_second:
+                return
+        self.logger.log(self.level, msg, *args, extra=self._extra)
@@ -0,0 +1,291 @@
+"""
+Prometheus text-format metrics with lock-light recording.
+
+Every thread records into its own shard, so incrementing a counter or
+observing a latency is a couple of list updates with no lock; the shards are
+only summed when the endpoint is scraped. Metrics belong to a Registry that
+the services create only when a metrics port is configured, so nothing is
+recorded otherwise.
+"""
+
+import bisect
+import threading
+import urllib.parse
+from concurrent import futures
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds, from 50us to 10s
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+class _Shards:
+    """Per-thread storage; a thread registers its shard once, then writes without locking."""
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+
+    def get(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = [0] * self._size
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def totals(self):
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(values) for values in zip(*shards)] if shards else [0] * self._size
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, v in pairs)
+    return '{' + ','.join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.get()[0] += amount
+
+    def dec(self, amount=1):
+        self._shards.get()[0] -= amount
+
+    def value(self):
+        return self._shards.totals()[0]
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # one slot per bucket plus +Inf, then sum and count
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value):
+        shard = self._shards.get()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    def totals(self):
+        """Return (cumulative bucket counts, sum, count)."""
+        totals = self._shards.totals()
+        cumulative, running = [], 0
+        for count in totals[:-2]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-2], totals[-1]
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Computes the value at scrape time: a number, or {label values: number}
+        self._function = function
+        self._children = {}
+        self._lock = threading.Lock()
+        self._default = None if self.labelnames else self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Return the child for these label values, creating it on first use."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self):
+        if self._function is not None:
+            value = self._function()
+            if isinstance(value, dict):
+                for values, v in value.items():
+                    yield self.name, _format_labels(self.labelnames, values), v
+            else:
+                yield self.name, '', value
+            return
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            yield self.name, _format_labels(self.labelnames, values), child.value()
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, labels, value in self._samples():
+            lines.append(f'{name}{labels} {_format_value(value)}')
+        return lines
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            cumulative, total, count = child.totals()
+            for bound, running in zip(self.buckets + (float('inf'),), cumulative):
+                labels = _format_labels(self.labelnames, values, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket', labels, running
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+class Registry:
+    """A set of metrics exposed together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), function=None):
+        return self._register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def exposition(self):
+        """Render every metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+class InstrumentedThreadPoolExecutor(futures.ThreadPoolExecutor):
+    """ThreadPoolExecutor that reports its queue depth and busy workers."""
+
+    def __init__(self, registry, max_workers=None, prefix='executor', **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self._busy = registry.gauge(f'{prefix}_busy_workers', "Worker threads running a task")
+        registry.gauge(f'{prefix}_queue_depth', "Tasks waiting for a worker thread",
+                       function=self._work_queue.qsize)
+        registry.gauge(f'{prefix}_max_workers', "Size of the worker thread pool",
+                       function=lambda: self._max_workers)
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(self._run, fn, args, kwargs)
+
+    def _run(self, fn, args, kwargs):
+        self._busy.inc()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._busy.dec()
+
+def _handler_class(registry, routes):
+    # http.server is imported here so that processes without a metrics
+    # endpoint never pay for it
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            if url.path == '/metrics':
+                self._send(200, registry.exposition(), CONTENT_TYPE)
+                return
+            route = routes.get(url.path)
+            if route is None:
+                self.send_error(404)
+                return
+            query = dict(urllib.parse.parse_qsl(url.query))
+            try:
+                self._send(200, route(query))
+            except ValueError as e:
+                self._send(400, f"{e}\n")
+            except RuntimeError as e:
+                self._send(409, f"{e}\n")
+
+        def _send(self, status, text, content_type='text/plain; charset=utf-8'):
+            body = text.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes are not worth a log line each
+            pass
+
+    return MetricsHandler
+
+def start_http_server(port, registry, addr='0.0.0.0', routes=None):
+    """Serve registry at http://addr:port/metrics from a daemon thread.
+
+    routes maps extra paths to functions taking the query parameters as a
+    dict and returning a text body. Returns the HTTPServer; call shutdown()
+    on it to stop serving.
+    """
+    from http.server import ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((addr, port), _handler_class(registry, dict(routes or {})))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
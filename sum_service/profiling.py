@@ -0,0 +1,235 @@
+"""
+On-demand CPU and memory profiling of a running service.
+
+Nothing here runs until a profile is requested, by signal or through the
+/debug endpoints of the metrics server:
+
+    SIGUSR1                           CPU profile for PROFILE_SECONDS (default 10)
+    SIGUSR2                           tracemalloc snapshot, diffed against the previous one;
+                                      tracing stops PROFILE_MEMORY_SECONDS (default 600)
+                                      after the last snapshot
+    /debug/profile/cpu?seconds=N      CPU profile, returned in the response
+    /debug/profile/memory             tracemalloc snapshot diff (?stop=1 stops tracing)
+
+Signal-triggered reports are written to PROFILE_DIR (default: the temp directory).
+The metrics server listens on every interface without authentication, so the
+/debug endpoints are only served when PROFILE_HTTP=1.
+"""
+
+import collections
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.005
+
+def _frame_name(frame):
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{os.path.basename(code.co_filename)}:{name}'
+
+class SamplingProfiler:
+    """Statistical CPU profiler that samples every thread's stack.
+
+    A background thread reads sys._current_frames() every interval seconds
+    and counts the stacks it sees, so the profiled threads run unmodified.
+    Stacks are kept in folded form ("outer;inner count") for flame graphs.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='cpu-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Stacks in the folded format read by flamegraph.pl and speedscope."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def report(self, limit=25):
+        """Functions ranked by samples spent in them (self) and under them (total)."""
+        own, total = collections.Counter(), collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        stack_count = sum(self.stacks.values()) or 1
+        lines = [f"{self.samples} samples of {stack_count} thread stacks every {self.interval * 1000:g} ms",
+                 '', f"{'self %':>7} {'total %':>7}  function"]
+        for name, count in own.most_common(limit):
+            lines.append(f"{100 * count / stack_count:7.1f} {100 * total[name] / stack_count:7.1f}  {name}")
+        return '\n'.join(lines) + '\n'
+
+def profile_cpu(seconds, interval=DEFAULT_INTERVAL):
+    """Sample every thread for seconds and return the profiler."""
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    try:
+        time.sleep(seconds)
+    finally:
+        profiler.stop()
+    return profiler
+
+class MemoryTracker:
+    """tracemalloc snapshots, each compared with the one before.
+
+    The first snapshot() starts tracing (which does slow allocations down)
+    and records a baseline; later calls report where memory grew since.
+    Tracing stops by itself idle_timeout seconds after the last snapshot,
+    so a forgotten trace does not slow the process down until it restarts.
+    """
+
+    def __init__(self, nframes=5, idle_timeout=600.0):
+        self.nframes = nframes
+        self.idle_timeout = idle_timeout
+        self._previous = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def _renew(self):
+        # Caller holds self._lock
+        if self._timer is not None:
+            self._timer.cancel()
+        timer = self._timer = threading.Timer(self.idle_timeout, lambda: self._expire(timer))
+        timer.daemon = True
+        timer.start()
+
+    def _expire(self, timer):
+        with self._lock:
+            # A snapshot may have renewed the trace just as this timer fired
+            if self._timer is not timer:
+                return
+            self._stop()
+        logger.info("tracemalloc stopped after %g idle seconds", self.idle_timeout)
+
+    def _stop(self):
+        # Caller holds self._lock
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        tracemalloc.stop()
+        self._previous = None
+
+    def snapshot(self, limit=25):
+        with self._lock:
+            self._renew()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.nframes)
+                self._previous = tracemalloc.take_snapshot()
+                return (f"tracemalloc started, until {self.idle_timeout:g} s without a snapshot; "
+                        f"the next snapshot reports growth since now\n")
+            current = tracemalloc.take_snapshot()
+            stats = current.compare_to(self._previous, 'traceback')
+            self._previous = current
+        size, peak = tracemalloc.get_traced_memory()
+        lines = [f"traced memory: {size / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)", '']
+        for stat in stats[:limit]:
+            lines.append(f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d} blocks), "
+                         f"{stat.size / 1024:.1f} KiB now")
+            lines.extend(f"    {line}" for line in stat.traceback.format())
+        return '\n'.join(lines) + '\n'
+
+    def stop(self):
+        with self._lock:
+            self._stop()
+        return "tracemalloc stopped\n"
+
+class Profiling:
+    """The profiling surface of one process: signals and /debug routes."""
+
+    def __init__(self, output_dir=None, seconds=None, http=None, memory_seconds=None):
+        self.output_dir = output_dir or os.getenv('PROFILE_DIR') or tempfile.gettempdir()
+        self.seconds = seconds or float(os.getenv('PROFILE_SECONDS', '10'))
+        self.http = os.getenv('PROFILE_HTTP') == '1' if http is None else http
+        self.memory = MemoryTracker(
+            idle_timeout=memory_seconds or float(os.getenv('PROFILE_MEMORY_SECONDS', '600')))
+        self._cpu_lock = threading.Lock()
+
+    def cpu(self, seconds):
+        """Run one CPU profile; concurrent requests are refused."""
+        if not self._cpu_lock.acquire(blocking=False):
+            raise RuntimeError("A CPU profile is already running")
+        try:
+            return profile_cpu(seconds)
+        finally:
+            self._cpu_lock.release()
+
+    def _write(self, kind, suffix, text):
+        path = os.path.join(self.output_dir, f'{kind}-{os.getpid()}-{time.strftime("%Y%m%d-%H%M%S")}{suffix}')
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def _cpu_to_file(self):
+        try:
+            profiler = self.cpu(self.seconds)
+        except RuntimeError as e:
+            logger.warning("%s", e)
+            return
+        report = self._write('cpu', '.txt', profiler.report())
+        folded = self._write('cpu', '.folded', profiler.folded())
+        logger.info("CPU profile written to %s and %s", report, folded)
+
+    def _memory_to_file(self):
+        path = self._write('memory', '.txt', self.memory.snapshot())
+        logger.info("Memory snapshot written to %s", path)
+
+    def install_signal_handlers(self):
+        """SIGUSR1 profiles the CPU, SIGUSR2 takes a memory snapshot.
+
+        The handlers only start a thread, so they are safe in threaded and
+        asyncio processes alike. Call from the main thread.
+        """
+        for signum, target in ((signal.SIGUSR1, self._cpu_to_file), (signal.SIGUSR2, self._memory_to_file)):
+            signal.signal(signum, lambda s, f, target=target: threading.Thread(
+                target=target, name='profiling', daemon=True).start())
+
+    def routes(self):
+        """Handlers for the /debug paths of the metrics server; none unless http is enabled."""
+        if not self.http:
+            return {}
+
+        def cpu(query):
+            seconds = min(float(query.get('seconds', self.seconds)), 300.0)
+            profiler = self.cpu(seconds)
+            if query.get('format') == 'folded':
+                return profiler.folded()
+            return profiler.report()
+
+        def memory(query):
+            if query.get('stop'):
+                return self.memory.stop()
+            return self.memory.snapshot()
+
+        return {'/debug/profile/cpu': cpu, '/debug/profile/memory': memory}
@@ -0,0 +1,63 @@
+"""
+Multi-process test harness: runs several sum_service.grpc.server processes locally.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import grpc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+class LocalCluster:
+    """Start n server processes on free ports; use as a context manager.
+
+    args_for(index, targets) returns extra command-line arguments for one
+    replica, e.g. its peers. restart(index) replaces one process with a
+    fresh one on the same port and arguments.
+    """
+
+    def __init__(self, n, args_for=None, startup_timeout=20):
+        self.targets = [f'localhost:{free_port()}' for _ in range(n)]
+        self.args_for = args_for or (lambda index, targets: [])
+        self.startup_timeout = startup_timeout
+        self.processes = []
+
+    def _start(self, index):
+        port = self.targets[index].rsplit(':', 1)[1]
+        command = [sys.executable, '-m', 'sum_service.grpc.server', '--port', port]
+        command += self.args_for(index, self.targets)
+        return subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def _wait_ready(self, targets):
+        for target in targets:
+            with grpc.insecure_channel(target) as channel:
+                grpc.channel_ready_future(channel).result(timeout=self.startup_timeout)
+
+    def __enter__(self):
+        self.processes = [self._start(index) for index in range(len(self.targets))]
+        try:
+            self._wait_ready(self.targets)
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def restart(self, index):
+        process = self.processes[index]
+        process.terminate()
+        process.wait()
+        self.processes[index] = self._start(index)
+        self._wait_ready([self.targets[index]])
+
+    def __exit__(self, *exc_info):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
@@ -1,57 +1,82 @@
-import os
-import sys
 import pytest
+import pytest_asyncio
 import grpc
 from concurrent import futures
 from grpc_health.v1 import health_pb2_grpc
 from grpc_health.v1 import health_pb2
 from grpc_reflection.v1alpha import reflection
 
-# Add the proto directory to Python path
-proto_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'grpc', 'proto')
-sys.path.append(proto_dir)
-
-def ensure_proto_files():
-    """Ensure proto files are generated"""
-    try:
-        import grpc_tools.protoc
-    except ImportError:
-        print("Installing required packages...")
-        import subprocess
-        subprocess.run([sys.executable, "-m", "pip", "install", "grpcio-tools"])
-        import grpc_tools.protoc
-
-    # Generate proto files
-    import subprocess
-    subprocess.run([
-        sys.executable, '-m', 'grpc_tools.protoc',
-        f'--proto_path={proto_dir}',
-        f'--python_out={proto_dir}',
-        f'--grpc_python_out={proto_dir}',
-        os.path.join(proto_dir, 'sum.proto')
-    ])
-
-# Generate proto files first
-ensure_proto_files()
-
-# Now import the generated files
-from sum_pb2 import SumRequest, SumResponse
-from sum_pb2_grpc import SumServiceStub, SumServiceServicer
-from sum_service.grpc.server import SumServicer, HealthServicer
+from sum_service.grpc.proto.sum_pb2 import SumRequest, SumResponse
+from sum_service.grpc.proto.sum_pb2_grpc import SumServiceStub, SumServiceServicer
+from sum_service.grpc.server import SumServicer, HealthServicer, create_server
+from sum_service.grpc.watch import add_sum_service
 
 @pytest.fixture(scope="session")
 def grpc_server():
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    SumServiceServicer.add_SumServiceServicer_to_server(SumServicer(), server)
+    add_sum_service(SumServicer(), server)
     health_pb2_grpc.add_HealthServicer_to_server(HealthServicer(), server)
-    port = server.add_insecure_port('[::]:0')
+    port = server.add_insecure_port('localhost:0')
     server.start()
     yield server, port
     server.stop(0)
 
 @pytest.fixture(scope="session")
-def grpc_channel():
-    """Create a gRPC channel for testing"""
-    channel = grpc.insecure_channel('localhost:50051')
+def grpc_channel(grpc_server):
+    """Create a gRPC channel to the session's server on its ephemeral port"""
+    _, port = grpc_server
+    channel = grpc.insecure_channel(f'localhost:{port}')
     yield channel
-    channel.close() 
\ No newline at end of file
+    channel.close()
+
+@pytest.fixture
+def start_server():
+    """Start a built thread-pool server on a free localhost port and return its target.
+
+    Every server started this way is stopped when the test ends.
+    """
+    servers = []
+
+    def start(server):
+        port = server.add_insecure_port('localhost:0')
+        server.start()
+        servers.append(server)
+        return f'localhost:{port}'
+
+    yield start
+    for server in servers:
+        server.stop(0)
+
+@pytest.fixture
+def connect(start_server):
+    """Start a server like start_server and return a channel to it, closed when the test ends."""
+    channels = []
+
+    def connect(server):
+        channel = grpc.insecure_channel(start_server(server))
+        channels.append(channel)
+        return channel
+
+    yield connect
+    for channel in channels:
+        channel.close()
+
+@pytest.fixture
+def sum_stub(connect):
+    """SumService stub for a fresh create_server()."""
+    return SumServiceStub(connect(create_server()))
+
+@pytest_asyncio.fixture
+async def start_aio_server():
+    """start_server for grpc.aio servers."""
+    servers = []
+
+    async def start(server):
+        port = server.add_insecure_port('localhost:0')
+        await server.start()
+        servers.append(server)
+        return f'localhost:{port}'
+
+    yield start
+    for server in servers:
+        await server.stop(0)
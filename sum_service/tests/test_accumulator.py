@@ -0,0 +1,97 @@
+"""
+Tests for the keyed accumulator store and key resolution in SumServicer.
+"""
+
+import threading
+import pytest
+import grpc
+from sum_service.grpc.proto import sum_pb2
+from sum_service.grpc.accumulator import AccumulatorStore, DEFAULT_KEY
+from sum_service.grpc.server import SumServicer
+
+def test_keys_are_independent():
+    store = AccumulatorStore()
+    assert store.add('a', 5) == 5
+    assert store.add('b', 2) == 2
+    assert store.add('a', 3) == 8
+    assert store.get('b') == 2
+    assert store.get('missing') == 0
+    assert len(store) == 2
+
+def test_reset():
+    store = AccumulatorStore(stripes=1)
+    store.add('a', 5)
+    assert store.reset('a') == 0
+    assert store.get('a') == 0
+    assert store.snapshot() == {}
+
+def test_invalid_stripes():
+    with pytest.raises(ValueError):
+        AccumulatorStore(stripes=0)
+
+def test_concurrent_updates_are_not_lost():
+    store = AccumulatorStore(stripes=4)
+    keys = [f'k{i}' for i in range(8)]
+
+    def worker():
+        for _ in range(2000):
+            for key in keys:
+                store.add(key, 1)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.snapshot() == {key: 16000 for key in keys}
+
+def test_key_from_request_field(sum_stub):
+    assert sum_stub.CalculateSum(sum_pb2.SumRequest(number=5, key='a')).result == 5
+    assert sum_stub.CalculateSum(sum_pb2.SumRequest(number=3, key='b')).result == 3
+    assert sum_stub.CalculateSum(sum_pb2.SumRequest(number=1, key='a')).result == 6
+
+def test_key_from_metadata(sum_stub):
+    metadata = (('x-sum-key', 'tenant-1'),)
+    assert sum_stub.CalculateSum(sum_pb2.SumRequest(number=4), metadata=metadata).result == 4
+    assert sum_stub.CalculateSum(sum_pb2.SumRequest(number=4)).result == 4
+    assert sum_stub.CalculateSum(sum_pb2.SumRequest(number=4), metadata=metadata).result == 8
+
+def test_default_key_running_sum():
+    servicer = SumServicer()
+    servicer.store.add(DEFAULT_KEY, 7)
+    assert servicer.running_sum == 7
+
+def test_add_many():
+    store = AccumulatorStore()
+    store.add('a', 10)
+    assert store.add_many('a', [1, 2, 3]) == (16, None)
+    assert store.add_many('a', [1, -2, 3], running_sums=True) == (18, [17, 15, 18])
+    assert store.add_many('a', [], running_sums=True) == (18, [])
+    assert store.get('a') == 18
+
+def test_sums_past_int64_are_refused_unchanged():
+    store = AccumulatorStore()
+    big = 2 ** 62
+    store.add('a', big)
+    with pytest.raises(OverflowError):
+        store.add('a', big)
+    with pytest.raises(OverflowError):
+        store.add_many('a', [big, -big], running_sums=True)
+    # Only the final sum is sent without running sums
+    assert store.add_many('a', [big, -big]) == (big, None)
+    assert store.get('a') == big
+
+def test_overflow_is_out_of_range(sum_stub):
+    big = 2 ** 62
+    sum_stub.CalculateSumBatch(sum_pb2.SumBatchRequest(numbers=[big, big - 1], key='big'))
+    with pytest.raises(grpc.RpcError) as excinfo:
+        sum_stub.CalculateSum(sum_pb2.SumRequest(number=1, key='big'))
+    assert excinfo.value.code() == grpc.StatusCode.OUT_OF_RANGE
+    # The key is still usable
+    assert sum_stub.CalculateSum(sum_pb2.SumRequest(number=-1, key='big')).result == 2 ** 63 - 2
+
+def test_get_sum(sum_stub):
+    sum_stub.CalculateSum(sum_pb2.SumRequest(number=9, key='read'))
+    assert sum_stub.GetSum(sum_pb2.GetSumRequest(key='read')).result == 9
+    assert sum_stub.GetSum(sum_pb2.GetSumRequest(key='read', merged=True)).result == 9
+    assert sum_stub.GetSum(sum_pb2.GetSumRequest(key='unknown')).result == 0
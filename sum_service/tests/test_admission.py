@@ -0,0 +1,173 @@
+"""
+Tests for adaptive admission control.
+"""
+
+import queue
+import threading
+from concurrent import futures
+
+import grpc
+import pytest
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+from sum_service.grpc import aio_server
+from sum_service.grpc.admission import AdaptiveLimiter, AdmissionInterceptor
+from sum_service.grpc.server import HealthServicer, SumServicer, create_server
+from sum_service.grpc.watch import add_sum_service
+from sum_service.metrics import Registry
+
+class BlockingServicer(SumServicer):
+    """CalculateSum waits until released, so RPCs pile up in flight."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def CalculateSum(self, request, context):
+        self.entered.release()
+        self.release.wait(5)
+        return super().CalculateSum(request, context)
+
+@pytest.fixture
+def blocking_server(connect):
+    limiter = AdaptiveLimiter(initial_limit=2, min_limit=1, max_limit=2, overload_hold=5)
+    servicer = BlockingServicer()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8),
+                         interceptors=[AdmissionInterceptor(limiter)])
+    add_sum_service(servicer, server)
+    health_pb2_grpc.add_HealthServicer_to_server(HealthServicer(limiter), server)
+    yield servicer, limiter, connect(server)
+    servicer.release.set()
+
+def test_limit_grows_under_target_and_backs_off_over_it():
+    limiter = AdaptiveLimiter(initial_limit=4, min_limit=2, max_limit=5, latency_target=0.01)
+    for _ in range(40):
+        assert all(limiter.try_acquire() for _ in range(4))
+        for _ in range(4):
+            limiter.release(0.001)
+    assert limiter.limit == 5
+
+    limiter.try_acquire()
+    limiter.release(1.0)
+    assert limiter.limit == pytest.approx(4.5)
+    # A second slow completion straight away is the same burst
+    limiter.try_acquire()
+    limiter.release(1.0)
+    assert limiter.limit == pytest.approx(4.5)
+    assert limiter.in_flight == 0
+
+def test_limit_does_not_grow_while_underused():
+    limiter = AdaptiveLimiter(initial_limit=10, max_limit=20)
+    for _ in range(100):
+        limiter.try_acquire()
+        limiter.release(0.001)
+    assert limiter.limit == 10
+
+def test_rejects_over_limit_and_reports_overload():
+    limiter = AdaptiveLimiter(initial_limit=2, min_limit=1, max_limit=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.overloaded()
+    assert not limiter.try_acquire()
+    assert limiter.rejected == 1
+    assert limiter.overloaded()
+
+    registry = Registry()
+    limiter.register_metrics(registry)
+    text = registry.exposition()
+    assert 'grpc_server_concurrency_limit 2' in text
+    assert 'grpc_server_rejected_total 1' in text
+
+def test_excess_rpcs_get_resource_exhausted(blocking_server):
+    servicer, limiter, channel = blocking_server
+    stub = sum_pb2_grpc.SumServiceStub(channel)
+    health = health_pb2_grpc.HealthStub(channel)
+    assert health.Check(health_pb2.HealthCheckRequest()).status == health_pb2.HealthCheckResponse.SERVING
+
+    pending = [stub.CalculateSum.future(sum_pb2.SumRequest(number=1)) for _ in range(2)]
+    for _ in pending:
+        assert servicer.entered.acquire(timeout=5)
+
+    with pytest.raises(grpc.RpcError) as exc_info:
+        stub.CalculateSum(sum_pb2.SumRequest(number=1), timeout=5)
+    assert exc_info.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    # Health checks are exempt from the limit, and report the overload
+    assert health.Check(health_pb2.HealthCheckRequest()).status == health_pb2.HealthCheckResponse.NOT_SERVING
+
+    servicer.release.set()
+    assert sorted(f.result(timeout=5).result for f in pending) == [1, 2]
+    assert limiter.in_flight == 0
+
+def test_rpcs_rejected_by_max_concurrent_rpcs_release_no_slot(connect):
+    limiter = AdaptiveLimiter()
+    stub = sum_pb2_grpc.SumServiceStub(connect(create_server(limiter=limiter, max_concurrent_rpcs=1)))
+    numbers = queue.Queue()
+    try:
+        # An open stream holds the server's only concurrent RPC
+        numbers.put(sum_pb2.SumRequest(number=1))
+        responses = stub.StreamSum(iter(numbers.get, None), timeout=5)
+        assert next(responses).result == 1
+        for _ in range(3):
+            with pytest.raises(grpc.RpcError) as exc_info:
+                stub.CalculateSum(sum_pb2.SumRequest(number=1), timeout=5)
+            assert exc_info.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        assert limiter.in_flight == 0
+        numbers.put(None)
+        assert list(responses) == []
+        assert stub.CalculateSum(sum_pb2.SumRequest(number=1), timeout=5).result == 2
+        assert limiter.in_flight == 0
+    finally:
+        numbers.put(None)
+
+def test_watch_streams_status_changes(connect):
+    health = HealthServicer(watch_interval=0.05)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    health_pb2_grpc.add_HealthServicer_to_server(health, server)
+    responses = health_pb2_grpc.HealthStub(connect(server)).Watch(health_pb2.HealthCheckRequest(), timeout=5)
+    assert next(responses).status == health_pb2.HealthCheckResponse.SERVING
+    health.set_serving(False)
+    assert next(responses).status == health_pb2.HealthCheckResponse.NOT_SERVING
+    responses.cancel()
+
+def test_create_server_wires_limiter_and_metrics(connect):
+    registry = Registry()
+    server = create_server(registry=registry, limiter=AdaptiveLimiter(), max_concurrent_rpcs=50)
+    stub = sum_pb2_grpc.SumServiceStub(connect(server))
+    assert stub.CalculateSum(sum_pb2.SumRequest(number=3), timeout=5).result == 3
+    assert 'grpc_server_concurrency_limit 20' in registry.exposition()
+
+def test_open_streams_do_not_lock_out_unary_rpcs(connect):
+    limiter = AdaptiveLimiter(initial_limit=2, min_limit=1, max_limit=2)
+    channel = connect(create_server(limiter=limiter))
+    stub = sum_pb2_grpc.SumServiceStub(channel)
+    producers = [queue.Queue() for _ in range(3)]
+    try:
+        streams = [stub.StreamSum(iter(numbers.get, None), timeout=5) for numbers in producers]
+        for numbers, responses in zip(producers, streams):
+            numbers.put(sum_pb2.SumRequest(number=1, key='stream'))
+            next(responses)
+        # More idle streams than the limit are open, and unary RPCs still get in
+        assert stub.CalculateSum(sum_pb2.SumRequest(number=1), timeout=5).result == 1
+        health = health_pb2_grpc.HealthStub(channel)
+        assert health.Check(health_pb2.HealthCheckRequest()).status == health_pb2.HealthCheckResponse.SERVING
+        assert limiter.rejected == 0
+    finally:
+        for numbers in producers:
+            numbers.put(None)
+
+@pytest.mark.asyncio
+async def test_aio_open_streams_do_not_lock_out_unary_rpcs(start_aio_server):
+    limiter = AdaptiveLimiter()
+    target = await start_aio_server(aio_server.create_server(limiter=limiter))
+    async with grpc.aio.insecure_channel(target) as channel:
+        stub = sum_pb2_grpc.SumServiceStub(channel)
+        streams = [stub.StreamSum() for _ in range(int(limiter.limit) + 5)]
+        for stream in streams:
+            await stream.write(sum_pb2.SumRequest(number=1, key='stream'))
+            await stream.read()
+        assert (await stub.CalculateSum(sum_pb2.SumRequest(number=1), timeout=5)).result == 1
+        health = health_pb2_grpc.HealthStub(channel)
+        assert (await health.Check(health_pb2.HealthCheckRequest())).status == health_pb2.HealthCheckResponse.SERVING
+        assert limiter.rejected == 0
+        for stream in streams:
+            await stream.done_writing()
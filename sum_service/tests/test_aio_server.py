@@ -0,0 +1,64 @@
+"""
+Tests for the grpc.aio server mode.
+"""
+
+import pytest
+import pytest_asyncio
+import grpc
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from grpc_health.v1 import health_pb2
+from grpc_health.v1 import health_pb2_grpc
+from sum_service.grpc.aio_server import create_server
+from sum_service.grpc.server import main
+
+@pytest_asyncio.fixture
+async def aio_channel(start_aio_server):
+    channel = grpc.aio.insecure_channel(await start_aio_server(create_server()))
+    yield channel
+    await channel.close()
+
+@pytest.mark.asyncio
+async def test_calculate_sum(aio_channel):
+    stub = sum_pb2_grpc.SumServiceStub(aio_channel)
+    assert (await stub.CalculateSum(sum_pb2.SumRequest(number=5))).result == 5
+    assert (await stub.CalculateSum(sum_pb2.SumRequest(number=3))).result == 8
+    assert (await stub.CalculateSum(sum_pb2.SumRequest(number=3, key='other'))).result == 3
+
+@pytest.mark.asyncio
+async def test_stream_sum(aio_channel):
+    stub = sum_pb2_grpc.SumServiceStub(aio_channel)
+    requests = [sum_pb2.SumRequest(number=n) for n in [1, 2, 3]]
+    results = [response.result async for response in stub.StreamSum(iter(requests))]
+    assert results == [1, 3, 6]
+
+@pytest.mark.asyncio
+async def test_batch(aio_channel):
+    stub = sum_pb2_grpc.SumServiceStub(aio_channel)
+    request = sum_pb2.SumBatchRequest(numbers=[1, 2, 3], include_running_sums=True)
+    response = await stub.CalculateSumBatch(request)
+    assert response.result == 6
+    assert list(response.running_sums) == [1, 3, 6]
+
+@pytest.mark.asyncio
+async def test_overflow_is_out_of_range(aio_channel):
+    stub = sum_pb2_grpc.SumServiceStub(aio_channel)
+    await stub.CalculateSumBatch(sum_pb2.SumBatchRequest(numbers=[2 ** 62]))
+    with pytest.raises(grpc.aio.AioRpcError) as excinfo:
+        await stub.CalculateSumBatch(sum_pb2.SumBatchRequest(numbers=[2 ** 62]))
+    assert excinfo.value.code() == grpc.StatusCode.OUT_OF_RANGE
+    assert (await stub.GetSum(sum_pb2.GetSumRequest())).result == 2 ** 62
+
+@pytest.mark.asyncio
+async def test_health_check(aio_channel):
+    health_stub = health_pb2_grpc.HealthStub(aio_channel)
+    response = await health_stub.Check(health_pb2.HealthCheckRequest())
+    assert response.status == health_pb2.HealthCheckResponse.SERVING
+
+def test_mode_selection(monkeypatch):
+    calls = []
+    monkeypatch.setattr('sum_service.grpc.aio_server.run', lambda port, store=None, **options: calls.append(('aio', port)))
+    monkeypatch.setattr('sum_service.grpc.server.serve', lambda port, store=None, **options: calls.append(('sync', port)))
+    monkeypatch.setenv('GRPC_SERVER_MODE', 'aio')
+    main(['--port', '6000'])
+    main(['--mode', 'sync'])
+    assert calls == [('aio', 6000), ('sync', 50051)]
@@ -0,0 +1,158 @@
+"""
+Tests for per-connection send queues and slow-consumer policies.
+"""
+
+import asyncio
+import json
+import pytest
+import websockets
+from sum_service.websocket.backpressure import (
+    COALESCE_LATEST, DISCONNECT, DROP_OLDEST, PAUSE, BackpressureSettings, OutboundQueue)
+from sum_service.websocket.pipeline import Pipeline
+
+class SlowClient:
+    """A send() that blocks until the test lets messages through."""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.closed = False
+
+    async def send(self, payload):
+        await self.gate.wait()
+        self.sent.append(payload)
+
+    async def close(self):
+        self.closed = True
+
+def make_queue(client, policy, high=10, low=4):
+    return OutboundQueue(client.send, client.close, policy, high_watermark=high, low_watermark=low)
+
+@pytest.mark.asyncio
+async def test_drop_oldest_keeps_queue_under_watermark():
+    client = SlowClient()
+    queue = make_queue(client, DROP_OLDEST)
+    await queue.put('aaa')
+    await asyncio.sleep(0)
+    for payload in ['bbb', 'ccc', 'ddd', 'eee']:
+        await queue.put(payload)
+    # 'aaa' is already with the writer; the queue holds at most 10 bytes
+    assert queue.queued_bytes <= 10
+    assert queue.stats.dropped == 1
+    client.gate.set()
+    await asyncio.sleep(0.01)
+    assert client.sent == ['aaa', 'ccc', 'ddd', 'eee']
+    queue.close()
+
+@pytest.mark.asyncio
+async def test_coalesce_latest_replaces_queued_reply_for_key():
+    client = SlowClient()
+    queue = make_queue(client, COALESCE_LATEST, high=6, low=0)
+    await queue.put('a=1', key='a')
+    await asyncio.sleep(0)
+    for payload, key in [('a=2', 'a'), ('b=1', 'b'), ('a=3', 'a'), ('a=4', 'a')]:
+        await queue.put(payload, key=key)
+    assert queue.stats.coalesced == 2
+    assert queue.stats.dropped == 0
+    client.gate.set()
+    await asyncio.sleep(0.01)
+    assert client.sent == ['a=1', 'b=1', 'a=4']
+    queue.close()
+
+@pytest.mark.asyncio
+async def test_coalescing_stays_bounded():
+    client = SlowClient()
+    queue = make_queue(client, COALESCE_LATEST, high=100, low=10)
+    for i in range(10000):
+        await queue.put(f'{i:05}', key='same')
+    assert len(queue._entries) < 50
+    queue.close()
+
+@pytest.mark.asyncio
+async def test_pause_waits_for_low_watermark():
+    client = SlowClient()
+    queue = make_queue(client, PAUSE)
+    await queue.put('aaa')
+    await asyncio.sleep(0)
+    for payload in ['bbb', 'ccc', 'ddd']:
+        await queue.put(payload)
+    blocked = asyncio.ensure_future(queue.put('eee'))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    client.gate.set()
+    await asyncio.wait_for(blocked, 1)
+    await asyncio.sleep(0.01)
+    assert client.sent == ['aaa', 'bbb', 'ccc', 'ddd', 'eee']
+    assert queue.stats.pauses == 1 and queue.stats.dropped == 0
+    queue.close()
+
+@pytest.mark.asyncio
+async def test_pause_stops_the_pipeline_reading():
+    client = SlowClient()
+    queue = make_queue(client, PAUSE, high=3, low=0)
+    pipeline = Pipeline(queue.put, max_in_flight=1)
+
+    async def reply(n):
+        return f'{n:03}'
+
+    submitted = 0
+
+    async def reader():
+        nonlocal submitted
+        for n in range(100):
+            await pipeline.submit(reply(n))
+            submitted += 1
+
+    task = asyncio.ensure_future(reader())
+    await asyncio.sleep(0.05)
+    # One reply is being written, one is queued and one waits on the watermark
+    assert submitted <= 3
+    client.gate.set()
+    await asyncio.wait_for(task, 1)
+    await asyncio.sleep(0.01)
+    assert len(client.sent) == 100
+    pipeline.close()
+    queue.close()
+
+@pytest.mark.asyncio
+async def test_disconnect_closes_slow_client():
+    client = SlowClient()
+    queue = make_queue(client, DISCONNECT)
+    for payload in ['aaa', 'bbb', 'ccc', 'ddd', 'eee']:
+        await queue.put(payload)
+    await asyncio.sleep(0)
+    assert client.closed
+    assert queue.closed and queue.queued_bytes == 0
+    await queue.put('fff')
+    assert client.sent == []
+
+def test_settings_validation(monkeypatch):
+    with pytest.raises(ValueError):
+        BackpressureSettings(policy='block')
+    with pytest.raises(ValueError):
+        BackpressureSettings(high_watermark=10, low_watermark=20)
+    monkeypatch.setenv('WS_SLOW_CONSUMER_POLICY', DROP_OLDEST)
+    monkeypatch.setenv('WS_SEND_HIGH_WATERMARK', '4096')
+    settings = BackpressureSettings()
+    assert settings.policy == DROP_OLDEST and settings.low_watermark == 1024
+    assert settings.serve_options()['write_limit'] == 4096
+
+@pytest.mark.asyncio
+async def test_echo_server_with_disconnect_policy():
+    settings = BackpressureSettings(policy=DISCONNECT, high_watermark=64, low_watermark=0)
+
+    async def handler(websocket):
+        queue = settings.queue(websocket)
+        async for message in websocket:
+            for _ in range(100):
+                await queue.put(json.dumps({'echo': message}))
+        queue.close()
+
+    async with websockets.serve(handler, 'localhost', 0, **settings.serve_options()) as server:
+        port = server.sockets[0].getsockname()[1]
+        async with websockets.connect(f'ws://localhost:{port}') as websocket:
+            await websocket.send('x' * 20)
+            with pytest.raises(websockets.exceptions.ConnectionClosed) as exc_info:
+                while True:
+                    await asyncio.wait_for(websocket.recv(), 2)
+            assert exc_info.value.rcvd.code == 1008
@@ -0,0 +1,31 @@
+"""
+Tests for the CalculateSumBatch RPC.
+"""
+
+from sum_service.grpc.proto import sum_pb2
+
+def test_batch_final_sum(sum_stub):
+    response = sum_stub.CalculateSumBatch(sum_pb2.SumBatchRequest(numbers=[1, 2, 3, 4, 5]))
+    assert response.result == 15
+    assert list(response.running_sums) == []
+
+def test_batch_running_sums(sum_stub):
+    sum_stub.CalculateSum(sum_pb2.SumRequest(number=10, key='batch'))
+    request = sum_pb2.SumBatchRequest(numbers=[1, -2, 3], key='batch', include_running_sums=True)
+    response = sum_stub.CalculateSumBatch(request)
+    assert response.result == 12
+    assert list(response.running_sums) == [11, 9, 12]
+    # The batch is visible to later unary calls on the same key
+    assert sum_stub.CalculateSum(sum_pb2.SumRequest(number=0, key='batch')).result == 12
+
+def test_batch_large(sum_stub):
+    numbers = list(range(100000))
+    request = sum_pb2.SumBatchRequest(numbers=numbers, key='large', include_running_sums=True)
+    response = sum_stub.CalculateSumBatch(request)
+    assert response.result == sum(numbers)
+    assert response.running_sums[-1] == sum(numbers)
+    assert len(response.running_sums) == len(numbers)
+
+def test_empty_batch(sum_stub):
+    request = sum_pb2.SumBatchRequest(include_running_sums=True)
+    assert sum_stub.CalculateSumBatch(request).result == 0
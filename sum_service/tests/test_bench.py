@@ -0,0 +1,80 @@
+"""
+Tests for the load-generation harness.
+"""
+
+import asyncio
+import grpc
+import pytest
+import pytest_asyncio
+from sum_service.grpc.proto import sum_pb2
+from sum_service.bench.recorder import LatencyRecorder
+from sum_service.bench.runner import run_closed_loop, run_open_loop
+from sum_service.bench.transports import (
+    BenchError, GrpcTransport, decode_grpc_web_response, encode_grpc_web_request)
+from sum_service.grpc.aio_server import AsyncSumServicer
+from sum_service.grpc.watch import add_sum_service
+
+@pytest_asyncio.fixture
+async def grpc_target(start_aio_server):
+    server = grpc.aio.server()
+    add_sum_service(AsyncSumServicer(), server)
+    return await start_aio_server(server)
+
+class StalledClient:
+    """Answers every call after a fixed delay, one call at a time."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = asyncio.Lock()
+
+    async def call(self, number):
+        async with self.lock:
+            await asyncio.sleep(self.delay)
+        return number
+
+def test_percentiles_are_nearest_rank():
+    recorder = LatencyRecorder()
+    for ms in range(1, 1001):
+        recorder.record(ms / 1000)
+    summary = recorder.summary(1.0)
+    assert summary['requests'] == 1000
+    assert summary['throughput_rps'] == 1000
+    assert summary['latency_ms']['p50'] == pytest.approx(500)
+    assert summary['latency_ms']['p99'] == pytest.approx(990)
+    assert summary['latency_ms']['p999'] == pytest.approx(999)
+    assert summary['latency_ms']['max'] == pytest.approx(1000)
+
+def test_grpc_web_framing():
+    frame = encode_grpc_web_request(sum_pb2.SumRequest(number=7))
+    assert frame[0] == 0 and int.from_bytes(frame[1:5], 'big') == len(frame) - 5
+
+    message = sum_pb2.SumResponse(result=42).SerializeToString()
+    trailers = b'grpc-status:0\r\ngrpc-message:\r\n'
+    payload = (b'\x00' + len(message).to_bytes(4, 'big') + message
+               + b'\x80' + len(trailers).to_bytes(4, 'big') + trailers)
+    assert sum_pb2.SumResponse.FromString(decode_grpc_web_response(payload, {})).result == 42
+
+    with pytest.raises(BenchError):
+        decode_grpc_web_response(b'', {'grpc-status': '14'})
+
+@pytest.mark.asyncio
+async def test_closed_loop_against_grpc(grpc_target):
+    transport = GrpcTransport(grpc_target, connections=2)
+    await transport.open()
+    try:
+        clients = [await transport.client(i) for i in range(4)]
+        summary = await run_closed_loop(clients, duration=0.3)
+    finally:
+        await transport.close()
+    assert summary['requests'] > 0
+    assert summary['errors'] == 0
+    assert summary['latency_ms']['p50'] > 0
+
+@pytest.mark.asyncio
+async def test_open_loop_counts_queueing_delay():
+    # One client serving 50ms calls cannot keep up with 100 requests per second,
+    # so later requests wait and their latency must include that wait
+    summary = await run_open_loop([StalledClient(0.05)], rate=100, duration=0.2)
+    assert summary['requests'] == 20
+    assert summary['latency_ms']['max'] > 500
+    assert summary['latency_ms']['p50'] > 50
@@ -0,0 +1,156 @@
+"""
+Tests for WebSocket subscriptions and the broadcaster behind them.
+"""
+
+import asyncio
+import json
+
+import grpc
+import pytest
+import pytest_asyncio
+import websockets
+from sum_service.grpc.aio_server import AsyncSumServicer
+from sum_service.grpc.server import create_server
+from sum_service.grpc.watch import add_sum_service
+from sum_service.metrics import Registry
+from sum_service.websocket import broadcast
+from sum_service.websocket.broadcast import CATCH_UP_INTERVAL, Broadcaster, Channel
+from sum_service.websocket.server import WebSocketProxy
+
+@pytest_asyncio.fixture
+async def proxy(start_aio_server):
+    servicer = AsyncSumServicer(watch_interval=0.01)
+    server = grpc.aio.server()
+    add_sum_service(servicer, server)
+    target = await start_aio_server(server)
+    registry = Registry()
+    proxy = WebSocketProxy(upstreams=[target], pool_size=1, max_subscriptions=2, registry=registry)
+    async with websockets.serve(proxy.handle_websocket, 'localhost', 0) as ws_server:
+        proxy.url = f'ws://localhost:{ws_server.sockets[0].getsockname()[1]}'
+        proxy.hub = servicer.watch_hub
+        proxy.registry = registry
+        yield proxy
+    await proxy.close()
+
+async def request(websocket, payload):
+    await websocket.send(json.dumps(payload))
+    while True:
+        reply = json.loads(await websocket.recv())
+        if 'channel' not in reply:
+            return reply
+
+async def next_update(websocket, total):
+    # Updates may be coalesced, so wait for the one carrying total
+    while True:
+        update = json.loads(await asyncio.wait_for(websocket.recv(), timeout=5))
+        if update.get('sum') == total:
+            return update
+
+@pytest.mark.asyncio
+async def test_subscribers_share_one_upstream_stream(proxy):
+    async with websockets.connect(proxy.url) as first, websockets.connect(proxy.url) as second, \
+            websockets.connect(proxy.url) as writer:
+        for websocket in (first, second):
+            assert await request(websocket, {'subscribe': 'room', 'id': 1}) == {'id': 1, 'subscribed': 'room'}
+        for websocket in (first, second):
+            assert (await next_update(websocket, 0))['channel'] == 'room'
+
+        for number in (1, 2, 3):
+            await request(writer, {'number': number, 'key': 'room'})
+        for websocket in (first, second):
+            assert (await next_update(websocket, 6))['channel'] == 'room'
+        assert proxy.broadcaster.channels == 1
+        assert proxy.hub.watchers == 1
+
+        assert await request(first, {'unsubscribe': 'room'}) == {'unsubscribed': 'room'}
+        assert proxy.broadcaster.channels == 1
+    # The last subscriber disconnected, so the upstream stream is closed
+    for _ in range(100):
+        if proxy.hub.watchers == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert proxy.broadcaster.channels == 0
+    assert proxy.hub.watchers == 0
+    exposition = proxy.registry.exposition()
+    assert 'ws_subscriptions_open 0' in exposition
+    assert 'ws_broadcast_messages_total' in exposition
+
+@pytest.mark.asyncio
+async def test_subscription_errors(proxy):
+    async with websockets.connect(proxy.url) as websocket:
+        assert 'error' in await request(websocket, {'subscribe': 5})
+        assert (await request(websocket, {'subscribe': 'a'}))['subscribed'] == 'a'
+        assert (await request(websocket, {'subscribe': 'b'}))['subscribed'] == 'b'
+        # Subscribing again is a no-op; a third key is over max_subscriptions
+        assert (await request(websocket, {'subscribe': 'a'}))['subscribed'] == 'a'
+        assert 'error' in await request(websocket, {'subscribe': 'c'})
+
+@pytest.mark.asyncio
+async def test_empty_key_subscribes_to_the_default_key(proxy):
+    async with websockets.connect(proxy.url) as websocket:
+        assert (await request(websocket, {'subscribe': ''}))['subscribed'] == 'default'
+        assert (await request(websocket, {'subscribe': 'default'}))['subscribed'] == 'default'
+        assert (await next_update(websocket, 0))['channel'] == 'default'
+        assert proxy.broadcaster.channels == 1
+
+@pytest.mark.asyncio
+async def test_subscribers_hear_when_a_sync_server_refuses_the_stream(start_server):
+    target = start_server(create_server(watch_interval=0.01, max_watchers=1))
+    proxy = WebSocketProxy(upstreams=[target], pool_size=1)
+    try:
+        async with websockets.serve(proxy.handle_websocket, 'localhost', 0) as ws_server:
+            url = f'ws://localhost:{ws_server.sockets[0].getsockname()[1]}'
+            async with websockets.connect(url) as websocket:
+                await request(websocket, {'subscribe': 'a'})
+                assert (await next_update(websocket, 0))['channel'] == 'a'
+                await request(websocket, {'subscribe': 'b'})
+                while True:
+                    frame = json.loads(await asyncio.wait_for(websocket.recv(), timeout=5))
+                    if 'error' in frame:
+                        break
+                assert frame['channel'] == 'b'
+                assert frame['code'] == 'RESOURCE_EXHAUSTED'
+                # Once the server has a free watcher, the retry brings updates
+                await request(websocket, {'unsubscribe': 'a'})
+                while True:
+                    frame = json.loads(await asyncio.wait_for(websocket.recv(), timeout=5))
+                    if frame.get('channel') == 'b' and 'sum' in frame:
+                        break
+    finally:
+        await proxy.close()
+
+class FakeTransport:
+    def __init__(self):
+        self.buffered = 0
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+class FakeWebSocket:
+    def __init__(self):
+        self.transport = FakeTransport()
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_skips_to_latest(monkeypatch):
+    sent = []
+    monkeypatch.setattr(broadcast.websockets, 'broadcast',
+                        lambda targets, message: sent.extend((target, message) for target in targets))
+    broadcaster = Broadcaster(pool=None, max_buffered=100)
+    fast, slow = FakeWebSocket(), FakeWebSocket()
+    channel = Channel('k')
+    channel.subscribers.update((fast, slow))
+    slow.transport.buffered = 101
+
+    for version in (1, 2, 3):
+        channel.latest = f'update {version}'
+        assert broadcaster._deliver(channel, channel.subscribers) == 1
+    assert [message for target, message in sent if target is fast] == ['update 1', 'update 2', 'update 3']
+    assert not [message for target, message in sent if target is slow]
+    assert channel.behind == {slow}
+
+    # Once its socket drains, the slow subscriber gets only the latest update
+    slow.transport.buffered = 0
+    await asyncio.sleep(CATCH_UP_INTERVAL * 3)
+    assert [message for target, message in sent if target is slow] == ['update 3']
+    assert not channel.behind
+    assert channel.catch_up is None
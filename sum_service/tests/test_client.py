@@ -0,0 +1,151 @@
+"""
+Tests for the client SDK.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+import pytest_asyncio
+import websockets
+from sum_service.client.aio import AsyncSumClient
+from sum_service.client.batching import Batcher
+from sum_service.client.retry import RetryPolicy
+from sum_service.client.sync import SumClient
+from sum_service.client.websocket import WebSocketClient
+from sum_service.grpc import aio_server
+from sum_service.grpc.dedup import DedupCache
+from sum_service.grpc.server import SumServicer, create_server
+from sum_service.grpc.watch import add_sum_service
+from sum_service.websocket.server import WebSocketProxy
+
+class LostReplyServicer(SumServicer):
+    """Applies the first attempt of each request, then fails it as if the reply was lost."""
+
+    def __init__(self):
+        super().__init__(dedup=DedupCache())
+        self.seen = set()
+
+    def CalculateSum(self, request, context):
+        response = super().CalculateSum(request, context)
+        if request.request_id not in self.seen:
+            self.seen.add(request.request_id)
+            context.abort(grpc.StatusCode.UNAVAILABLE, "reply lost")
+        return response
+
+class SlowServicer(SumServicer):
+    def CalculateSum(self, request, context):
+        time.sleep(0.5)
+        return super().CalculateSum(request, context)
+
+def servicer_server(servicer):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_sum_service(servicer, server)
+    return server
+
+@pytest.fixture
+def target(start_server):
+    return start_server(create_server(dedup=DedupCache()))
+
+def test_sync_calls(target):
+    with SumClient(target, pool_size=2) as client:
+        assert client.add(5, key='k') == 5
+        assert client.add_many([1, 2], key='k') == (8, [])
+        assert client.add_many([1], key='k', running_sums=True) == (9, [9])
+        assert client.get(key='k') == 9
+        updates = client.watch(key='k')
+        assert next(updates).result == 9
+        updates.cancel()
+
+def test_submit_batches_numbers_from_many_threads(target):
+    client = SumClient(target, batch_window=0.005)
+    results = []
+
+    def produce():
+        results.extend(future.result(5) for future in [client.submit(1, key='b') for _ in range(100)])
+
+    threads = [threading.Thread(target=produce) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    client.close()
+    # Every caller got a distinct running sum, as if its number came alone
+    assert sorted(results) == list(range(1, 801))
+    assert client.batcher.requests == 800
+    assert client.batcher.batches < 800
+
+def test_retry_of_an_applied_request_is_not_counted_twice(start_server):
+    address = start_server(servicer_server(LostReplyServicer()))
+    with SumClient(address, retry=RetryPolicy(initial_backoff=0.001)) as client:
+        assert client.add(5) == 5
+        assert client.add(5) == 10
+
+def test_deadline_covers_every_attempt(start_server):
+    address = start_server(servicer_server(SlowServicer()))
+    with SumClient(address, timeout=0.1) as client:
+        started = time.monotonic()
+        with pytest.raises(grpc.RpcError) as excinfo:
+            client.add(1)
+        assert excinfo.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+        assert time.monotonic() - started < 0.4
+
+def test_backoff_is_bounded():
+    policy = RetryPolicy(initial_backoff=0.1, max_backoff=0.3, multiplier=2)
+    assert all(0 <= policy.backoff(0) <= 0.1 for _ in range(100))
+    assert all(0 <= policy.backoff(5) <= 0.3 for _ in range(100))
+    with pytest.raises(ValueError):
+        RetryPolicy(attempts=0)
+
+def test_batcher_fails_every_number_of_a_failed_batch():
+    def send_batch(key, numbers):
+        raise RuntimeError("upstream down")
+
+    batcher = Batcher(send_batch, window=0.001)
+    pending = [batcher.submit(n) for n in range(3)]
+    batcher.close()
+    for future in pending:
+        with pytest.raises(RuntimeError):
+            future.result(1)
+    with pytest.raises(RuntimeError):
+        batcher.submit(1)
+    with pytest.raises(TypeError):
+        Batcher(send_batch).submit(1.5)
+
+@pytest_asyncio.fixture
+async def aio_target(start_aio_server):
+    return await start_aio_server(aio_server.create_server(dedup=DedupCache()))
+
+@pytest.mark.asyncio
+async def test_async_calls(aio_target):
+    async with AsyncSumClient(aio_target, pool_size=2) as client:
+        assert await client.add(5, key='k') == 5
+        assert await client.add_many([1, 2], key='k', running_sums=True) == (8, [6, 8])
+        results = await asyncio.gather(*(client.submit(1, key='k') for _ in range(50)))
+        assert sorted(results) == list(range(9, 59))
+        assert client.batcher.batches < 50
+        assert await client.get(key='k') == 58
+        updates = client.watch(key='k')
+        assert (await updates.read()).result == 58
+        updates.cancel()
+
+@pytest.mark.asyncio
+async def test_websocket_client_pipelines_requests(aio_target):
+    host, port = aio_target.split(':')
+    proxy = WebSocketProxy(grpc_host=host, grpc_port=port, pool_size=2, max_in_flight=16)
+    try:
+        async with websockets.serve(proxy.handle_websocket, 'localhost', 0) as ws_server:
+            url = f'ws://localhost:{ws_server.sockets[0].getsockname()[1]}'
+            async with WebSocketClient(url, max_in_flight=16) as client:
+                results = await asyncio.gather(*(client.add(1, key='ws') for _ in range(50)))
+                assert sorted(results) == list(range(1, 51))
+                with pytest.raises(RuntimeError):
+                    await client.add(2 ** 40, key='ws')
+                # The client reconnects after the connection is lost
+                await client._connection[0].close()
+                assert await client.add(1, key='ws') == 51
+    finally:
+        await proxy.close()
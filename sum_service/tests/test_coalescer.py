@@ -0,0 +1,78 @@
+"""
+Tests for cross-client request coalescing in the WebSocket proxy.
+"""
+
+import asyncio
+import json
+import pytest
+import pytest_asyncio
+import websockets
+from sum_service.grpc.aio_server import create_server
+from sum_service.websocket.channel_pool import ChannelPool
+from sum_service.websocket.coalescer import Coalescer
+from sum_service.websocket.server import WebSocketProxy
+
+@pytest_asyncio.fixture
+async def upstream(start_aio_server):
+    pool = ChannelPool(await start_aio_server(create_server()), size=1)
+    yield pool
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_coalesced_sums_match_unary(upstream):
+    coalescer = Coalescer(upstream, window=0.01, max_batch=1000)
+    results = await asyncio.gather(*(coalescer.calculate_sum(n, 'k') for n in range(1, 101)))
+    # Same as 100 consecutive unary calls
+    assert results == [n * (n + 1) // 2 for n in range(1, 101)]
+    assert coalescer.stats() == {'batches': 1, 'requests': 100, 'histogram': {128: 1}}
+
+@pytest.mark.asyncio
+async def test_max_batch_flushes_early(upstream):
+    coalescer = Coalescer(upstream, window=10, max_batch=4)
+    results = await asyncio.wait_for(
+        asyncio.gather(*(coalescer.calculate_sum(1, 'k') for _ in range(8))), timeout=2)
+    # The two batches are in flight concurrently and may apply in either order
+    assert sorted(results) == list(range(1, 9))
+    assert coalescer.stats()['histogram'] == {4: 2}
+
+@pytest.mark.asyncio
+async def test_keys_are_batched_separately(upstream):
+    coalescer = Coalescer(upstream, window=0.01)
+    results = await asyncio.gather(
+        coalescer.calculate_sum(1, 'a'), coalescer.calculate_sum(2, 'b'), coalescer.calculate_sum(3, 'a'))
+    assert results == [1, 2, 4]
+    assert coalescer.stats()['batches'] == 2
+
+@pytest.mark.asyncio
+async def test_invalid_numbers_are_rejected_before_batching(upstream):
+    coalescer = Coalescer(upstream)
+    with pytest.raises(TypeError):
+        await coalescer.calculate_sum('5')
+    with pytest.raises(ValueError):
+        await coalescer.calculate_sum(2 ** 40)
+
+@pytest.mark.asyncio
+async def test_proxy_coalesces_across_clients(upstream):
+    proxy = WebSocketProxy(grpc_host='unused', grpc_port=0, coalesce=True)
+    proxy.pool = proxy.coalescer.pool = upstream
+
+    async def client(number):
+        async with websockets.connect(url) as websocket:
+            await websocket.send(json.dumps({'number': number, 'key': 'shared'}))
+            return json.loads(await websocket.recv())['sum']
+
+    async with websockets.serve(proxy.handle_websocket, 'localhost', 0) as ws_server:
+        url = f"ws://localhost:{ws_server.sockets[0].getsockname()[1]}"
+        sums = await asyncio.gather(*(client(1) for _ in range(20)))
+    assert sorted(sums) == list(range(1, 21))
+    assert proxy.coalescer.stats()['requests'] == 20
+
+@pytest.mark.asyncio
+async def test_proxy_close_sends_pending_requests(upstream):
+    proxy = WebSocketProxy(grpc_host='unused', grpc_port=0, coalesce=True)
+    proxy.pool = proxy.coalescer.pool = upstream
+    proxy.coalescer.window = 10
+    pending = asyncio.ensure_future(proxy.coalescer.calculate_sum(3, 'k'))
+    await asyncio.sleep(0)
+    await proxy.close()
+    assert await asyncio.wait_for(pending, timeout=1) == 3
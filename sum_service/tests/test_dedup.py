@@ -0,0 +1,137 @@
+"""
+Tests for request_id deduplication.
+"""
+
+import threading
+import time
+
+import pytest
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from sum_service.grpc.accumulator import AccumulatorStore
+from sum_service.grpc.dedup import DedupCache, add_batch, add_number
+from sum_service.grpc.server import create_server
+from sum_service.metrics import Registry
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_duplicates_return_the_original_result():
+    store = AccumulatorStore()
+    dedup = DedupCache()
+    first = sum_pb2.SumRequest(number=5, request_id='a')
+    assert add_number(store, dedup, 'k', first) == 5
+    assert add_number(store, dedup, 'k', sum_pb2.SumRequest(number=1)) == 6
+    assert add_number(store, dedup, 'k', first) == 5
+    assert store.get('k') == 6
+    assert dedup.hits == 1
+    # The same ID on another key is a different request
+    assert add_number(store, dedup, 'other', first) == 5
+    # Without a cache every request is applied
+    assert add_number(store, None, 'k', first) == 11
+
+def test_batch_ids_are_kept_apart_from_single_number_ids():
+    store = AccumulatorStore()
+    dedup = DedupCache()
+    batch = sum_pb2.SumBatchRequest(numbers=[1, 2], include_running_sums=True, request_id='a')
+    assert add_batch(store, dedup, 'k', batch) == (3, [1, 3])
+    assert add_batch(store, dedup, 'k', batch) == (3, [1, 3])
+    assert add_number(store, dedup, 'k', sum_pb2.SumRequest(number=4, request_id='a')) == 7
+    assert store.get('k') == 7
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    dedup = DedupCache(ttl=10, clock=clock)
+    assert dedup.run('k', 'a', lambda: 1) == 1
+    clock.now = 9
+    assert dedup.run('k', 'a', lambda: 2) == 1
+    clock.now = 10
+    assert dedup.run('k', 'a', lambda: 3) == 3
+    assert len(dedup) == 1
+
+def test_oldest_entries_are_evicted_beyond_max_entries():
+    dedup = DedupCache(max_entries=2)
+    for request_id in 'abc':
+        dedup.run('k', request_id, lambda: request_id)
+    assert len(dedup) == 2
+    assert dedup.run('k', 'a', lambda: 'again') == 'again'
+    assert dedup.run('k', 'c', lambda: 'again') == 'c'
+
+def test_running_entries_are_not_evicted():
+    dedup = DedupCache(max_entries=1)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_add():
+        calls.append('a')
+        started.set()
+        release.wait(5)
+        return 1
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(dedup.run('k', 'a', slow_add)))
+    first.start()
+    started.wait(5)
+    # The cache is full of a running entry: 'b' is applied but not remembered
+    assert dedup.run('k', 'b', lambda: 2) == 2
+    assert len(dedup) == 1
+    duplicate = threading.Thread(target=lambda: results.append(dedup.run('k', 'a', slow_add)))
+    duplicate.start()
+    release.set()
+    for thread in (first, duplicate):
+        thread.join(5)
+    assert results == [1, 1]
+    assert calls == ['a']
+    # Once 'a' has finished, it can make room for a new ID
+    assert dedup.run('k', 'c', lambda: 3) == 3
+    assert dedup.run('k', 'c', lambda: 4) == 3
+
+def test_failed_attempt_is_forgotten():
+    dedup = DedupCache()
+
+    def fail():
+        raise RuntimeError("store unavailable")
+
+    with pytest.raises(RuntimeError):
+        dedup.run('k', 'a', fail)
+    assert dedup.run('k', 'a', lambda: 7) == 7
+
+def test_concurrent_duplicates_wait_for_the_first_attempt():
+    dedup = DedupCache()
+    started = threading.Event()
+    calls = []
+
+    def slow_add():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return 42
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(dedup.run('k', 'a', slow_add)))
+    first.start()
+    started.wait(5)
+    duplicates = [threading.Thread(target=lambda: results.append(dedup.run('k', 'a', slow_add)))
+                  for _ in range(4)]
+    for thread in duplicates:
+        thread.start()
+    for thread in [first] + duplicates:
+        thread.join(5)
+    assert results == [42] * 5
+    assert len(calls) == 1
+
+def test_server_adds_a_retried_number_once(connect):
+    registry = Registry()
+    stub = sum_pb2_grpc.SumServiceStub(connect(create_server(registry=registry, dedup=DedupCache())))
+    request = sum_pb2.SumRequest(number=3, request_id='retry-me')
+    assert stub.CalculateSum(request).result == 3
+    assert stub.CalculateSum(request).result == 3
+    responses = stub.StreamSum(iter([request, sum_pb2.SumRequest(number=1)]))
+    assert [response.result for response in responses] == [3, 4]
+    exposition = registry.exposition()
+    assert 'grpc_server_dedup_hits_total 2' in exposition
+    assert 'grpc_server_dedup_entries 1' in exposition
@@ -6,8 +6,7 @@ import pytest
 import grpc
 from concurrent import futures
 import time
-import sum_pb2
-import sum_pb2_grpc
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
 from grpc_health.v1 import health_pb2
 from grpc_health.v1 import health_pb2_grpc
 from sum_service.grpc.server import SumServicer, HealthServicer
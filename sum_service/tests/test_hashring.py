@@ -0,0 +1,120 @@
+"""
+Tests for consistent hashing and key-affine routing across server replicas.
+"""
+
+import json
+import pytest
+import pytest_asyncio
+import websockets
+from sum_service.hashring import HashRing, ShardRouter
+from sum_service.tests.cluster import LocalCluster
+from sum_service.websocket.server import WebSocketProxy
+
+KEYS = [f'key-{i}' for i in range(2000)]
+
+def test_keys_spread_over_nodes():
+    ring = HashRing(['a', 'b', 'c'])
+    counts = {}
+    for key in KEYS:
+        node = ring.get(key)
+        counts[node] = counts.get(node, 0) + 1
+    assert set(counts) == {'a', 'b', 'c'}
+    assert min(counts.values()) > len(KEYS) / 3 * 0.7
+
+def test_adding_a_node_moves_few_keys():
+    ring = HashRing(['a', 'b', 'c'])
+    before = {key: ring.get(key) for key in KEYS}
+    ring.add('d')
+    after = {key: ring.get(key) for key in KEYS}
+    moved = [key for key in KEYS if before[key] != after[key]]
+    # Only keys taken over by the new node move
+    assert all(after[key] == 'd' for key in moved)
+    assert len(moved) < len(KEYS) / 4 * 1.3
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(['a', 'b', 'c'])
+    before = {key: ring.get(key) for key in KEYS}
+    ring.remove('b')
+    for key in KEYS:
+        if before[key] != 'b':
+            assert ring.get(key) == before[key]
+        else:
+            assert ring.get(key) in ('a', 'c')
+
+def test_empty_ring():
+    with pytest.raises(LookupError):
+        HashRing().get('key')
+
+def test_router_reuses_and_returns_removed_objects():
+    created = []
+    router = ShardRouter(['a', 'b'], lambda node: created.append(node) or f'obj-{node}')
+    objects = {router.get(key) for key in KEYS[:100]}
+    assert objects == {'obj-a', 'obj-b'}
+    assert sorted(created) == ['a', 'b']
+    assert router.set_nodes(['a', 'c']) == ['obj-b']
+    assert {router.get(key) for key in KEYS[:100]} == {'obj-a', 'obj-c'}
+
+@pytest.fixture
+def replicas():
+    with LocalCluster(3) as cluster:
+        yield cluster.targets
+
+@pytest_asyncio.fixture
+async def sharded_proxy(replicas):
+    proxy = WebSocketProxy(upstreams=replicas, pool_size=1)
+    async with websockets.serve(proxy.handle_websocket, 'localhost', 0) as ws_server:
+        yield proxy, f"ws://localhost:{ws_server.sockets[0].getsockname()[1]}"
+    await proxy.close()
+
+@pytest.mark.asyncio
+async def test_keys_stay_on_one_replica(sharded_proxy):
+    proxy, url = sharded_proxy
+    keys = [f'client-{i}' for i in range(12)]
+    assert len({proxy.pool.target_for(key) for key in keys}) > 1
+    async with websockets.connect(url) as websocket:
+        for expected in range(1, 4):
+            for key in keys:
+                await websocket.send(json.dumps({'number': 1, 'key': key}))
+                assert json.loads(await websocket.recv())['sum'] == expected
+
+@pytest.mark.asyncio
+async def test_empty_key_routes_with_the_default_key(sharded_proxy):
+    proxy, url = sharded_proxy
+    assert proxy.pool.target_for('') == proxy.pool.target_for('default')
+    async with websockets.connect(url) as websocket:
+        await websocket.send(json.dumps({'number': 1}))
+        assert json.loads(await websocket.recv())['sum'] == 1
+        await websocket.send(json.dumps({'number': 1, 'key': 'default'}))
+        assert json.loads(await websocket.recv())['sum'] == 2
+
+@pytest.mark.asyncio
+async def test_membership_change(sharded_proxy):
+    proxy, url = sharded_proxy
+    keys = [f'client-{i}' for i in range(30)]
+    before = {key: proxy.pool.target_for(key) for key in keys}
+    removed = proxy.pool.targets[0]
+    await proxy.pool.set_targets(proxy.pool.targets[1:])
+    for key in keys:
+        if before[key] != removed:
+            assert proxy.pool.target_for(key) == before[key]
+    async with websockets.connect(url) as websocket:
+        await websocket.send(json.dumps({'number': 1, 'key': keys[0]}))
+        assert 'sum' in json.loads(await websocket.recv())
+
+@pytest.mark.asyncio
+async def test_upstreams_file_can_scale_out_from_one_replica(tmp_path, replicas):
+    upstreams_file = tmp_path / 'upstreams'
+    upstreams_file.write_text(replicas[0] + '\n')
+    proxy = WebSocketProxy(upstreams_file=str(upstreams_file), pool_size=1)
+    try:
+        assert proxy.pool.sharded
+        assert proxy.pool.targets == [replicas[0]]
+        upstreams_file.write_text('\n'.join(replicas) + '\n')
+        await proxy.reload_upstreams()
+        assert proxy.pool.targets == sorted(replicas)
+        # An emptied file leaves the replicas in place
+        upstreams_file.write_text('')
+        await proxy.reload_upstreams()
+        assert proxy.pool.targets == sorted(replicas)
+    finally:
+        await proxy.close()
@@ -0,0 +1,114 @@
+"""
+Tests for hedged upstream calls.
+"""
+
+import asyncio
+import json
+
+import grpc
+import pytest
+import websockets
+from sum_service.grpc.proto import sum_pb2
+from sum_service.grpc.aio_server import AsyncSumServicer
+from sum_service.grpc.dedup import DedupCache
+from sum_service.grpc.watch import add_sum_service
+from sum_service.websocket.hedging import Hedger, LatencyTracker
+from sum_service.websocket.server import WebSocketProxy
+
+class FakeStub:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def CalculateSum(self, request):
+        attempt = len(self.pool.requests)
+        self.pool.requests.append(request.request_id)
+        delay, error = self.pool.behaviour[attempt]
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return sum_pb2.SumResponse(result=attempt)
+
+class FakePool:
+    """Attempt n sleeps behaviour[n][0] seconds, then fails with behaviour[n][1] or returns n."""
+
+    def __init__(self, *behaviour):
+        self.behaviour = behaviour
+        self.requests = []
+
+    def stub(self, key=None):
+        return FakeStub(self)
+
+def unavailable():
+    return grpc.aio.AioRpcError(grpc.StatusCode.UNAVAILABLE, grpc.aio.Metadata(), grpc.aio.Metadata())
+
+def test_tracker_reports_the_percentile():
+    tracker = LatencyTracker(percentile=95, refresh=100, initial=1.0)
+    for latency in range(99):
+        tracker.record(latency / 1000)
+    assert tracker.value == 1.0
+    tracker.record(0.099)
+    assert tracker.value == pytest.approx(0.095)
+
+@pytest.mark.asyncio
+async def test_fast_call_is_not_hedged():
+    pool = FakePool((0, None))
+    hedger = Hedger(pool, initial_delay=0.05)
+    assert (await hedger.calculate_sum(sum_pb2.SumRequest(number=1))).result == 0
+    assert len(pool.requests) == 1
+    assert hedger.hedged == 0
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_with_the_same_request_id():
+    pool = FakePool((1.0, None), (0, None))
+    hedger = Hedger(pool, initial_delay=0.01)
+    response = await asyncio.wait_for(hedger.calculate_sum(sum_pb2.SumRequest(number=1)), timeout=0.5)
+    assert response.result == 1
+    assert (hedger.hedged, hedger.backup_wins) == (1, 1)
+    assert len(set(pool.requests)) == 1 and pool.requests[0]
+
+@pytest.mark.asyncio
+async def test_failed_backup_falls_back_to_the_first_attempt():
+    pool = FakePool((0.05, None), (0, unavailable()))
+    hedger = Hedger(pool, initial_delay=0.01)
+    assert (await hedger.calculate_sum(sum_pb2.SumRequest(number=1, request_id='x'))).result == 0
+    assert pool.requests == ['x', 'x']
+    assert hedger.backup_wins == 0
+
+@pytest.mark.asyncio
+async def test_error_is_raised_when_every_attempt_fails():
+    pool = FakePool((0.02, unavailable()), (0, unavailable()))
+    hedger = Hedger(pool, initial_delay=0.01)
+    with pytest.raises(grpc.aio.AioRpcError):
+        await hedger.calculate_sum(sum_pb2.SumRequest(number=1))
+
+class FirstAttemptSlowServicer(AsyncSumServicer):
+    """Holds the first attempt of each request_id, as a stalled connection would."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seen = set()
+
+    async def CalculateSum(self, request, context):
+        if request.request_id not in self.seen:
+            self.seen.add(request.request_id)
+            await asyncio.sleep(1.0)
+        return await super().CalculateSum(request, context)
+
+@pytest.mark.asyncio
+async def test_proxy_hedges_without_double_counting(start_aio_server):
+    servicer = FirstAttemptSlowServicer(dedup=DedupCache())
+    server = grpc.aio.server()
+    add_sum_service(servicer, server)
+    proxy = WebSocketProxy(upstreams=[await start_aio_server(server)], pool_size=2, hedge=True)
+    proxy.hedger.latencies.value = 0.02
+    try:
+        async with websockets.serve(proxy.handle_websocket, 'localhost', 0) as ws_server:
+            url = f'ws://localhost:{ws_server.sockets[0].getsockname()[1]}'
+            async with websockets.connect(url) as websocket:
+                for expected in (5, 10):
+                    await websocket.send(json.dumps({'number': 5, 'key': 'h'}))
+                    reply = json.loads(await asyncio.wait_for(websocket.recv(), timeout=0.5))
+                    assert reply['sum'] == expected
+        assert proxy.hedger.backup_wins == 2
+    finally:
+        await proxy.close()
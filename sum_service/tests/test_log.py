@@ -0,0 +1,65 @@
+"""
+Tests for sampled event logging and the structured formatter.
+"""
+
+import json
+import logging
+import queue
+from sum_service.log import EventLogger, JsonFormatter, configure_event, _DeferredQueueHandler
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def make_logger(name, level=logging.DEBUG):
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.propagate = False
+    handler = ListHandler()
+    logger.handlers = [handler]
+    return logger, handler
+
+def test_disabled_level_logs_nothing():
+    logger, handler = make_logger('test_log.disabled', logging.INFO)
+    log = EventLogger(logger, 'disabled-event')
+    for i in range(10):
+        log("number %d", i)
+    assert handler.records == []
+
+def test_sample_rate_keeps_every_nth_record():
+    logger, handler = make_logger('test_log.sampled')
+    log = EventLogger(logger, 'sampled-event')
+    configure_event('sampled-event', sample_rate=0.1)
+    for i in range(100):
+        log("number %d", i)
+    assert len(handler.records) == 10
+    assert all(record.event == 'sampled-event' for record in handler.records)
+
+def test_rate_limit_caps_records_per_second():
+    logger, handler = make_logger('test_log.limited')
+    log = EventLogger(logger, 'limited-event')
+    configure_event('limited-event', max_per_second=5)
+    for i in range(50):
+        log("number %d", i)
+    # The loop may straddle a second boundary
+    assert 5 <= len(handler.records) <= 10
+
+def test_queue_handler_defers_formatting():
+    log_queue = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(log_queue)
+    record = logging.LogRecord('x', logging.INFO, __file__, 1, "sum %d", (42,), None)
+    handler.emit(record)
+    queued = log_queue.get_nowait()
+    assert queued.msg == "sum %d" and queued.args == (42,)
+
+def test_json_formatter_includes_event():
+    record = logging.LogRecord('x', logging.DEBUG, __file__, 1, "sum %d", (7,), None)
+    record.event = 'request'
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == "sum 7"
+    assert entry['event'] == 'request'
+    assert entry['level'] == 'DEBUG'
@@ -0,0 +1,90 @@
+"""
+Tests for the metrics registry, the metrics endpoint and gRPC server instrumentation.
+"""
+
+import threading
+import urllib.request
+import pytest
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from sum_service.grpc.server import DEFAULT_MAX_WATCHERS, SERVER_THREADS, create_server
+from sum_service.metrics import Registry, start_http_server
+
+def sample(registry, line_prefix):
+    for line in registry.exposition().splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+@pytest.fixture
+def instrumented(connect):
+    registry = Registry()
+    return registry, sum_pb2_grpc.SumServiceStub(connect(create_server(registry=registry)))
+
+def test_counters_sum_over_threads():
+    registry = Registry()
+    counter = registry.counter('things_total', "Things", ('kind',))
+
+    def work():
+        for _ in range(1000):
+            counter.labels('a').inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sample(registry, 'things_total{kind="a"}') == 4000
+
+def test_histogram_exposition():
+    registry = Registry()
+    histogram = registry.histogram('latency_seconds', "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert sample(registry, 'latency_seconds_bucket{le="0.1"}') == 2
+    assert sample(registry, 'latency_seconds_bucket{le="1.0"}') == 3
+    assert sample(registry, 'latency_seconds_bucket{le="+Inf"}') == 4
+    assert sample(registry, 'latency_seconds_count') == 4
+    assert sample(registry, 'latency_seconds_sum') == pytest.approx(2.65)
+
+def test_function_gauge():
+    registry = Registry()
+    registry.gauge('depth', "Depth", function=lambda: 7)
+    registry.gauge('by_kind', "By kind", ('kind',), function=lambda: {('a',): 1, ('b',): 2})
+    assert sample(registry, 'depth') == 7
+    assert sample(registry, 'by_kind{kind="b"}') == 2
+
+def test_duplicate_names_are_rejected():
+    registry = Registry()
+    registry.counter('things_total', "Things")
+    with pytest.raises(ValueError):
+        registry.gauge('things_total', "Things")
+
+def test_http_endpoint():
+    registry = Registry()
+    registry.counter('things_total', "Things").inc(3)
+    server = start_http_server(0, registry, addr='127.0.0.1')
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        with urllib.request.urlopen(url) as response:
+            body = response.read().decode()
+            assert response.headers['Content-Type'].startswith('text/plain')
+        assert '# TYPE things_total counter' in body
+        assert 'things_total 3' in body
+    finally:
+        server.shutdown()
+
+def test_rpcs_are_counted(instrumented):
+    registry, stub = instrumented
+    for number in (1, 2, 3):
+        stub.CalculateSum(sum_pb2.SumRequest(number=number))
+    responses = list(stub.StreamSum(iter([sum_pb2.SumRequest(number=1)] * 5)))
+    assert len(responses) == 5
+
+    labels = 'grpc_service="sum.SumService",grpc_method="CalculateSum"'
+    assert sample(registry, f'grpc_server_handled_total{{{labels},grpc_code="OK"}}') == 3
+    assert sample(registry, f'grpc_server_handling_seconds_count{{{labels}}}') == 3
+    stream = 'grpc_service="sum.SumService",grpc_method="StreamSum",grpc_code="OK"'
+    assert sample(registry, f'grpc_server_handled_total{{{stream}}}') == 1
+    assert sample(registry, 'grpc_server_in_flight') == 0
+    assert sample(registry, 'grpc_server_executor_max_workers') == SERVER_THREADS + DEFAULT_MAX_WATCHERS
+    assert sample(registry, 'grpc_server_executor_queue_depth') == 0
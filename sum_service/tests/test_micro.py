@@ -0,0 +1,39 @@
+"""
+Tests for the micro-benchmark suite.
+"""
+
+import json
+from sum_service.bench import micro
+
+def test_every_benchmark_runs():
+    results = micro.run_all(min_time=0.001, repeats=1)
+    assert set(results) == {benchmark.name for benchmark in micro.BENCHMARKS}
+    for result in results.values():
+        assert result['ops_per_sec'] > 0
+        assert result['alloc_peak_bytes_per_op'] >= 0
+
+def test_compare_flags_slowdowns_and_allocation_growth():
+    baseline = {
+        'fast': {'ops_per_sec': 1000, 'alloc_peak_bytes_per_op': 1000, 'retained_blocks_per_op': 0},
+        'lean': {'ops_per_sec': 1000, 'alloc_peak_bytes_per_op': 1000, 'retained_blocks_per_op': 0},
+    }
+    results = {
+        'fast': {'ops_per_sec': 800, 'alloc_peak_bytes_per_op': 1000, 'retained_blocks_per_op': 0},
+        'lean': {'ops_per_sec': 950, 'alloc_peak_bytes_per_op': 2000, 'retained_blocks_per_op': 0},
+        'new': {'ops_per_sec': 1, 'alloc_peak_bytes_per_op': 1, 'retained_blocks_per_op': 0},
+    }
+    regressions = micro.compare(results, baseline, threshold=0.1)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('fast:') and 'ops/s' in regressions[0]
+    assert regressions[1].startswith('lean:') and 'bytes/op' in regressions[1]
+
+def test_cli_saves_and_checks_baseline(tmp_path):
+    path = tmp_path / 'baseline.json'
+    args = ['proto.serialize', '--min-time', '0.001', '--repeats', '1']
+    assert micro.main(args + ['--save-baseline', str(path)]) == 0
+    saved = json.loads(path.read_text())
+    assert list(saved) == ['proto.serialize_request']
+
+    saved['proto.serialize_request']['ops_per_sec'] *= 1000
+    path.write_text(json.dumps(saved))
+    assert micro.main(args + ['--baseline', str(path)]) == 1
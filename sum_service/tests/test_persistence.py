@@ -0,0 +1,103 @@
+"""
+Tests for the write-ahead log, snapshots and recovery.
+"""
+
+import os
+import threading
+import grpc
+import pytest
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from sum_service.grpc.persistence import MAX_KEY_BYTES, Persistence, decode_records, encode_record, open_store
+from sum_service.grpc.server import create_server, main
+
+def test_record_roundtrip():
+    data = encode_record('a', 5) + encode_record('ключ', -2 ** 70)
+    assert list(decode_records(data)) == [('a', 5), ('ключ', -2 ** 70)]
+
+def test_torn_tail_is_ignored():
+    data = encode_record('a', 5) + encode_record('b', 6)
+    assert list(decode_records(data[:-2])) == [('a', 5)]
+
+@pytest.mark.parametrize('policy', ['always', 'interval', 'none'])
+def test_recover_after_close(tmp_path, policy):
+    store, persistence = open_store(str(tmp_path), policy)
+    store.add('a', 5)
+    store.add('b', 1)
+    store.add_many('a', [1, 2], running_sums=True)
+    store.reset('b')
+    persistence.close()
+
+    store, persistence = open_store(str(tmp_path), policy)
+    assert store.snapshot() == {'a': 8}
+    persistence.close()
+
+def test_always_policy_is_durable_without_close(tmp_path):
+    store, persistence = open_store(str(tmp_path), 'always')
+    store.add('a', 5)
+    # Simulate a crash: a fresh instance reads what reached the log
+    recovered = Persistence(str(tmp_path)).recover()
+    assert recovered == {'a': 5}
+    persistence.close()
+
+def test_group_commit_with_concurrent_writers(tmp_path):
+    store, persistence = open_store(str(tmp_path), 'always')
+
+    def worker(key):
+        for _ in range(200):
+            store.add(key, 1)
+
+    threads = [threading.Thread(target=worker, args=(f'k{i}',)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    persistence.close()
+
+    store, persistence = open_store(str(tmp_path), 'always')
+    assert store.snapshot() == {f'k{i}': 200 for i in range(8)}
+    persistence.close()
+
+def test_snapshot_compacts_log(tmp_path):
+    store, persistence = open_store(str(tmp_path), 'interval')
+    for i in range(100):
+        store.add('a', i)
+    persistence.snapshot()
+    store.add('a', 1)
+    store.add('c', 3)
+    persistence.close()
+
+    names = sorted(os.listdir(tmp_path))
+    assert [name for name in names if name.startswith('snapshot-')] == ['snapshot-000000000002.bin']
+    assert all(name >= 'wal-000000000002.log' for name in names if name.startswith('wal-'))
+
+    store, persistence = open_store(str(tmp_path), 'interval')
+    assert store.snapshot() == {'a': 4951, 'c': 3}
+    persistence.close()
+
+def test_key_the_log_cannot_hold_changes_nothing(tmp_path, connect):
+    store, persistence = open_store(str(tmp_path), 'interval')
+    long_key = 'x' * (MAX_KEY_BYTES + 1)
+    store.add('k', 5)
+    with pytest.raises(ValueError):
+        store.add(long_key, 1)
+    with pytest.raises(ValueError):
+        store.add_many(long_key, [1, 2], running_sums=True)
+    assert store.get(long_key) == 0
+    stub = sum_pb2_grpc.SumServiceStub(connect(create_server(store)))
+    with pytest.raises(grpc.RpcError) as excinfo:
+        stub.CalculateSum(sum_pb2.SumRequest(number=1, key=long_key))
+    assert excinfo.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    persistence.close()
+
+    store, persistence = open_store(str(tmp_path), 'interval')
+    assert store.snapshot() == {'k': 5}
+    persistence.close()
+
+def test_invalid_policy(tmp_path):
+    with pytest.raises(ValueError):
+        Persistence(str(tmp_path), 'sometimes')
+
+def test_fsync_always_is_refused_with_aio(tmp_path):
+    with pytest.raises(SystemExit):
+        main(['--mode', 'aio', '--data-dir', str(tmp_path), '--fsync', 'always'])
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,67 @@
+"""
+Tests for per-connection request pipelining.
+"""
+
+import asyncio
+import pytest
+from sum_service.websocket.pipeline import Pipeline
+
+async def reply_after(delay, payload):
+    await asyncio.sleep(delay)
+    return payload
+
+@pytest.mark.asyncio
+async def test_responses_follow_request_order():
+    sent = []
+
+    async def send(payload):
+        sent.append(payload)
+
+    pipeline = Pipeline(send, max_in_flight=4)
+    await pipeline.submit(reply_after(0.05, 'first'))
+    await pipeline.submit(reply_after(0.0, 'second'))
+    await pipeline.submit(reply_after(0.02, 'third'))
+    await asyncio.sleep(0.1)
+    assert sent == ['first', 'second', 'third']
+    pipeline.close()
+
+@pytest.mark.asyncio
+async def test_request_ids_complete_out_of_order():
+    sent = []
+
+    async def send(payload):
+        sent.append(payload)
+
+    pipeline = Pipeline(send, max_in_flight=4)
+    await pipeline.submit(reply_after(0.05, 'slow'), request_id=1)
+    await pipeline.submit(reply_after(0.0, 'fast'), request_id=2)
+    await asyncio.sleep(0.1)
+    assert sent == ['fast', 'slow']
+    pipeline.close()
+
+@pytest.mark.asyncio
+async def test_requests_run_concurrently_up_to_limit():
+    running = 0
+    peak = 0
+
+    async def work():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return 'done'
+
+    async def send(payload):
+        pass
+
+    pipeline = Pipeline(send, max_in_flight=3)
+    for _ in range(10):
+        await pipeline.submit(work())
+    await asyncio.sleep(0.1)
+    assert peak == 3
+    pipeline.close()
+
+def test_invalid_limit():
+    with pytest.raises(ValueError):
+        Pipeline(None, max_in_flight=0)
@@ -0,0 +1,94 @@
+"""
+Tests for the on-demand CPU and memory profilers.
+"""
+
+import os
+import signal
+import threading
+import time
+import tracemalloc
+import urllib.request
+import pytest
+from sum_service.metrics import Registry, start_http_server
+from sum_service.profiling import MemoryTracker, Profiling, profile_cpu
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,))
+    thread.start()
+    yield
+    stop.set()
+    thread.join()
+
+def test_cpu_profile_finds_busy_function(busy_thread):
+    profiler = profile_cpu(0.2, interval=0.002)
+    assert profiler.samples > 10
+    assert 'busy_loop' in profiler.report()
+    assert any('test_profiling.py:busy_loop' in line for line in profiler.folded().splitlines())
+
+def test_memory_tracker_reports_growth():
+    tracker = MemoryTracker()
+    try:
+        assert 'started' in tracker.snapshot()
+        retained = [bytearray(1024) for _ in range(1000)]
+        report = tracker.snapshot()
+        assert 'test_profiling.py' in report
+        assert retained
+    finally:
+        tracker.stop()
+
+def test_memory_tracing_stops_when_left_idle():
+    tracker = MemoryTracker(idle_timeout=0.2)
+    try:
+        tracker.snapshot()
+        time.sleep(0.1)
+        # Each snapshot renews the trace
+        tracker.snapshot()
+        time.sleep(0.15)
+        assert tracemalloc.is_tracing()
+        deadline = time.monotonic() + 5
+        while tracemalloc.is_tracing() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert not tracemalloc.is_tracing()
+        assert 'started' in tracker.snapshot()
+    finally:
+        tracker.stop()
+
+def test_debug_routes_are_opt_in(monkeypatch):
+    monkeypatch.delenv('PROFILE_HTTP', raising=False)
+    assert Profiling().routes() == {}
+    monkeypatch.setenv('PROFILE_HTTP', '1')
+    assert set(Profiling().routes()) == {'/debug/profile/cpu', '/debug/profile/memory'}
+
+def test_debug_routes():
+    profiling = Profiling(seconds=0.05, http=True)
+    server = start_http_server(0, Registry(), addr='127.0.0.1', routes=profiling.routes())
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        with urllib.request.urlopen(f'{base}/debug/profile/cpu?seconds=0.05') as response:
+            assert 'samples' in response.read().decode()
+        with urllib.request.urlopen(f'{base}/debug/profile/memory') as response:
+            assert 'started' in response.read().decode()
+        with urllib.request.urlopen(f'{base}/debug/profile/memory?stop=1') as response:
+            assert 'stopped' in response.read().decode()
+    finally:
+        server.shutdown()
+
+def test_signal_writes_cpu_profile(tmp_path):
+    previous = signal.getsignal(signal.SIGUSR1), signal.getsignal(signal.SIGUSR2)
+    Profiling(output_dir=str(tmp_path), seconds=0.05).install_signal_handlers()
+    try:
+        os.kill(os.getpid(), signal.SIGUSR1)
+        deadline = time.monotonic() + 5
+        while len(list(tmp_path.iterdir())) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        suffixes = sorted(path.suffix for path in tmp_path.iterdir())
+        assert suffixes == ['.folded', '.txt']
+    finally:
+        signal.signal(signal.SIGUSR1, previous[0])
+        signal.signal(signal.SIGUSR2, previous[1])
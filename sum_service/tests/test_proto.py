@@ -0,0 +1,19 @@
+"""
+Tests for the generated protobuf package.
+"""
+
+from sum_service.grpc.proto import generate_proto, sum_pb2, sum_pb2_grpc
+
+def test_stubs_match_proto():
+    # Run python -m sum_service.grpc.proto.generate_proto after editing sum.proto
+    assert generate_proto.is_current()
+
+def test_stubs_import_as_package():
+    assert sum_pb2_grpc.sum__service_dot_grpc_dot_proto_dot_sum__pb2 is sum_pb2
+    assert sum_pb2.DESCRIPTOR.package == 'sum'
+
+def test_generation_is_skipped_when_current(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("protoc should not run")
+    monkeypatch.setattr(generate_proto.subprocess, 'run', fail)
+    assert generate_proto.generate_proto() is False
@@ -0,0 +1,91 @@
+"""
+Tests for PN-counter replicas that all accept writes.
+"""
+
+import time
+import pytest
+import grpc
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from sum_service.grpc.replication import PNCounterStore
+from sum_service.tests.cluster import LocalCluster
+
+def test_pn_counter_merge_converges():
+    a = PNCounterStore('a')
+    b = PNCounterStore('b')
+    assert a.add('k', 5) == 5
+    assert b.add('k', -2) == -2
+    b.merge(a.take_dirty())
+    a.merge(b.take_dirty())
+    assert a.get('k') == b.get('k') == 3
+    # Merging the same state again changes nothing
+    a.merge(b.state('k'))
+    assert a.get('k') == 3
+    assert a.take_dirty() == []
+
+def test_pn_counter_add_many_and_reset():
+    store = PNCounterStore('a')
+    store.add('k', 10)
+    assert store.add_many('k', [1, -2, 3], running_sums=True) == (12, [11, 9, 12])
+    assert store.reset('k') == 0
+    assert store.get('k') == 0
+    assert store.snapshot() == {'k': 0}
+
+def _peer_args(index, targets):
+    peers = [target for i, target in enumerate(targets) if i != index]
+    return ['--replica-id', f'r{index}', '--peers', ','.join(peers), '--replication-interval', '0.05']
+
+@pytest.fixture
+def replica_stubs():
+    with LocalCluster(3, _peer_args) as cluster:
+        channels = [grpc.insecure_channel(target) for target in cluster.targets]
+        yield [sum_pb2_grpc.SumServiceStub(channel) for channel in channels]
+        for channel in channels:
+            channel.close()
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_any_replica_accepts_writes_and_converges(replica_stubs):
+    for i, stub in enumerate(replica_stubs):
+        for _ in range(i + 1):
+            stub.CalculateSum(sum_pb2.SumRequest(number=10, key='hot'))
+    replica_stubs[0].CalculateSum(sum_pb2.SumRequest(number=-5, key='hot'))
+
+    def local_sums():
+        return [stub.GetSum(sum_pb2.GetSumRequest(key='hot')).result for stub in replica_stubs]
+
+    assert _wait_for(lambda: local_sums() == [55, 55, 55]), local_sums()
+
+def test_merged_read_sees_every_replica(replica_stubs):
+    replica_stubs[1].CalculateSum(sum_pb2.SumRequest(number=7, key='fresh'))
+    replica_stubs[2].CalculateSum(sum_pb2.SumRequest(number=3, key='fresh'))
+    merged = replica_stubs[0].GetSum(sum_pb2.GetSumRequest(key='fresh', merged=True))
+    assert merged.result == 10
+
+def test_restarted_replica_keeps_counting_from_its_old_slot():
+    with LocalCluster(2, _peer_args) as cluster:
+        def local_sums():
+            sums = []
+            for target in cluster.targets:
+                with grpc.insecure_channel(target) as channel:
+                    stub = sum_pb2_grpc.SumServiceStub(channel)
+                    sums.append(stub.GetSum(sum_pb2.GetSumRequest(key='k')).result)
+            return sums
+
+        with grpc.insecure_channel(cluster.targets[0]) as channel:
+            sum_pb2_grpc.SumServiceStub(channel).CalculateSumBatch(
+                sum_pb2.SumBatchRequest(numbers=[10] * 10, key='k'))
+        assert _wait_for(lambda: local_sums() == [100, 100]), local_sums()
+
+        # r0 comes back with the same replica id and no local state
+        cluster.restart(0)
+        assert local_sums()[0] == 100
+        with grpc.insecure_channel(cluster.targets[0]) as channel:
+            assert sum_pb2_grpc.SumServiceStub(channel).CalculateSum(
+                sum_pb2.SumRequest(number=5, key='k')).result == 105
+        assert _wait_for(lambda: local_sums() == [105, 105]), local_sums()
@@ -0,0 +1,30 @@
+"""
+Tests for the bidirectional StreamSum RPC.
+"""
+
+from sum_service.grpc.proto import sum_pb2
+
+def test_stream_sum(sum_stub):
+    requests = (sum_pb2.SumRequest(number=n) for n in [1, 2, 3, 4, 5])
+    results = [response.result for response in sum_stub.StreamSum(requests)]
+    assert results == [1, 3, 6, 10, 15]
+
+def test_stream_sum_keys(sum_stub):
+    requests = [
+        sum_pb2.SumRequest(number=1),
+        sum_pb2.SumRequest(number=10, key='other'),
+        sum_pb2.SumRequest(number=2),
+    ]
+    metadata = (('x-sum-key', 'stream'),)
+    results = [response.result for response in sum_stub.StreamSum(iter(requests), metadata=metadata)]
+    assert results == [1, 10, 3]
+    # The stream and unary paths share the same accumulator
+    response = sum_stub.CalculateSum(sum_pb2.SumRequest(number=1, key='stream'))
+    assert response.result == 4
+
+def test_stream_sum_many_numbers(sum_stub):
+    requests = (sum_pb2.SumRequest(number=1, key='bulk') for _ in range(5000))
+    last = None
+    for last in sum_stub.StreamSum(requests):
+        pass
+    assert last.result == 5000
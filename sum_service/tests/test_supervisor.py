@@ -0,0 +1,118 @@
+"""
+Tests for deterministic binding and supervised zero-downtime restarts.
+"""
+
+import os
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+from sum_service.bench.local import free_port
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from sum_service.grpc.server import bind, create_server
+from sum_service.grpc.supervisor import READY, Handoff, Supervisor, listen
+
+def test_handoff_round_trip():
+    state_r, state_w = os.pipe()
+    control_r, control_w = os.pipe()
+    handoff = Handoff.parse(f'{state_r},{control_w}')
+    with os.fdopen(state_w, 'wb') as f:
+        f.write(b'')
+    assert handoff.receive() == {}
+    handoff.ready()
+    handoff.send({'a': 1, 'b': -7})
+    with os.fdopen(control_r, 'rb') as f:
+        assert f.read(1) == READY
+        data = f.read()
+
+    state_r, state_w = os.pipe()
+    with os.fdopen(state_w, 'wb') as f:
+        f.write(data)
+    assert Handoff(state_r, None).receive() == {'a': 1, 'b': -7}
+
+def test_busy_port_is_an_error():
+    first = create_server(options=[('grpc.so_reuseport', 0)])
+    port = bind(first, 0)
+    second = create_server(options=[('grpc.so_reuseport', 0)])
+    try:
+        with pytest.raises(RuntimeError, match=str(port)):
+            bind(second, port)
+    finally:
+        first.stop(0)
+        second.stop(0)
+
+def test_supervisor_listener_refuses_other_programs():
+    port = free_port()
+    listener = listen(port)
+    try:
+        server = create_server(options=[('grpc.so_reuseport', 1)])
+        with pytest.raises(RuntimeError):
+            bind(server, port)
+        server.stop(0)
+    finally:
+        listener.close()
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_restarts_under_load_fail_no_rpcs():
+    port = free_port()
+    supervisor = Supervisor(port, ['--port', str(port), '--admission', 'off', '--grace', '2'])
+    supervisor.start()
+    errors = []
+    results = []
+    done = threading.Event()
+
+    def client():
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            stub = sum_pb2_grpc.SumServiceStub(channel)
+            while not done.is_set():
+                try:
+                    results.append(stub.CalculateSum(sum_pb2.SumRequest(number=1, key='restart'), timeout=10).result)
+                except grpc.RpcError as e:
+                    errors.append((e.code(), e.details()))
+
+    try:
+        with futures.ThreadPoolExecutor(max_workers=4) as pool:
+            clients = [pool.submit(client) for _ in range(4)]
+            wait_for(lambda: len(results) >= 50)
+            for _ in range(2):
+                first_pid = supervisor.child.process.pid
+                supervisor.restart()
+                assert supervisor.child.process.pid != first_pid
+                before = len(results)
+                wait_for(lambda: len(results) >= before + 50)
+            done.set()
+            for future in clients:
+                future.result()
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            total = sum_pb2_grpc.SumServiceStub(channel).GetSum(sum_pb2.GetSumRequest(key='restart')).result
+    finally:
+        done.set()
+        supervisor.stop()
+
+    assert errors == []
+    # Every increment landed exactly once across the three processes
+    assert total == len(results)
+
+def test_open_stream_delays_a_restart_by_the_handoff_grace_only():
+    port = free_port()
+    supervisor = Supervisor(port, ['--port', str(port), '--admission', 'off', '--grace', '30',
+                                   '--handoff-grace', '0.5'])
+    supervisor.start()
+    try:
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            updates = sum_pb2_grpc.SumServiceStub(channel).WatchSum(sum_pb2.WatchSumRequest(key='w'))
+            assert next(updates).result == 0
+            started = time.monotonic()
+            supervisor.restart()
+            assert time.monotonic() - started < 10
+            with pytest.raises(grpc.RpcError):
+                next(updates)
+    finally:
+        supervisor.stop()
@@ -0,0 +1,134 @@
+"""
+Tests for WatchSum and the shared-update fan-out behind it.
+"""
+
+import time
+
+import grpc
+import pytest
+import pytest_asyncio
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from sum_service.grpc import aio_server
+from sum_service.grpc.accumulator import AccumulatorStore
+from sum_service.grpc.admission import AdaptiveLimiter
+from sum_service.grpc.server import SERVER_THREADS, create_server
+from sum_service.grpc.watch import WatchHub
+
+@pytest.fixture
+def sync_stub(connect):
+    # A short flush interval keeps updates prompt
+    return sum_pb2_grpc.SumServiceStub(connect(create_server(watch_interval=0.02)))
+
+def test_hub_encodes_each_change_once():
+    store = AccumulatorStore()
+    hub = WatchHub(store, interval=60)
+    first = hub.subscribe('k')
+    second = hub.subscribe('k')
+    assert first is second
+    assert hub.watchers == 2
+    version, encoded = first.latest
+    assert version == 1
+    assert sum_pb2.SumUpdate.FromString(encoded) == sum_pb2.SumUpdate(key='k', result=0, version=1)
+
+    changed = first.changed
+    store.add('k', 4)
+    store.add('k', 5)
+    hub.flush()
+    assert changed.is_set()
+    version, encoded = first.latest
+    assert sum_pb2.SumUpdate.FromString(encoded) == sum_pb2.SumUpdate(key='k', result=9, version=2)
+
+    # Nothing changed, so nothing is re-encoded
+    hub.flush()
+    assert first.latest == (version, encoded)
+    assert not first.changed.is_set()
+
+    hub.unsubscribe(first)
+    hub.unsubscribe(second)
+    assert hub.watchers == 0
+    assert hub.subscribe('k') is not first
+
+def test_hub_caps_watchers():
+    hub = WatchHub(AccumulatorStore(), interval=60, max_watchers=1)
+    topic = hub.subscribe('a')
+    assert hub.subscribe('b') is None
+    hub.unsubscribe(topic)
+    assert hub.subscribe('b') is not None
+
+def test_watch_sends_initial_value_and_updates(sync_stub):
+    sync_stub.CalculateSum(sum_pb2.SumRequest(number=2, key='w'))
+    updates = sync_stub.WatchSum(sum_pb2.WatchSumRequest(key='w'))
+    first = next(updates)
+    assert (first.key, first.result, first.version) == ('w', 2, 1)
+
+    sync_stub.CalculateSum(sum_pb2.SumRequest(number=3, key='w'))
+    second = next(updates)
+    assert (second.result, second.version) == (5, 2)
+    updates.cancel()
+
+def test_session_server_serves_watch_sum(grpc_channel):
+    # The shared fixture registers SumService the way production servers do
+    stub = sum_pb2_grpc.SumServiceStub(grpc_channel)
+    stub.CalculateSum(sum_pb2.SumRequest(number=3, key='session-watch'))
+    updates = stub.WatchSum(sum_pb2.WatchSumRequest(key='session-watch'), timeout=5)
+    assert next(updates).result == 3
+    updates.cancel()
+
+def test_watch_coalesces_bursts(sync_stub):
+    updates = sync_stub.WatchSum(sum_pb2.WatchSumRequest(key='burst', min_interval_ms=300))
+    assert next(updates).result == 0
+    for _ in range(50):
+        sync_stub.CalculateSum(sum_pb2.SumRequest(number=1, key='burst'))
+    received = []
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        received.append(next(updates))
+        if received[-1].result == 50:
+            break
+    updates.cancel()
+    assert received[-1].result == 50
+    # 50 writes inside one 300ms interval arrive as at most a couple of updates
+    assert len(received) <= 2
+    versions = [update.version for update in received]
+    assert versions == sorted(set(versions))
+
+def test_sync_server_caps_watchers(connect):
+    stub = sum_pb2_grpc.SumServiceStub(connect(create_server(watch_interval=0.02, max_watchers=3)))
+    streams = [stub.WatchSum(sum_pb2.WatchSumRequest(key='cap')) for _ in range(3)]
+    for stream in streams:
+        next(stream)
+    extra = stub.WatchSum(sum_pb2.WatchSumRequest(key='cap'))
+    with pytest.raises(grpc.RpcError) as excinfo:
+        next(extra)
+    assert excinfo.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    # Watchers have threads of their own; all SERVER_THREADS still serve unary RPCs
+    pending = [stub.CalculateSum.future(sum_pb2.SumRequest(number=1, key='cap')) for _ in range(SERVER_THREADS)]
+    assert sorted(future.result(timeout=5).result for future in pending) == list(range(1, SERVER_THREADS + 1))
+    for stream in streams:
+        stream.cancel()
+
+def test_watch_is_exempt_from_admission(connect):
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1)
+    stub = sum_pb2_grpc.SumServiceStub(connect(create_server(limiter=limiter)))
+    updates = stub.WatchSum(sum_pb2.WatchSumRequest(key='x'))
+    next(updates)
+    assert stub.CalculateSum(sum_pb2.SumRequest(number=1, key='x')).result == 1
+    updates.cancel()
+
+@pytest_asyncio.fixture
+async def aio_stub(start_aio_server):
+    channel = grpc.aio.insecure_channel(await start_aio_server(aio_server.create_server(watch_interval=0.02)))
+    yield sum_pb2_grpc.SumServiceStub(channel)
+    await channel.close()
+
+@pytest.mark.asyncio
+async def test_aio_watchers_share_updates(aio_stub):
+    # Far more watchers than a thread-pool server could hold
+    streams = [aio_stub.WatchSum(sum_pb2.WatchSumRequest(key='many')) for _ in range(SERVER_THREADS * 5)]
+    for stream in streams:
+        assert (await stream.read()).result == 0
+    await aio_stub.CalculateSum(sum_pb2.SumRequest(number=7, key='many'))
+    for stream in streams:
+        update = await stream.read()
+        assert (update.result, update.version) == (7, 2)
+        stream.cancel()
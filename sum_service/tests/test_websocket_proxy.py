@@ -0,0 +1,153 @@
+"""
+Tests for the WebSocket proxy running against an in-process gRPC server.
+"""
+
+import asyncio
+import json
+import grpc
+import pytest
+import pytest_asyncio
+import websockets
+from sum_service.grpc.proto import sum_pb2
+from sum_service.grpc.aio_server import AsyncSumServicer
+from sum_service.grpc.watch import add_sum_service
+from sum_service.websocket.codec import SUBPROTOCOLS, JSON_SUBPROTOCOL, PROTOBUF_SUBPROTOCOL
+from sum_service.metrics import Registry
+from sum_service.websocket.server import WebSocketProxy
+from sum_service import websocket_proxy
+
+SLOW_NUMBER = 999
+
+class SlowSumServicer(AsyncSumServicer):
+    async def CalculateSum(self, request, context):
+        if request.number == SLOW_NUMBER:
+            await asyncio.sleep(0.5)
+        return await super().CalculateSum(request, context)
+
+@pytest_asyncio.fixture
+async def proxy_url(start_aio_server):
+    server = grpc.aio.server()
+    add_sum_service(SlowSumServicer(), server)
+    proxy = WebSocketProxy(upstreams=[await start_aio_server(server)], pool_size=2, max_in_flight=4)
+    async with websockets.serve(proxy.handle_websocket, 'localhost', 0, subprotocols=SUBPROTOCOLS) as ws_server:
+        ws_port = ws_server.sockets[0].getsockname()[1]
+        yield f'ws://localhost:{ws_port}'
+    await proxy.close()
+
+async def send_number(websocket, number):
+    await websocket.send(json.dumps({'number': number}))
+    return json.loads(await websocket.recv())
+
+@pytest.mark.asyncio
+async def test_running_sum(proxy_url):
+    async with websockets.connect(proxy_url) as websocket:
+        results = [(await send_number(websocket, n))['sum'] for n in [1, 2, 3]]
+    assert results == [1, 3, 6]
+
+@pytest.mark.asyncio
+async def test_disconnect_keeps_channels_open(proxy_url):
+    async with websockets.connect(proxy_url) as first:
+        assert (await send_number(first, 1))['sum'] == 1
+    async with websockets.connect(proxy_url) as second:
+        assert (await send_number(second, 1))['sum'] == 2
+
+@pytest.mark.asyncio
+async def test_slow_rpc_does_not_stall_other_clients(proxy_url):
+    async with websockets.connect(proxy_url) as slow, websockets.connect(proxy_url) as fast:
+        await slow.send(json.dumps({'number': SLOW_NUMBER}))
+        await asyncio.sleep(0.05)
+        fast_response = await asyncio.wait_for(send_number(fast, 1), timeout=0.3)
+        assert fast_response['sum'] == 1
+        slow_response = json.loads(await slow.recv())
+        assert slow_response['sum'] == SLOW_NUMBER + 1
+
+@pytest.mark.asyncio
+async def test_invalid_request(proxy_url):
+    async with websockets.connect(proxy_url) as websocket:
+        await websocket.send(json.dumps({'invalid': 'data'}))
+        assert 'error' in json.loads(await websocket.recv())
+        await websocket.send('invalid json')
+        assert 'error' in json.loads(await websocket.recv())
+
+@pytest.mark.asyncio
+async def test_pipelined_requests_with_ids(proxy_url):
+    async with websockets.connect(proxy_url) as websocket:
+        await websocket.send(json.dumps({'number': SLOW_NUMBER, 'id': 'slow'}))
+        await websocket.send(json.dumps({'number': 1, 'id': 'fast'}))
+        first = json.loads(await websocket.recv())
+        second = json.loads(await websocket.recv())
+    assert (first['id'], first['sum']) == ('fast', 1)
+    assert (second['id'], second['sum']) == ('slow', SLOW_NUMBER + 1)
+
+@pytest.mark.asyncio
+async def test_protobuf_subprotocol(proxy_url):
+    async with websockets.connect(proxy_url, subprotocols=[PROTOBUF_SUBPROTOCOL]) as websocket:
+        assert websocket.subprotocol == PROTOBUF_SUBPROTOCOL
+        results = []
+        for number in [2, 3]:
+            await websocket.send(sum_pb2.SumRequest(number=number).SerializeToString())
+            frame = await websocket.recv()
+            assert isinstance(frame, bytes)
+            results.append(sum_pb2.SumResponse.FromString(frame).result)
+        assert results == [2, 5]
+
+        # Text frames are rejected on the binary subprotocol
+        await websocket.send(json.dumps({'number': 1}))
+        assert 'error' in json.loads(await websocket.recv())
+
+@pytest.mark.asyncio
+async def test_malformed_binary_frame_gets_an_error_on_a_sharded_pool(start_aio_server):
+    upstreams = []
+    for _ in range(2):
+        server = grpc.aio.server()
+        add_sum_service(AsyncSumServicer(), server)
+        upstreams.append(await start_aio_server(server))
+    proxy = WebSocketProxy(upstreams=upstreams, pool_size=1)
+    assert proxy.pool.sharded
+    try:
+        async with websockets.serve(proxy.handle_websocket, 'localhost', 0, subprotocols=SUBPROTOCOLS) as ws_server:
+            url = f'ws://localhost:{ws_server.sockets[0].getsockname()[1]}'
+            async with websockets.connect(url, subprotocols=[PROTOBUF_SUBPROTOCOL]) as websocket:
+                await websocket.send(b'\xff\xff\xff')
+                reply = await asyncio.wait_for(websocket.recv(), timeout=5)
+                assert 'error' in json.loads(reply)
+                # The connection keeps working after the bad frame
+                await websocket.send(sum_pb2.SumRequest(number=4, key='k').SerializeToString())
+                frame = await asyncio.wait_for(websocket.recv(), timeout=5)
+                assert sum_pb2.SumResponse.FromString(frame).result == 4
+    finally:
+        await proxy.close()
+
+@pytest.mark.asyncio
+async def test_json_subprotocol(proxy_url):
+    async with websockets.connect(proxy_url, subprotocols=[JSON_SUBPROTOCOL]) as websocket:
+        assert websocket.subprotocol == JSON_SUBPROTOCOL
+        assert (await send_number(websocket, 4))['sum'] == 4
+
+@pytest.mark.asyncio
+async def test_proxy_metrics():
+    registry = Registry()
+    proxy = WebSocketProxy(grpc_host='localhost', grpc_port=1, pool_size=1, registry=registry)
+    async with websockets.serve(proxy.handle_websocket, 'localhost', 0) as ws_server:
+        ws_port = ws_server.sockets[0].getsockname()[1]
+        async with websockets.connect(f'ws://localhost:{ws_port}') as websocket:
+            # Nothing listens on port 1, so the upstream call fails
+            assert 'error' in await send_number(websocket, 1)
+            assert 'ws_connections_open 1' in registry.exposition()
+    await proxy.close()
+    exposition = registry.exposition()
+    assert 'ws_connections_total 1' in exposition
+    assert 'ws_connections_open 0' in exposition
+    assert 'ws_messages_received_total{format="json"} 1' in exposition
+    assert 'ws_upstream_errors_total{grpc_code="UNAVAILABLE"} 1' in exposition
+
+@pytest.mark.asyncio
+async def test_single_proxy_reconnects_once_per_outage():
+    # Nothing listens on port 1, so every pipelined call fails with UNAVAILABLE
+    proxy = websocket_proxy.WebSocketProxy('localhost', 1, max_in_flight=8)
+    first_channel = proxy.channel
+    replies = await asyncio.gather(*(proxy.process({'number': 1}, 0) for _ in range(8)))
+    assert all('error' in json.loads(reply) for reply in replies)
+    assert proxy.generation == 1
+    assert proxy.channel is not first_channel
+    await proxy.channel.close()
@@ -3,8 +3,7 @@ import asyncio
 import websockets
 import json
 import grpc
-import sum_pb2
-import sum_pb2_grpc
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
 from sum_service.websocket.server import WebSocketServer
 
 @pytest.fixture
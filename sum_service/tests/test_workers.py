@@ -0,0 +1,98 @@
+"""
+Tests for the shared-memory accumulator and the multi-process server mode.
+"""
+
+import multiprocessing
+import socket
+import pytest
+import grpc
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from sum_service.grpc.admission import AdaptiveLimiter
+from sum_service.grpc.dedup import DedupCache
+from sum_service.grpc.server import create_server, main
+from sum_service.grpc.shared_accumulator import SharedAccumulatorStore
+from sum_service.grpc.workers import start_workers, stop_workers
+
+@pytest.fixture
+def shared_store():
+    store = SharedAccumulatorStore(slots=256, segments=4)
+    yield store
+    store.close()
+    store.unlink()
+
+def _increment(store, keys, times):
+    for _ in range(times):
+        for key in keys:
+            store.add(key, 1)
+
+def test_shared_store_basic(shared_store):
+    assert shared_store.add('a', 5) == 5
+    assert shared_store.add('b', -2) == -2
+    assert shared_store.add('a', 1) == 6
+    assert shared_store.add_many('a', [1, 2], running_sums=True) == (9, [7, 9])
+    assert shared_store.get('missing') == 0
+    assert shared_store.snapshot() == {'a': 9, 'b': -2}
+    assert shared_store.reset('a') == 0
+    assert shared_store.get('a') == 0
+
+def test_shared_store_key_limit(shared_store):
+    with pytest.raises(ValueError):
+        shared_store.add('x' * 100, 1)
+
+def test_server_rejects_keys_the_shared_store_cannot_hold(shared_store, connect):
+    stub = sum_pb2_grpc.SumServiceStub(connect(create_server(shared_store)))
+    with pytest.raises(grpc.RpcError) as excinfo:
+        stub.CalculateSum(sum_pb2.SumRequest(number=1, key='x' * 100))
+    assert excinfo.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert stub.CalculateSum(sum_pb2.SumRequest(number=1, key='x' * 62)).result == 1
+
+def test_shared_store_full():
+    store = SharedAccumulatorStore(slots=2, segments=1)
+    try:
+        store.add('a', 1)
+        store.add('b', 1)
+        with pytest.raises(MemoryError):
+            store.add('c', 1)
+    finally:
+        store.close()
+        store.unlink()
+
+def test_shared_store_across_processes(shared_store):
+    keys = [f'k{i}' for i in range(10)]
+    ctx = multiprocessing.get_context('fork')
+    processes = [ctx.Process(target=_increment, args=(shared_store, keys, 500)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert shared_store.snapshot() == {key: 2000 for key in keys}
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+def test_workers_share_sums():
+    port = _free_port()
+    processes, store = start_workers(port, 2, slots=256, limiter=AdaptiveLimiter(), watch_interval=0.02)
+    try:
+        channels = [grpc.insecure_channel(f'localhost:{port}') for _ in range(4)]
+        for channel in channels:
+            grpc.channel_ready_future(channel).result(timeout=10)
+        total = 0
+        for i in range(20):
+            stub = sum_pb2_grpc.SumServiceStub(channels[i % len(channels)])
+            total = stub.CalculateSum(sum_pb2.SumRequest(number=1, key='shared')).result
+        assert total == 20
+        assert store.get('shared') == 20
+        for channel in channels:
+            channel.close()
+    finally:
+        stop_workers(processes, store)
+
+def test_workers_refuse_a_per_process_dedup_cache():
+    with pytest.raises(ValueError):
+        start_workers(_free_port(), 2, dedup=DedupCache())
+    # Deduplication is on by default, so --workers must turn it off
+    with pytest.raises(SystemExit):
+        main(['--workers', '2', '--port', str(_free_port())])
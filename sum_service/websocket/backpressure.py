@@ -0,0 +1,232 @@
+"""
+Per-connection outbound queues with watermarks and slow-consumer policies.
+
+Inbound, each connection is bounded by the websockets library's own frame
+queue (serve_options) and by the pipeline's max_in_flight. Outbound,
+replies wait in an OutboundQueue that a single writer task drains, and
+queued bytes above the high watermark trigger the connection's policy.
+"""
+
+import asyncio
+import collections
+import functools
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+PAUSE = 'pause'
+DROP_OLDEST = 'drop_oldest'
+COALESCE_LATEST = 'coalesce_latest'
+DISCONNECT = 'disconnect'
+POLICIES = (PAUSE, DROP_OLDEST, COALESCE_LATEST, DISCONNECT)
+
+# Close code (policy violation) for a client that reads too slowly
+SLOW_CONSUMER_CLOSE_CODE = 1008
+
+class ConnectionStats:
+    """Counters for one connection, logged when it closes."""
+
+    __slots__ = ('received', 'sent', 'dropped', 'coalesced', 'pauses', 'paused_seconds',
+                 'peak_queued_bytes')
+
+    def __init__(self):
+        self.received = self.sent = self.dropped = self.coalesced = self.pauses = 0
+        self.paused_seconds = 0.0
+        self.peak_queued_bytes = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class OutboundQueue:
+    """Replies waiting to be written to one client.
+
+    While more than high_watermark bytes are queued, the policy decides
+    what happens to a new reply:
+
+    pause: put() waits until the queue drains to low_watermark. The
+        pipeline keeps its slots meanwhile, so the connection stops reading
+        and stops sending work upstream.
+    drop_oldest: the oldest queued replies are discarded to make room.
+    coalesce_latest: the reply replaces the queued reply for the same key,
+        since a newer running sum supersedes an older one. Replies without a
+        key, or with nothing to replace, fall back to drop_oldest.
+    disconnect: queued replies are discarded and the client is closed.
+
+    A reply is always accepted into an empty queue, whatever its size.
+    """
+
+    def __init__(self, send, close, policy=PAUSE, high_watermark=65536, low_watermark=16384,
+                 stats=None, metrics=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy {policy!r}; expected one of {', '.join(POLICIES)}")
+        if not 0 <= low_watermark <= high_watermark:
+            raise ValueError("Watermarks must satisfy 0 <= low_watermark <= high_watermark")
+        self._send = send
+        self._close = close
+        self.policy = policy
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.stats = stats or ConnectionStats()
+        self.metrics = metrics
+        self.queued_bytes = 0
+        self.closed = False
+        # Entries are [payload, size, key]; a discarded entry's payload is
+        # None until the writer or a compaction removes it
+        self._entries = collections.deque()
+        self._discarded = 0
+        self._latest = {}
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._writer = None
+        self._closing = None
+
+    async def put(self, payload, key=None):
+        """Queue a reply, applying the policy if the queue is over its high watermark."""
+        if self.closed:
+            return
+        size = len(payload)
+        if self._entries and self.queued_bytes + size > self.high_watermark:
+            if not await self._make_room(size, key):
+                return
+        entry = [payload, size, key]
+        self._entries.append(entry)
+        self.queued_bytes += size
+        if key is not None and self.policy == COALESCE_LATEST:
+            self._latest[key] = entry
+        if self.queued_bytes > self.stats.peak_queued_bytes:
+            self.stats.peak_queued_bytes = self.queued_bytes
+        self._ready.set()
+        if self._writer is None:
+            self._writer = asyncio.ensure_future(self._write())
+
+    async def _make_room(self, size, key):
+        policy = self.policy
+        if policy == PAUSE:
+            self.stats.pauses += 1
+            if self.metrics is not None:
+                self.metrics.read_pauses.inc()
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            self._drained.clear()
+            await self._drained.wait()
+            self.stats.paused_seconds += loop.time() - started
+            return not self.closed
+        if policy == DISCONNECT:
+            self._disconnect()
+            return False
+        if policy == COALESCE_LATEST and key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                self._discard(previous)
+                self.stats.coalesced += 1
+                if self.metrics is not None:
+                    self.metrics.coalesced_replies.inc()
+        entries = self._entries
+        while entries and self.queued_bytes + size > self.high_watermark:
+            entry = entries.popleft()
+            if entry[0] is None:
+                self._discarded -= 1
+                continue
+            self._discard(entry)
+            self._discarded -= 1
+            self.stats.dropped += 1
+            if self.metrics is not None:
+                self.metrics.dropped_replies.inc()
+        self._compact()
+        return True
+
+    def _discard(self, entry):
+        self.queued_bytes -= entry[1]
+        entry[0] = None
+        self._discarded += 1
+        key = entry[2]
+        if key is not None and self._latest.get(key) is entry:
+            del self._latest[key]
+
+    def _compact(self):
+        # Coalescing leaves discarded entries behind; rebuild once they
+        # outnumber the live ones so the deque stays bounded
+        if self._discarded > len(self._entries) // 2:
+            self._entries = collections.deque(entry for entry in self._entries if entry[0] is not None)
+            self._discarded = 0
+
+    async def _write(self):
+        try:
+            while True:
+                while not self._entries:
+                    self._ready.clear()
+                    await self._ready.wait()
+                entry = self._entries.popleft()
+                payload = entry[0]
+                if payload is None:
+                    self._discarded -= 1
+                    continue
+                self._discard(entry)
+                self._discarded -= 1
+                await self._send(payload)
+                self.stats.sent += 1
+                if self.queued_bytes <= self.low_watermark:
+                    self._drained.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The client has gone; later replies have nowhere to go
+            logger.debug("Stopped writing to client: %s", e)
+            self._shutdown()
+
+    def _disconnect(self):
+        logger.warning("Disconnecting slow client with %d bytes queued", self.queued_bytes)
+        if self.metrics is not None:
+            self.metrics.slow_consumer_disconnects.inc()
+        self.stats.dropped += len(self._entries) - self._discarded
+        self._shutdown()
+        self._closing = asyncio.ensure_future(self._close())
+
+    def _shutdown(self):
+        self.closed = True
+        self._entries.clear()
+        self._discarded = 0
+        self._latest.clear()
+        self.queued_bytes = 0
+        # Release any put() paused on the watermark
+        self._drained.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    def close(self):
+        """Discard queued replies and stop the writer, e.g. after the client disconnected."""
+        self._shutdown()
+
+class BackpressureSettings:
+    """Buffer limits and slow-consumer policy shared by every connection of a proxy."""
+
+    def __init__(self, policy=None, high_watermark=None, low_watermark=None, inbound_queue=None,
+                 max_message_bytes=None):
+        self.policy = policy or os.getenv('WS_SLOW_CONSUMER_POLICY', PAUSE)
+        self.high_watermark = high_watermark or int(os.getenv('WS_SEND_HIGH_WATERMARK', '65536'))
+        if low_watermark is None:
+            low_watermark = int(os.getenv('WS_SEND_LOW_WATERMARK', str(self.high_watermark // 4)))
+        self.low_watermark = low_watermark
+        # Frames each connection may have read but not yet handled
+        self.inbound_queue = inbound_queue or int(os.getenv('WS_INBOUND_QUEUE', '16'))
+        self.max_message_bytes = max_message_bytes or int(os.getenv('WS_MAX_MESSAGE_BYTES', '65536'))
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy {self.policy!r}; expected one of {', '.join(POLICIES)}")
+        if not 0 <= self.low_watermark <= self.high_watermark:
+            raise ValueError("Watermarks must satisfy 0 <= low_watermark <= high_watermark")
+
+    def serve_options(self):
+        """Keyword arguments for websockets.serve that bound its own per-connection buffers."""
+        return {
+            'max_queue': self.inbound_queue,
+            'max_size': self.max_message_bytes,
+            'write_limit': self.high_watermark,
+        }
+
+    def queue(self, websocket, stats=None, metrics=None):
+        """An OutboundQueue writing to websocket."""
+        close = functools.partial(websocket.close, SLOW_CONSUMER_CLOSE_CODE, 'slow consumer')
+        return OutboundQueue(websocket.send, close, self.policy, self.high_watermark, self.low_watermark,
+                             stats, metrics)
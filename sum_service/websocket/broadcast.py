@@ -0,0 +1,163 @@
+"""
+Subscriptions: many WebSocket clients following the running sum of one key.
+
+The proxy keeps one upstream WatchSum stream per subscribed key, however
+many clients subscribe to it. Each update is encoded once and written to
+every subscriber with websockets.broadcast, which queues the frame on each
+socket without waiting for any of them. A subscriber whose socket already
+holds more than max_buffered unsent bytes skips the update; once its socket
+drains it gets the latest one, so a slow client sees fewer updates instead
+of a growing backlog.
+"""
+
+import asyncio
+import json
+import logging
+
+import grpc
+import websockets
+
+from sum_service.grpc.proto import sum_pb2
+
+from sum_service.grpc.accumulator import DEFAULT_KEY
+
+logger = logging.getLogger(__name__)
+
+# How often subscribers that skipped an update are checked for a drained socket
+CATCH_UP_INTERVAL = 0.05
+# Longest wait between attempts to re-open a failing WatchSum stream
+MAX_RETRY_DELAY = 30.0
+
+def buffered_bytes(websocket):
+    """Bytes written to websocket but not yet sent to the client."""
+    transport = websocket.transport
+    return transport.get_write_buffer_size() if transport is not None else 0
+
+class Channel:
+    """The subscribers of one key and the latest update sent to them."""
+
+    def __init__(self, key):
+        self.key = key
+        self.subscribers = set()
+        # Subscribers that skipped the latest update
+        self.behind = set()
+        self.latest = None
+        # Error frame sent while the upstream stream is failing, else None
+        self.error = None
+        self.watcher = None
+        self.catch_up = None
+
+class Broadcaster:
+    """Fans the WatchSum updates of each subscribed key out to its WebSocket subscribers.
+
+    Updates are JSON text frames {"channel": key, "sum": ..., "version": ...}.
+    version grows with each upstream update, so a gap shows how many a
+    subscriber skipped; it restarts if the upstream stream is re-opened.
+
+    When the upstream stream fails, for example because a thread-pool server
+    already has --max-watchers streams open, subscribers get one
+    {"channel": key, "error": ..., "code": ...} frame and the stream is
+    retried with backoff up to MAX_RETRY_DELAY; updates resume once it opens.
+    """
+
+    def __init__(self, pool, max_buffered=65536, min_interval=0.0, retry_delay=1.0, metrics=None):
+        self.pool = pool
+        self.max_buffered = max_buffered
+        self.min_interval = min_interval
+        self.retry_delay = retry_delay
+        self.metrics = metrics
+        self._channels = {}
+
+    @property
+    def channels(self):
+        return len(self._channels)
+
+    def subscribe(self, key, websocket):
+        # An empty key is the server's default key; share one channel for both
+        key = key or DEFAULT_KEY
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = Channel(key)
+            channel.watcher = asyncio.ensure_future(self._watch(channel))
+        channel.subscribers.add(websocket)
+        if channel.latest is not None:
+            self._deliver(channel, (websocket,))
+        if channel.error is not None:
+            websockets.broadcast((websocket,), channel.error)
+
+    def unsubscribe(self, key, websocket):
+        key = key or DEFAULT_KEY
+        channel = self._channels.get(key)
+        if channel is None:
+            return
+        channel.subscribers.discard(websocket)
+        channel.behind.discard(websocket)
+        if not channel.subscribers:
+            # The last subscriber left; close the upstream stream
+            del self._channels[key]
+            self._stop(channel)
+
+    def _stop(self, channel):
+        channel.watcher.cancel()
+        if channel.catch_up is not None:
+            channel.catch_up.cancel()
+
+    async def _watch(self, channel):
+        request = sum_pb2.WatchSumRequest(key=channel.key, min_interval_ms=int(self.min_interval * 1000))
+        delay = self.retry_delay
+        while True:
+            call = self.pool.stub(channel.key).WatchSum(request)
+            try:
+                async for update in call:
+                    channel.error = None
+                    delay = self.retry_delay
+                    channel.latest = json.dumps(
+                        {'channel': channel.key, 'sum': update.result, 'version': update.version})
+                    skipped = self._deliver(channel, channel.subscribers)
+                    if skipped and self.metrics is not None:
+                        self.metrics.broadcast_skipped.inc(skipped)
+                logger.warning("WatchSum stream for key %s ended; re-opening it", channel.key)
+            except grpc.RpcError as e:
+                logger.warning("WatchSum stream for key %s failed: %s", channel.key, e)
+                if self.metrics is not None:
+                    self.metrics.upstream_error(e)
+                if channel.error is None:
+                    # Tell subscribers once that updates stopped, not on every retry
+                    code = e.code().name if hasattr(e, 'code') else 'UNKNOWN'
+                    channel.error = json.dumps({'channel': channel.key, 'code': code,
+                                                'error': "Updates unavailable; retrying"})
+                    websockets.broadcast(channel.subscribers, channel.error)
+            finally:
+                call.cancel()
+            await asyncio.sleep(delay)
+            if channel.error is not None:
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def _deliver(self, channel, subscribers):
+        """Broadcast the latest update to subscribers that can take it; returns how many skipped it."""
+        ready = []
+        for websocket in subscribers:
+            if buffered_bytes(websocket) > self.max_buffered:
+                channel.behind.add(websocket)
+            else:
+                channel.behind.discard(websocket)
+                ready.append(websocket)
+        websockets.broadcast(ready, channel.latest)
+        if self.metrics is not None:
+            self.metrics.broadcast_messages.inc(len(ready))
+        if channel.behind and channel.catch_up is None:
+            channel.catch_up = asyncio.ensure_future(self._catch_up(channel))
+        return len(subscribers) - len(ready)
+
+    async def _catch_up(self, channel):
+        try:
+            while channel.behind:
+                await asyncio.sleep(CATCH_UP_INTERVAL)
+                self._deliver(channel, list(channel.behind))
+        finally:
+            channel.catch_up = None
+
+    def close(self):
+        channels, self._channels = self._channels, {}
+        for channel in channels.values():
+            self._stop(channel)
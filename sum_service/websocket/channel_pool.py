@@ -0,0 +1,106 @@
+"""
+Pool of long-lived grpc.aio channels shared by all WebSocket connections.
+"""
+
+import itertools
+import grpc
+from sum_service.grpc.proto import sum_pb2_grpc
+
+from sum_service.grpc.accumulator import DEFAULT_KEY
+
+from sum_service.hashring import ShardRouter
+
+CALCULATE_SUM_METHOD = '/sum.SumService/CalculateSum'
+
+# Keepalive settings so idle pooled channels notice a dead upstream
+CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', True),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+class ChannelPool:
+    """Round-robin pool of grpc.aio channels to one upstream target.
+
+    Each channel is its own HTTP/2 connection, so spreading calls over the
+    pool avoids funnelling every client through a single connection. Channels
+    are created on first use (inside the running event loop) and stay open
+    until close() is called at proxy shutdown.
+    """
+
+    sharded = False
+
+    def __init__(self, target, size=4, options=None):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.target = target
+        self.size = size
+        self.options = CHANNEL_OPTIONS if options is None else options
+        self._channels = []
+        self._entries = None
+
+    def _open(self):
+        self._channels = [
+            grpc.aio.insecure_channel(self.target, options=self.options)
+            for _ in range(self.size)
+        ]
+        # Raw callables skip (de)serialization and pass protobuf bytes through
+        self._entries = itertools.cycle([
+            (sum_pb2_grpc.SumServiceStub(c), c.unary_unary(CALCULATE_SUM_METHOD))
+            for c in self._channels
+        ])
+
+    def _next(self):
+        if self._entries is None:
+            self._open()
+        return next(self._entries)
+
+    def stub(self, key=None):
+        """Return the next SumService stub in round-robin order."""
+        return self._next()[0]
+
+    def raw_calculate_sum(self, key=None):
+        """Return the next CalculateSum callable taking and returning bytes."""
+        return self._next()[1]
+
+    async def close(self):
+        channels, self._channels, self._entries = self._channels, [], None
+        for channel in channels:
+            await channel.close()
+
+class ShardedChannelPool:
+    """One ChannelPool per upstream replica, chosen by consistent hash of the key.
+
+    All calls for a key reach the same replica, so its running sum stays
+    correct when the service is scaled out. set_targets() changes membership
+    while the proxy runs; only keys owned by added or removed replicas move.
+    """
+
+    sharded = True
+
+    def __init__(self, targets, size=4, options=None):
+        self._router = ShardRouter(
+            targets, lambda target: ChannelPool(target, size=size, options=options))
+
+    @property
+    def targets(self):
+        return self._router.ring.nodes
+
+    def target_for(self, key):
+        # An empty key is the server's default key; route them together
+        return self._router.ring.get(key or DEFAULT_KEY)
+
+    def stub(self, key=''):
+        return self._router.get(key or DEFAULT_KEY).stub()
+
+    def raw_calculate_sum(self, key=''):
+        return self._router.get(key or DEFAULT_KEY).raw_calculate_sum()
+
+    async def set_targets(self, targets):
+        for pool in self._router.set_nodes(targets):
+            await pool.close()
+
+    async def close(self):
+        for pool in self._router.objects():
+            await pool.close()
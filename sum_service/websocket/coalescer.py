@@ -0,0 +1,103 @@
+"""
+Cross-client request coalescing for the WebSocket proxy.
+"""
+
+import asyncio
+import grpc
+from sum_service.grpc.proto import sum_pb2
+
+# SumRequest.number is an int32; coalesced numbers are held to the same range
+INT32_MIN = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+
+class Coalescer:
+    """Gathers single-number requests from all clients into batched upstream calls.
+
+    Requests are collected until window seconds have passed since the first
+    pending one or max_batch requests are waiting, then sent as one
+    CalculateSumBatch call per key with include_running_sums set. Every caller
+    gets the running sum just after its own number, exactly as if the batch
+    had arrived as consecutive unary calls.
+    """
+
+    def __init__(self, pool, window=0.001, max_batch=256):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}
+        self._count = 0
+        self._timer = None
+        self._tasks = set()
+        # batch size bucket (power of two upper bound) -> number of batches
+        self.histogram = {}
+        self.batches = 0
+        self.requests = 0
+
+    async def calculate_sum(self, number, key=''):
+        """Queue one number for key and return its running sum."""
+        if isinstance(number, bool) or not isinstance(number, int):
+            raise TypeError(f"number must be an integer, got {number!r}")
+        if not INT32_MIN <= number <= INT32_MAX:
+            raise ValueError(f"number out of int32 range: {number}")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append((number, future))
+        self._count += 1
+        if self._count >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        """Send everything pending now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._count = self._pending, {}, 0
+        for key, entries in pending.items():
+            self._record(len(entries))
+            task = asyncio.ensure_future(self._send(key, entries))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        """Send everything pending and wait for the batches in flight."""
+        self.flush()
+        if self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    def _record(self, size):
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+        self.batches += 1
+        self.requests += size
+
+    async def _send(self, key, entries):
+        request = sum_pb2.SumBatchRequest(
+            numbers=[number for number, _ in entries], key=key, include_running_sums=True)
+        try:
+            response = await self._call(key, request)
+        except grpc.RpcError as e:
+            for _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), running_sum in zip(entries, response.running_sums):
+            if not future.done():
+                future.set_result(running_sum)
+
+    async def _call(self, key, request):
+        return await self.pool.stub(key).CalculateSumBatch(request)
+
+    def stats(self):
+        """Batch counters and the batch-size histogram."""
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'histogram': dict(sorted(self.histogram.items())),
+        }
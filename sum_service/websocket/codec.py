@@ -0,0 +1,18 @@
+"""
+WebSocket subprotocols understood by the proxy.
+
+json (default): text frames such as {"number": 5} answered with {"sum": 5}.
+protobuf: binary frames holding a serialized SumRequest, answered with a
+binary serialized SumResponse. The proxy forwards these bytes without
+decoding them; failures are reported as a JSON text frame {"error": ...}.
+"""
+
+JSON_SUBPROTOCOL = 'sum.v1.json'
+PROTOBUF_SUBPROTOCOL = 'sum.v1.protobuf'
+
+# Preference order when the client offers several
+SUBPROTOCOLS = [PROTOBUF_SUBPROTOCOL, JSON_SUBPROTOCOL]
+
+def is_binary(websocket):
+    """True when the connection negotiated the protobuf subprotocol."""
+    return websocket.subprotocol == PROTOBUF_SUBPROTOCOL
@@ -0,0 +1,80 @@
+"""
+Hedged upstream calls: a backup attempt for requests that are slower than usual.
+
+A CalculateSum that has not answered within the recent p95 latency is
+sent again on another pooled channel, and whichever attempt answers first
+wins. Both attempts carry the same request_id, so the server adds the
+number only once. Only about one request in twenty is sent twice, but a
+stall on one connection no longer sets the latency of the requests behind it.
+"""
+
+import asyncio
+import collections
+import uuid
+
+class LatencyTracker:
+    """A percentile of recent latencies, recomputed every refresh samples."""
+
+    def __init__(self, percentile=95, window=1000, refresh=100, initial=0.05):
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        self.percentile = percentile
+        self.refresh = refresh
+        self.value = initial
+        self._samples = collections.deque(maxlen=window)
+        self._pending = 0
+
+    def record(self, latency):
+        self._samples.append(latency)
+        self._pending += 1
+        if self._pending >= self.refresh:
+            self._pending = 0
+            ordered = sorted(self._samples)
+            self.value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+
+class Hedger:
+    """Sends CalculateSum through a channel pool, hedging calls slower than the tracked percentile."""
+
+    def __init__(self, pool, percentile=95, min_delay=0.001, initial_delay=0.05, metrics=None):
+        self.pool = pool
+        self.min_delay = min_delay
+        self.latencies = LatencyTracker(percentile, initial=initial_delay)
+        self.metrics = metrics
+        self.hedged = 0
+        self.backup_wins = 0
+
+    def delay(self):
+        return max(self.min_delay, self.latencies.value)
+
+    async def calculate_sum(self, request, key=''):
+        """Return the SumResponse of the first attempt to succeed; raise the last error if all fail."""
+        if not request.request_id:
+            request.request_id = uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first = asyncio.ensure_future(self.pool.stub(key).CalculateSum(request))
+        attempts = {first}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.delay())
+            if not done:
+                self.hedged += 1
+                if self.metrics is not None:
+                    self.metrics.hedged_requests.inc()
+                attempts.add(asyncio.ensure_future(self.pool.stub(key).CalculateSum(request)))
+            while True:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                failed = [attempt for attempt in done if attempt.exception() is not None]
+                won = [attempt for attempt in done if attempt.exception() is None]
+                if won:
+                    # When the backup wins, this is a lower bound of the first attempt's latency
+                    self.latencies.record(loop.time() - started)
+                    if first not in won:
+                        self.backup_wins += 1
+                        if self.metrics is not None:
+                            self.metrics.hedge_wins.inc()
+                    return won[0].result()
+                if not attempts:
+                    raise failed[0].exception()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
@@ -0,0 +1,45 @@
+"""
+Metrics for the WebSocket proxy.
+"""
+
+class ProxyMetrics:
+    """Connection, message, backpressure, subscription, hedging and upstream error counters in a Registry."""
+
+    def __init__(self, registry, coalescer=None):
+        self.connections_open = registry.gauge('ws_connections_open', "Open WebSocket connections")
+        self.connections = registry.counter('ws_connections_total', "WebSocket connections accepted")
+        self.messages = registry.counter(
+            'ws_messages_received_total', "WebSocket messages received, by frame format", ('format',))
+        self.json_messages = self.messages.labels('json')
+        self.binary_messages = self.messages.labels('protobuf')
+        self.upstream_errors = registry.counter(
+            'ws_upstream_errors_total', "Failed upstream gRPC calls, by status code", ('grpc_code',))
+        discarded = registry.counter(
+            'ws_replies_discarded_total', "Replies discarded for slow clients, by reason", ('reason',))
+        self.dropped_replies = discarded.labels('dropped')
+        self.coalesced_replies = discarded.labels('coalesced')
+        self.read_pauses = registry.counter(
+            'ws_read_pauses_total', "Times a connection stopped reading because its send queue was full")
+        self.slow_consumer_disconnects = registry.counter(
+            'ws_slow_consumer_disconnects_total', "Connections closed for reading too slowly")
+        self.subscriptions_open = registry.gauge('ws_subscriptions_open', "Open key subscriptions, over all connections")
+        self.broadcast_messages = registry.counter(
+            'ws_broadcast_messages_total', "Subscription updates written to clients")
+        self.broadcast_skipped = registry.counter(
+            'ws_broadcast_skipped_total', "Subscription updates skipped by clients with a full send buffer")
+        self.hedged_requests = registry.counter(
+            'ws_hedged_requests_total', "Upstream calls sent a second time because the first was slow")
+        self.hedge_wins = registry.counter(
+            'ws_hedge_wins_total', "Hedged calls answered first by the second attempt")
+        if coalescer is not None:
+            registry.counter('ws_coalescer_batches_total', "Coalesced upstream batches sent",
+                             function=lambda: coalescer.batches)
+            registry.counter('ws_coalescer_requests_total', "Requests sent in coalesced batches",
+                             function=lambda: coalescer.requests)
+            registry.gauge(
+                'ws_coalescer_batches_by_size', "Coalesced batches by batch size (power-of-two upper bound)",
+                ('max_size',), function=lambda: {(size,): n for size, n in coalescer.histogram.items()})
+
+    def upstream_error(self, error):
+        code = error.code() if hasattr(error, 'code') else None
+        self.upstream_errors.labels(code.name if code is not None else 'UNKNOWN').inc()
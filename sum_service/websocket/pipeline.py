@@ -0,0 +1,75 @@
+"""
+Per-connection request pipelining for the WebSocket proxies.
+"""
+
+import asyncio
+import functools
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Pipeline:
+    """Keeps up to max_in_flight requests of one connection running at once.
+
+    Each submitted coroutine produces the message to send back. Requests
+    without a request_id are answered strictly in submission order; requests
+    with a client-supplied request_id are answered as soon as they complete.
+    submit() waits while max_in_flight requests are outstanding, which stops
+    the caller from reading further frames until a slot frees up. A slot is
+    held until send() returns, so a send that waits (such as an
+    OutboundQueue pausing on its watermark) also stops reading.
+    """
+
+    def __init__(self, send, max_in_flight=1):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self._send = send
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._ordered = asyncio.Queue()
+        self._tasks = set()
+        self._writer = None
+
+    async def submit(self, coro, request_id=None, key=None):
+        """Run coro and send its result; a key is passed on to send() as key=."""
+        await self._slots.acquire()
+        task = asyncio.ensure_future(coro)
+        send = self._send if key is None else functools.partial(self._send, key=key)
+        if request_id is None:
+            if self._writer is None:
+                self._writer = self._spawn(self._write_ordered())
+            self._ordered.put_nowait((task, send))
+        else:
+            self._spawn(self._write_when_done(task, send))
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _write_ordered(self):
+        while True:
+            task, send = await self._ordered.get()
+            try:
+                await send(await task)
+            except Exception as e:
+                # Keep answering later requests; a closed socket also ends the reader
+                logger.warning("Failed to send pipelined response: %s", e)
+            finally:
+                self._ordered.task_done()
+                self._slots.release()
+
+    async def _write_when_done(self, task, send):
+        try:
+            await send(await task)
+        except Exception as e:
+            logger.warning("Failed to send pipelined response: %s", e)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Cancel outstanding requests, e.g. after the client disconnected."""
+        for task in list(self._tasks):
+            task.cancel()
+        while not self._ordered.empty():
+            self._ordered.get_nowait()[0].cancel()
@@ -2,79 +2,284 @@ import asyncio
 import websockets
 import json
 import grpc
-import sum_pb2
-import sum_pb2_grpc
+from google.protobuf.message import DecodeError
+from sum_service.grpc.proto import sum_pb2
+from sum_service.grpc.accumulator import DEFAULT_KEY
 import logging
 import os
+import signal
+
+from sum_service.websocket.backpressure import BackpressureSettings, ConnectionStats
+from sum_service.websocket.broadcast import Broadcaster
+from sum_service.websocket.channel_pool import ChannelPool, ShardedChannelPool
+from sum_service.websocket.codec import SUBPROTOCOLS, is_binary
+from sum_service.websocket.coalescer import Coalescer
+from sum_service.websocket.hedging import Hedger
+from sum_service.websocket.instrumentation import ProxyMetrics
+from sum_service.websocket.pipeline import Pipeline
+from sum_service.log import EventLogger, setup_logging
+from sum_service.metrics import Registry, start_http_server
+from sum_service.profiling import Profiling
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# Per-message events are DEBUG and can be sampled with LOG_SAMPLE
+request_log = EventLogger(logger, 'request')
+connection_log = EventLogger(logger, 'connection', logging.INFO)
+
+def parse_upstreams(value):
+    """Split a comma- or newline-separated list of host:port targets."""
+    return [target.strip() for target in value.replace('\n', ',').split(',') if target.strip()]
+
+def read_upstreams(path):
+    with open(path) as f:
+        return parse_upstreams(f.read())
 
 class WebSocketProxy:
-    def __init__(self):
+    def __init__(self, grpc_host=None, grpc_port=None, pool_size=None, max_in_flight=None,
+                 coalesce=None, upstreams=None, registry=None, backpressure=None, max_subscriptions=None,
+                 hedge=None, upstreams_file=None):
         # Get configuration from environment variables
-        grpc_host = os.getenv('GRPC_HOST', 'localhost')
-        grpc_port = os.getenv('GRPC_PORT', '50051')
-        self.grpc_channel = grpc.insecure_channel(f'{grpc_host}:{grpc_port}')
-        self.sum_stub = sum_pb2_grpc.SumServiceStub(self.grpc_channel)
-        logger.info(f"Connected to gRPC server at {grpc_host}:{grpc_port}")
+        grpc_host = grpc_host or os.getenv('GRPC_HOST', 'localhost')
+        grpc_port = grpc_port or os.getenv('GRPC_PORT', '50051')
+        pool_size = pool_size or int(os.getenv('GRPC_POOL_SIZE', '4'))
+        # A replica list in a file can change while the proxy runs (SIGHUP)
+        self.upstreams_file = upstreams_file or os.getenv('GRPC_UPSTREAMS_FILE')
+        if not upstreams and self.upstreams_file:
+            upstreams = read_upstreams(self.upstreams_file)
+        upstreams = upstreams or parse_upstreams(os.getenv('GRPC_UPSTREAMS', ''))
+        # One pool of upstream channels is shared by every WebSocket client;
+        # with several replicas, or a list that may grow, keys are routed by
+        # consistent hashing
+        sharded = len(upstreams) > 1 or self.upstreams_file
+        upstreams = upstreams or [f'{grpc_host}:{grpc_port}']
+        if sharded:
+            self.pool = ShardedChannelPool(upstreams, size=pool_size)
+        else:
+            self.pool = ChannelPool(upstreams[0], size=pool_size)
+        # Upstream calls each connection may have outstanding at once
+        self.max_in_flight = max_in_flight or int(os.getenv('WS_MAX_IN_FLIGHT', '1'))
+        # Optionally merge requests from all clients into batched upstream calls
+        if coalesce is None:
+            coalesce = os.getenv('WS_COALESCE', '0') == '1'
+        self.coalescer = None
+        if coalesce:
+            self.coalescer = Coalescer(
+                self.pool,
+                window=float(os.getenv('WS_COALESCE_WINDOW_MS', '1')) / 1000,
+                max_batch=int(os.getenv('WS_COALESCE_MAX_BATCH', '256')))
+        # Send queue limits and what to do about clients that read too slowly
+        self.backpressure = backpressure or BackpressureSettings()
+        # Connection, message and error counters when metrics are enabled
+        self.metrics = ProxyMetrics(registry, self.coalescer) if registry is not None else None
+        # Optionally resend calls slower than the recent p95 on another channel
+        if hedge is None:
+            hedge = os.getenv('WS_HEDGE', '0') == '1'
+        self.hedger = None
+        if hedge:
+            self.hedger = Hedger(
+                self.pool,
+                percentile=float(os.getenv('WS_HEDGE_PERCENTILE', '95')),
+                min_delay=float(os.getenv('WS_HEDGE_MIN_DELAY_MS', '1')) / 1000,
+                metrics=self.metrics)
+        # One upstream WatchSum per subscribed key, shared by all its subscribers
+        self.max_subscriptions = max_subscriptions or int(os.getenv('WS_MAX_SUBSCRIPTIONS', '16'))
+        self.broadcaster = Broadcaster(
+            self.pool, max_buffered=self.backpressure.high_watermark,
+            min_interval=float(os.getenv('WS_BROADCAST_INTERVAL_MS', '0')) / 1000, metrics=self.metrics)
+        logger.info("Using gRPC servers %s with %d channels each", ', '.join(upstreams), pool_size)
 
     async def handle_websocket(self, websocket):
         client_id = id(websocket)
-        logger.info(f"New WebSocket connection from client {client_id}")
-        
+        connection_log("New WebSocket connection from client %d", client_id)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.connections.inc()
+            metrics.connections_open.inc()
+        stats = ConnectionStats()
+        outbound = self.backpressure.queue(websocket, stats, metrics)
+        pipeline = Pipeline(outbound.put, self.max_in_flight)
+        binary = is_binary(websocket)
+        subscriptions = set()
+
         try:
             async for message in websocket:
+                stats.received += 1
+                if metrics is not None:
+                    (metrics.binary_messages if binary else metrics.json_messages).inc()
+                if binary:
+                    # Forward protobuf frames as-is, without decoding them
+                    await pipeline.submit(self.forward_binary(message, client_id))
+                    continue
+
                 try:
                     # Parse the incoming WebSocket message
                     data = json.loads(message)
-                    if 'number' not in data:
-                        await websocket.send(json.dumps({
-                            'error': 'Invalid request. "number" is required.'
-                        }))
-                        continue
-
-                    number = data['number']
-                    logger.info(f"Received number {number} from client {client_id}")
-
-                    # Convert WebSocket message to gRPC request
-                    request = sum_pb2.SumRequest(number=number)
-                    
-                    # Forward request to gRPC server
-                    response = self.sum_stub.CalculateSum(request)
-                    
-                    # Send gRPC response back to WebSocket client
-                    await websocket.send(json.dumps({
-                        'sum': response.result,
-                    }))
-                    logger.info(f"Sent response to client {client_id}: {response.result}")
-
                 except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON from client {client_id}")
-                    await websocket.send(json.dumps({
-                        'error': 'Invalid JSON format'
-                    }))
-                except grpc.RpcError as e:
-                    logger.error(f"gRPC error for client {client_id}: {str(e)}")
-                    await websocket.send(json.dumps({
-                        'error': f'gRPC error: {str(e)}'
-                    }))
-                except Exception as e:
-                    logger.error(f"Error handling client {client_id}: {str(e)}")
-                    await websocket.send(json.dumps({
-                        'error': str(e)
-                    }))
+                    logger.error("Invalid JSON from client %d", client_id)
+                    await pipeline.submit(self._reply({'error': 'Invalid JSON format'}))
+                    continue
+
+                # Requests carrying an "id" may be answered out of order
+                request_id = data.get('id') if isinstance(data, dict) else None
+                if isinstance(data, dict) and ('subscribe' in data or 'unsubscribe' in data):
+                    reply = self.update_subscriptions(data, websocket, subscriptions)
+                    await pipeline.submit(self._reply(reply), request_id)
+                    continue
+                # Replies for one key may be coalesced for a slow client
+                key = data.get('key', '') if isinstance(data, dict) else None
+                await pipeline.submit(self.process(data, client_id), request_id, key)
 
         except websockets.exceptions.ConnectionClosed:
-            logger.info(f"Client {client_id} disconnected")
+            pass
         finally:
-            self.grpc_channel.close()
+            for key in subscriptions:
+                self.broadcaster.unsubscribe(key, websocket)
+            if metrics is not None:
+                metrics.subscriptions_open.dec(len(subscriptions))
+            pipeline.close()
+            outbound.close()
+            connection_log("Client %d disconnected: %s", client_id, stats.as_dict())
+            if metrics is not None:
+                metrics.connections_open.dec()
+
+    async def _reply(self, payload):
+        return json.dumps(payload)
+
+    def update_subscriptions(self, data, websocket, subscriptions):
+        """Handle {"subscribe": key} or {"unsubscribe": key} and return the reply.
+
+        Updates are broadcast outside the pipeline, so the first one may
+        arrive before the reply.
+        """
+        reply = {'id': data['id']} if 'id' in data else {}
+        action = 'subscribe' if 'subscribe' in data else 'unsubscribe'
+        key = data[action]
+        if not isinstance(key, str):
+            reply['error'] = f'Invalid request. "{action}" must be a key.'
+            return reply
+        # Updates name the channel by the key the server resolves '' to
+        key = key or DEFAULT_KEY
+        if action == 'subscribe':
+            if key not in subscriptions:
+                if len(subscriptions) >= self.max_subscriptions:
+                    reply['error'] = f'At most {self.max_subscriptions} subscriptions per connection'
+                    return reply
+                subscriptions.add(key)
+                self.broadcaster.subscribe(key, websocket)
+                if self.metrics is not None:
+                    self.metrics.subscriptions_open.inc()
+            reply['subscribed'] = key
+        else:
+            if key in subscriptions:
+                subscriptions.discard(key)
+                self.broadcaster.unsubscribe(key, websocket)
+                if self.metrics is not None:
+                    self.metrics.subscriptions_open.dec()
+            reply['unsubscribed'] = key
+        return reply
+
+    async def process(self, data, client_id):
+        """Forward one parsed message upstream and return the JSON reply."""
+        reply = {}
+        try:
+            if isinstance(data, dict) and 'id' in data:
+                reply['id'] = data['id']
+            if not isinstance(data, dict) or 'number' not in data:
+                reply['error'] = 'Invalid request. "number" is required.'
+                return json.dumps(reply)
+
+            number = data['number']
+            key = data.get('key', '')
+            request_log("Received number %s from client %d", number, client_id)
+
+            if self.coalescer is not None:
+                reply['sum'] = await self.coalescer.calculate_sum(number, key)
+            else:
+                # Convert WebSocket message to gRPC request; a request_id
+                # makes the addition idempotent on the server
+                request = sum_pb2.SumRequest(number=number, key=key, request_id=data.get('request_id', ''))
+
+                # Forward request to gRPC server without blocking the event loop
+                if self.hedger is not None:
+                    response = await self.hedger.calculate_sum(request, key)
+                else:
+                    response = await self.pool.stub(key).CalculateSum(request)
+                reply['sum'] = response.result
+            request_log("Sent response to client %d: %d", client_id, reply['sum'])
+
+        except grpc.RpcError as e:
+            logger.error("gRPC error for client %d: %s", client_id, e)
+            if self.metrics is not None:
+                self.metrics.upstream_error(e)
+            reply['error'] = f'gRPC error: {str(e)}'
+        except Exception as e:
+            logger.error("Error handling client %d: %s", client_id, e)
+            reply['error'] = str(e)
+        return json.dumps(reply)
+
+    async def forward_binary(self, message, client_id):
+        """Forward a serialized SumRequest and return the serialized SumResponse."""
+        if isinstance(message, str):
+            return json.dumps({'error': 'Expected a binary SumRequest frame'})
+        try:
+            # Only a sharded pool needs the key, so only then is the frame decoded
+            key = sum_pb2.SumRequest.FromString(message).key if self.pool.sharded else None
+        except (DecodeError, ValueError) as e:
+            logger.error("Invalid SumRequest frame from client %d: %s", client_id, e)
+            return json.dumps({'error': 'Invalid SumRequest frame'})
+        try:
+            return await self.pool.raw_calculate_sum(key)(message)
+        except grpc.RpcError as e:
+            logger.error("gRPC error for client %d: %s", client_id, e)
+            if self.metrics is not None:
+                self.metrics.upstream_error(e)
+            return json.dumps({'error': f'gRPC error: {str(e)}'})
+
+    async def reload_upstreams(self, path=None):
+        """Re-read the replica list from path (default: upstreams_file) and update the hash ring."""
+        if not self.pool.sharded:
+            logger.warning("Upstream reload needs a sharded pool (GRPC_UPSTREAMS_FILE or GRPC_UPSTREAMS)")
+            return
+        upstreams = read_upstreams(path or self.upstreams_file)
+        if not upstreams:
+            logger.warning("Upstream list is empty; keeping %s", self.pool.targets)
+            return
+        await self.pool.set_targets(upstreams)
+        logger.info("Upstream replicas are now %s", self.pool.targets)
+
+    async def close(self):
+        self.broadcaster.close()
+        if self.coalescer is not None:
+            # Send what is still waiting for its window so no caller hangs
+            await self.coalescer.drain()
+            logger.info("Coalescer stats: %s", self.coalescer.stats())
+        await self.pool.close()
 
 async def main():
-    proxy = WebSocketProxy()
-    async with websockets.serve(proxy.handle_websocket, "0.0.0.0", 8765):
-        logger.info("WebSocket proxy started on ws://0.0.0.0:8765")
-        await asyncio.Future()  # run forever
+    # SIGUSR1/SIGUSR2 profile the process; nothing is sampled until then
+    profiling = Profiling()
+    profiling.install_signal_handlers()
+
+    registry = None
+    metrics_port = int(os.getenv('WS_METRICS_PORT', '0'))
+    if metrics_port:
+        registry = Registry()
+        start_http_server(metrics_port, registry, routes=profiling.routes())
+        logger.info("Serving metrics on port %d", metrics_port)
+    proxy = WebSocketProxy(registry=registry)
+    if proxy.upstreams_file:
+        # SIGHUP re-reads the replica list without restarting the proxy
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(proxy.reload_upstreams()))
+    try:
+        port = int(os.getenv('WS_PORT', '8765'))
+        async with websockets.serve(proxy.handle_websocket, "0.0.0.0", port, subprotocols=SUBPROTOCOLS,
+                                    **proxy.backpressure.serve_options()):
+            logger.info("WebSocket proxy started on ws://0.0.0.0:%d", port)
+            await asyncio.Future()  # run forever
+    finally:
+        await proxy.close()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    setup_logging()
+    asyncio.run(main())
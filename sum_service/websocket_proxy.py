@@ -1,31 +1,40 @@
 import asyncio
 import json
 import logging
+import os
+import uuid
 import grpc
 from websockets.server import serve
-from sum_service.grpc import sum_pb2, sum_pb2_grpc
+from sum_service.grpc.proto import sum_pb2, sum_pb2_grpc
+from sum_service.websocket.backpressure import BackpressureSettings, ConnectionStats
+from sum_service.websocket.pipeline import Pipeline
+from sum_service.log import EventLogger, setup_logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
+# Per-message events are DEBUG and can be sampled with LOG_SAMPLE
+request_log = EventLogger(logger, 'request')
+connection_log = EventLogger(logger, 'connection', logging.INFO)
+
+# Seconds calls still running on a replaced channel get to finish
+CLOSE_GRACE = 5.0
 
 class WebSocketProxy:
-    def __init__(self, grpc_host, grpc_port):
+    def __init__(self, grpc_host, grpc_port, max_in_flight=1, backpressure=None):
         self.grpc_host = grpc_host
         self.grpc_port = grpc_port
+        self.max_in_flight = max_in_flight
+        self.backpressure = backpressure or BackpressureSettings()
         self.channel = None
         self.stub = None
+        # Bumped on every reconnect, so calls that failed on an old channel
+        # can tell that another call has already replaced it
+        self.generation = 0
+        self._reconnect_lock = asyncio.Lock()
         self.connect_grpc()
 
     def connect_grpc(self):
-        """Connect to gRPC server with retry logic"""
+        """Open a channel to the gRPC server"""
         try:
-            if self.channel:
-                self.channel.close()
-            
             # Create a new channel with keepalive settings
             self.channel = grpc.aio.insecure_channel(
                 f'{self.grpc_host}:{self.grpc_port}',
@@ -37,60 +46,94 @@ class WebSocketProxy:
                     ('grpc.http2.min_time_between_pings_ms', 10000),  # Minimum time between pings
                 ]
             )
-            self.stub = sum_pb2_grpc.SumStub(self.channel)
-            logger.info(f"Connected to gRPC server at {self.grpc_host}:{self.grpc_port}")
+            self.stub = sum_pb2_grpc.SumServiceStub(self.channel)
+            logger.info("Connected to gRPC server at %s:%s", self.grpc_host, self.grpc_port)
         except Exception as e:
-            logger.error(f"Failed to connect to gRPC server: {e}")
+            logger.error("Failed to connect to gRPC server: %s", e)
             raise
 
+    async def reconnect_grpc(self, generation):
+        """Replace the channel a call failed on, unless another call already has.
+
+        With pipelining, every call in flight during an outage fails; only the
+        first one to get here opens a new channel. The old one is closed once
+        the calls still running on it are done, so none of them is cancelled.
+        """
+        async with self._reconnect_lock:
+            if self.generation != generation:
+                return
+            logger.warning("gRPC connection lost, attempting to reconnect...")
+            old = self.channel
+            self.connect_grpc()
+            self.generation += 1
+        await old.close(CLOSE_GRACE)
+
     async def handle_client(self, websocket):
         """Handle WebSocket client connection"""
         client_id = id(websocket)
-        logger.info(f"New WebSocket connection from client {client_id}")
+        connection_log("New WebSocket connection from client %d", client_id)
+        stats = ConnectionStats()
+        outbound = self.backpressure.queue(websocket, stats)
+        pipeline = Pipeline(outbound.put, self.max_in_flight)
         
         try:
             async for message in websocket:
+                stats.received += 1
                 try:
                     data = json.loads(message)
-                    if 'number' not in data:
-                        await websocket.send(json.dumps({"error": "Missing 'number' field"}))
-                        continue
-
-                    number = data['number']
-                    logger.info(f"Received number {number} from client {client_id}")
-
-                    try:
-                        # Create request and get response
-                        request = sum_pb2.NumberRequest(number=number)
-                        response = await self.stub.AddNumber(request)
-                        
-                        # Send response back to client
-                        result = {"result": response.sum}
-                        await websocket.send(json.dumps(result))
-                        logger.info(f"Sent response to client {client_id}: {response.sum}")
-                    except grpc.RpcError as e:
-                        if e.code() == grpc.StatusCode.UNAVAILABLE:
-                            logger.warning("gRPC connection lost, attempting to reconnect...")
-                            self.connect_grpc()
-                            # Retry the request after reconnection
-                            request = sum_pb2.NumberRequest(number=number)
-                            response = await self.stub.AddNumber(request)
-                            result = {"result": response.sum}
-                            await websocket.send(json.dumps(result))
-                            logger.info(f"Sent response to client {client_id} after reconnection: {response.sum}")
-                        else:
-                            raise
-
                 except json.JSONDecodeError:
-                    await websocket.send(json.dumps({"error": "Invalid JSON format"}))
-                except Exception as e:
-                    logger.error(f"Error handling client {client_id}: {e}")
-                    await websocket.send(json.dumps({"error": str(e)}))
+                    await pipeline.submit(self._reply({"error": "Invalid JSON format"}))
+                    continue
+
+                # Requests carrying an "id" may be answered out of order
+                request_id = data.get('id') if isinstance(data, dict) else None
+                await pipeline.submit(self.process(data, client_id), request_id)
 
         except Exception as e:
-            logger.error(f"WebSocket error for client {client_id}: {e}")
+            logger.error("WebSocket error for client %d: %s", client_id, e)
         finally:
-            logger.info(f"Client {client_id} disconnected")
+            pipeline.close()
+            outbound.close()
+            connection_log("Client %d disconnected: %s", client_id, stats.as_dict())
+
+    async def _reply(self, payload):
+        return json.dumps(payload)
+
+    async def process(self, data, client_id):
+        """Forward one parsed message upstream and return the JSON reply"""
+        reply = {}
+        if isinstance(data, dict) and 'id' in data:
+            reply['id'] = data['id']
+        try:
+            if not isinstance(data, dict) or 'number' not in data:
+                reply["error"] = "Missing 'number' field"
+                return json.dumps(reply)
+
+            number = data['number']
+            request_log("Received number %s from client %d", number, client_id)
+
+            # The retry below resends the same request_id, so the server adds
+            # the number once even if the first attempt reached it
+            request = sum_pb2.SumRequest(number=number, request_id=uuid.uuid4().hex)
+            generation = self.generation
+            try:
+                response = await self.stub.CalculateSum(request)
+                reply["result"] = response.result
+                request_log("Sent response to client %d: %d", client_id, response.result)
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.UNAVAILABLE:
+                    await self.reconnect_grpc(generation)
+                    # Retry the request after reconnection
+                    response = await self.stub.CalculateSum(request)
+                    reply["result"] = response.result
+                    request_log("Sent response to client %d after reconnection: %d", client_id, response.result)
+                else:
+                    raise
+
+        except Exception as e:
+            logger.error("Error handling client %d: %s", client_id, e)
+            reply["error"] = str(e)
+        return json.dumps(reply)
 
 async def main():
     # Get configuration from environment variables
@@ -98,14 +141,16 @@ async def main():
     grpc_port = 50051
     websocket_host = "0.0.0.0"
     websocket_port = 8765
+    max_in_flight = int(os.getenv('WS_MAX_IN_FLIGHT', '1'))
 
     # Create WebSocket proxy instance
-    proxy = WebSocketProxy(grpc_host, grpc_port)
+    proxy = WebSocketProxy(grpc_host, grpc_port, max_in_flight)
 
     # Start WebSocket server
-    async with serve(proxy.handle_client, websocket_host, websocket_port):
-        logger.info(f"WebSocket proxy started on ws://{websocket_host}:{websocket_port}")
+    async with serve(proxy.handle_client, websocket_host, websocket_port, **proxy.backpressure.serve_options()):
+        logger.info("WebSocket proxy started on ws://%s:%d", websocket_host, websocket_port)
         await asyncio.Future()  # run forever
 
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(main()) 
\ No newline at end of file
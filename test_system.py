@@ -6,16 +6,9 @@ import json
 from concurrent import futures
 import time
 import logging
-import os
-import sys
 
-# Add proto directory to Python path
-proto_dir = os.path.join(os.path.dirname(__file__), 'sum_service', 'grpc', 'proto')
-sys.path.append(proto_dir)
-
-# Import generated proto files
-from sum_pb2 import SumRequest, SumResponse
-from sum_pb2_grpc import SumServiceStub
+from sum_service.grpc.proto.sum_pb2 import SumRequest, SumResponse
+from sum_service.grpc.proto.sum_pb2_grpc import SumServiceStub
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)